@@ -0,0 +1,308 @@
+"""
+股票警報規則
+把每輪的監控列表和報價批次轉成列式陣列，一次過評估所有警報類型
+"""
+
+import math
+from array import array
+
+# numpy 只在監控數量達到 NUMPY_MIN_ROWS 時才導入
+_numpy = None
+
+# 指標欄位
+METRIC_PRICE = 0     # 現價
+METRIC_CHANGE = 1    # 日內漲跌幅 (相對昨收, %)
+METRIC_VOLUME = 2    # 成交量 / 平均成交量
+METRIC_GAP = 3       # 開盤跳空 (相對昨收, %)
+METRIC_COUNT = 4
+
+# 警報類型 -> (指標欄位, 指標方向, 門檻方向)
+# 觸發條件統一為: 指標方向 * 指標 >= 門檻方向 * 門檻
+ALERT_TYPES = {
+    'above': (METRIC_PRICE, 1, 1),
+    'below': (METRIC_PRICE, -1, -1),
+    'pct_up': (METRIC_CHANGE, 1, 1),
+    'pct_down': (METRIC_CHANGE, -1, 1),
+    'volume_spike': (METRIC_VOLUME, 1, 1),
+    'gap_up': (METRIC_GAP, 1, 1),
+    'gap_down': (METRIC_GAP, -1, 1),
+}
+
+ALERT_TYPE_NAMES = {
+    'above': '高於',
+    'below': '低於',
+    'pct_up': '日內升幅達',
+    'pct_down': '日內跌幅達',
+    'volume_spike': '成交量超過平均',
+    'gap_up': '高開達',
+    'gap_down': '低開達',
+}
+
+# 少於此數量時直接用純 Python 評估，避免 numpy 轉換開銷
+NUMPY_MIN_ROWS = 64
+
+_NAN = float('nan')
+
+
+def is_price_alert(alert_type):
+    """是否為固定價格警報 (above/below)"""
+    return ALERT_TYPES.get(alert_type, (None,))[0] == METRIC_PRICE
+
+
+def needs_average_volume(alert_type):
+    """該警報類型是否需要平均成交量"""
+    return ALERT_TYPES.get(alert_type, (None,))[0] == METRIC_VOLUME
+
+
+def threshold_error(alert_type, threshold):
+    """
+    檢查警報門檻，有效時返回 None，否則返回錯誤訊息
+    漲跌幅、跳空和成交量倍數都以正數表示方向已由類型決定 (例如 pct_down 3 表示跌 3%)，
+    0 或負數會令條件幾乎每次檢查都成立，inf / nan 則永遠不會 (或每次都) 成立
+    """
+    if not isinstance(threshold, (int, float)) or not 0 < threshold < math.inf:
+        if is_price_alert(alert_type):
+            return "目標價格必須大於 0"
+        return f"{ALERT_TYPE_NAMES.get(alert_type, alert_type)}的門檻必須大於 0 (方向已由警報類型決定)"
+    return None
+
+
+def format_threshold(alert_type, threshold):
+    """格式化警報門檻"""
+    column = ALERT_TYPES.get(alert_type, (METRIC_PRICE,))[0]
+    if column == METRIC_PRICE:
+        return f"${threshold:.2f}"
+    if column == METRIC_VOLUME:
+        return f"{threshold:g}倍"
+    return f"{threshold:.2f}%"
+
+
+def describe_alert(alert_type, threshold):
+    """警報條件的文字描述，例如 "高於 $50.00" """
+    return f"{ALERT_TYPE_NAMES.get(alert_type, alert_type)} {format_threshold(alert_type, threshold)}"
+
+
+def _num(value):
+    return float(value) if isinstance(value, (int, float)) else _NAN
+
+
+def compute_metrics(quote):
+    """從報價計算四個指標，缺失的數據以 NaN 表示"""
+    if not quote:
+        return (_NAN,) * METRIC_COUNT
+
+    price = _num(quote.get('price'))
+    previous_close = _num(quote.get('previousClose'))
+    open_price = _num(quote.get('open'))
+    volume = _num(quote.get('volume'))
+    average_volume = _num(quote.get('averageVolume'))
+
+    if previous_close > 0:
+        change = (price - previous_close) / previous_close * 100
+        gap = (open_price - previous_close) / previous_close * 100
+    else:
+        change = gap = _NAN
+    volume_ratio = volume / average_volume if average_volume > 0 else _NAN
+
+    return (price, change, volume_ratio, gap)
+
+
+class WatchColumns:
+    """
+    監控列表的列式表示
+
+    rows 為 watch_set.WatchRecord (或按相同位置索引的序列，row[3] 股票、row[4] 門檻、row[5] 警報類型)
+    check_alerts 中每個共享觸發器 (alert_triggers) 只有一行，由其中一個訂閱的監控代表，
+    以 trigger_id 為鍵；觸發後由 StockMonitorDB._subscribers 分發給所有訂閱者
+    不支援的警報類型會被略過，並記錄在 skipped 中
+    """
+
+    def __init__(self, rows, key=None):
+        self.rows = []
+        self.skipped = []
+        self.symbols = []
+        self.symbol_index = {}
+        self.symbol_rows = []  # 每隻股票的行號
+        self.sym_idx = array('q')
+        self.column = array('B')
+        self.sign = array('d')
+        self.threshold = array('d')
+        # 提供 key(row) 時按鍵記錄行號，可用 append / remove / replace 增量維護
+        self.key = key
+        self.row_index = {}
+
+        for row in rows:
+            self.append(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def append(self, row):
+        """加入一行，不支援的警報類型記錄在 skipped 中並返回 False"""
+        symbol, target, alert_type = row[3], row[4], row[5]
+        rule = ALERT_TYPES.get(alert_type)
+        if rule is None or target is None:
+            self.skipped.append(row)
+            return False
+
+        index = self.symbol_index.get(symbol)
+        if index is None:
+            index = self.symbol_index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            self.symbol_rows.append([])
+
+        column, metric_sign, threshold_sign = rule
+        if self.key is not None:
+            self.row_index[self.key(row)] = len(self.rows)
+        self.symbol_rows[index].append(len(self.rows))
+        self.rows.append(row)
+        self.sym_idx.append(index)
+        self.column.append(column)
+        self.sign.append(metric_sign)
+        self.threshold.append(threshold_sign * float(target))
+        return True
+
+    def replace(self, key, row):
+        """替換同一鍵的行 (條件相同，例如共享觸發器換了代表的監控)"""
+        position = self.row_index.get(key)
+        if position is not None:
+            self.rows[position] = row
+
+    def remove(self, key):
+        """
+        移除一行：與最後一行交換後刪除，只調整被移動的行和該股票的行號
+        股票沒有其他行時同樣與最後一隻股票交換後刪除
+        """
+        position = self.row_index.pop(key, None)
+        if position is None:
+            if self.skipped:
+                self.skipped = [row for row in self.skipped if self.key(row) != key]
+            return
+        symbol_index = self.sym_idx[position]
+        symbol_rows = self.symbol_rows[symbol_index]
+        symbol_rows.remove(position)
+
+        last = len(self.rows) - 1
+        if position != last:
+            moved = self.rows[last]
+            moved_symbol = self.sym_idx[last]
+            self.rows[position] = moved
+            self.sym_idx[position] = moved_symbol
+            self.column[position] = self.column[last]
+            self.sign[position] = self.sign[last]
+            self.threshold[position] = self.threshold[last]
+            moved_rows = self.symbol_rows[moved_symbol]
+            moved_rows[moved_rows.index(last)] = position
+            self.row_index[self.key(moved)] = position
+        self.rows.pop()
+        self.sym_idx.pop()
+        self.column.pop()
+        self.sign.pop()
+        self.threshold.pop()
+
+        if not symbol_rows:
+            del self.symbol_index[self.symbols[symbol_index]]
+            last_symbol = len(self.symbols) - 1
+            if symbol_index != last_symbol:
+                moved_symbol = self.symbols[last_symbol]
+                self.symbols[symbol_index] = moved_symbol
+                self.symbol_index[moved_symbol] = symbol_index
+                self.symbol_rows[symbol_index] = self.symbol_rows[last_symbol]
+                for row in self.symbol_rows[symbol_index]:
+                    self.sym_idx[row] = symbol_index
+            self.symbols.pop()
+            self.symbol_rows.pop()
+
+    def subset(self, symbols):
+        """只包含指定股票的監控 (按股票的行號索引建立，不掃描其他行)"""
+        rows = self.rows
+        return WatchColumns(
+            rows[i]
+            for symbol in symbols if symbol in self.symbol_index
+            for i in self.symbol_rows[self.symbol_index[symbol]]
+        )
+
+    def symbols_needing(self, predicate):
+        """返回有任何監控符合 predicate(alert_type) 的股票"""
+        return {row[3] for row in self.rows if predicate(row[5])}
+
+
+def build_metrics(symbols, quotes):
+    """按 symbols 的順序把報價轉為扁平的指標陣列 (每隻股票 METRIC_COUNT 個值)"""
+    metrics = array('d')
+    for symbol in symbols:
+        metrics.extend(compute_metrics(quotes.get(symbol)))
+    return metrics
+
+
+def load_numpy():
+    """導入 numpy，未安裝時返回 None"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+def evaluate_alerts(watches, quotes):
+    """
+    一次過評估所有監控
+
+    watches: WatchColumns
+    quotes: {symbol: quote dict}，取不到報價的股票可缺省
+    返回觸發警報的行號列表 (對應 watches.rows)
+    """
+    if not len(watches):
+        return []
+
+    metrics = build_metrics(watches.symbols, quotes)
+
+    np = load_numpy() if len(watches) >= NUMPY_MIN_ROWS else None
+    if np is not None:
+        table = np.frombuffer(metrics, dtype=np.float64).reshape(-1, METRIC_COUNT)
+        values = table[np.frombuffer(watches.sym_idx, dtype=np.int64),
+                       np.frombuffer(watches.column, dtype=np.uint8)]
+        fired = np.frombuffer(watches.sign, dtype=np.float64) * values \
+            >= np.frombuffer(watches.threshold, dtype=np.float64)
+        return np.flatnonzero(fired).tolist()
+
+    return [
+        i for i, (s, c, sign, threshold) in enumerate(
+            zip(watches.sym_idx, watches.column, watches.sign, watches.threshold))
+        if sign * metrics[s * METRIC_COUNT + c] >= threshold
+    ]
+
+
+def format_alert_message(symbol, alert_type, threshold, quote):
+    """生成警報訊息"""
+    price = quote.get('price')
+    volume = quote.get('volume')
+    _, price_change, volume_ratio, gap = compute_metrics(quote)
+
+    lines = ["🚨 **股票警報** 🚨", ""]
+    if alert_type == 'above':
+        lines.append(f"📈 **{symbol}** 已達到目標價格！")
+        lines.append(f"🎯 目標價格: ${threshold:.2f}")
+    elif alert_type == 'below':
+        lines.append(f"📉 **{symbol}** 已跌至目標價格！")
+        lines.append(f"🎯 目標價格: ${threshold:.2f}")
+    elif alert_type in ('pct_up', 'pct_down'):
+        emoji = "📈" if alert_type == 'pct_up' else "📉"
+        lines.append(f"{emoji} **{symbol}** 日內變動 {price_change:+.2f}%")
+        lines.append(f"🎯 警報條件: {describe_alert(alert_type, threshold)}")
+    elif alert_type == 'volume_spike':
+        lines.append(f"📊 **{symbol}** 成交量異常！")
+        lines.append(f"🎯 警報條件: {describe_alert(alert_type, threshold)}")
+        if not math.isnan(volume_ratio):
+            lines.append(f"🔥 目前為平均成交量的 {volume_ratio:.1f} 倍")
+    else:
+        emoji = "⬆️" if alert_type == 'gap_up' else "⬇️"
+        lines.append(f"{emoji} **{symbol}** 開盤跳空 {gap:+.2f}%")
+        lines.append(f"🎯 警報條件: {describe_alert(alert_type, threshold)}")
+
+    lines.append(f"💰 當前價格: ${price:.2f}")
+    lines.append(f"📊 成交量: {volume:,}" if volume else "📊 成交量: N/A")
+    return "\n".join(lines)
@@ -0,0 +1,110 @@
+"""
+新股票的歷史數據回填
+- 某隻股票第一次被監控時加入隊列，由後台線程請求 chart 的歷史 OHLCV 數據
+  (range / interval 可配置)，一次請求取得整段歷史，不必等監控逐輪記錄
+- 以收市價和成交量通過歷史後端的 save_many 批量寫入 (SQLite 為單一事務)
+- 所有回填請求共用一個令牌桶限速，避免大量導入監控時同時請求 Yahoo
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from quote_client import QuoteClient
+from rate_limit import TokenBuckets
+
+logger = logging.getLogger('stock_monitor.backfill')
+
+DEFAULT_RANGE = '6mo'
+DEFAULT_INTERVAL = '1h'
+
+
+def chart_rows(result):
+    """chart 結果 -> [(UNIX 秒, 收市價, 成交量), ...]，略過沒有收市價的時段"""
+    if not result:
+        return []
+    timestamps = result.get('timestamp') or []
+    quote = ((result.get('indicators') or {}).get('quote') or [{}])[0]
+    closes = quote.get('close') or []
+    volumes = quote.get('volume') or []
+    rows = []
+    for index, timestamp in enumerate(timestamps):
+        close = closes[index] if index < len(closes) else None
+        if close is None:
+            continue
+        volume = volumes[index] if index < len(volumes) else None
+        rows.append((timestamp, close, volume or 0))
+    return rows
+
+
+class HistoryBackfill:
+    """回填隊列：enqueue() 不阻塞，同一股票在隊列中只出現一次"""
+
+    def __init__(self, history, client=None, range_=DEFAULT_RANGE, interval=DEFAULT_INTERVAL,
+                 rate=0.5, burst=2, max_pending=1000):
+        self.history = history
+        self.client = client or QuoteClient()
+        self.range = range_
+        self.interval = interval
+        self.buckets = TokenBuckets(rate, burst)
+        self.queue = queue.Queue(max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.completed = 0
+        self.failed = 0
+        self.rows = 0
+
+    def enqueue(self, symbol):
+        """加入回填隊列，已在隊列中或隊列已滿時返回 False"""
+        with self._lock:
+            if symbol in self._pending:
+                return False
+            try:
+                self.queue.put_nowait(symbol)
+            except queue.Full:
+                return False
+            self._pending.add(symbol)
+        return True
+
+    def backfill(self, symbol):
+        """請求並寫入一隻股票的歷史數據，返回寫入的筆數；網絡錯誤時拋出異常"""
+        wait = self.buckets.acquire('chart')
+        while wait:
+            time.sleep(wait)
+            wait = self.buckets.acquire('chart')
+        status_code, result = self.client.fetch_history(symbol, self.range, self.interval)
+        if status_code != 200:
+            return 0
+        written = self.history.save_many(symbol, chart_rows(result))
+        self.rows += written
+        return written
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name="history-backfill", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def _loop(self):
+        while self.running:
+            try:
+                symbol = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                written = self.backfill(symbol)
+                self.completed += 1
+                logger.info("回填歷史數據 %s: %d 筆", symbol, written, extra={'symbol': symbol})
+            except Exception as e:
+                self.failed += 1
+                logger.warning("回填歷史數據失敗 %s: %s", symbol, e, extra={'symbol': symbol})
+            finally:
+                with self._lock:
+                    self._pending.discard(symbol)
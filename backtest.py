@@ -0,0 +1,100 @@
+"""
+價格警報回測
+- 把 price_history 中的價格序列一次過轉成 NumPy 陣列，向量化計算每個樣本是否符合條件
+- 觸發規則與監控線程相同：每次檢查時價格符合條件即觸發，同一監控觸發後 cooldown 秒內不再觸發
+  (監控以 UTC 比較冷卻期，與回測的 UNIX 秒一致，不受主機時區影響)
+  冷卻期以 searchsorted 直接跳到下一個可觸發的樣本，運算次數只與觸發次數有關
+- 另外統計穿越次數 (由不符合變為符合)，方便比較「持續符合」和「剛穿越」的差別
+- 沒有 numpy 時以 bisect 執行同樣的演算法
+"""
+
+import bisect
+import time
+from collections import namedtuple
+
+from alert_rules import describe_alert, load_numpy, threshold_error
+from chart_renderer import CHART_RANGES
+
+# 回測範圍與 /chart 相同 -> 秒數
+BACKTEST_RANGES = {name: seconds for name, (_, seconds) in CHART_RANGES.items()}
+DEFAULT_BACKTEST_RANGE = '3mo'
+
+BacktestResult = namedtuple('BacktestResult', ['samples', 'matched', 'crossings', 'fire_times'])
+
+
+def backtest(timestamps, prices, threshold, alert_type='above', cooldown=3600):
+    """
+    回測固定價格警報 (above / below)
+    timestamps 為遞增的 UNIX 秒，返回 BacktestResult (fire_times 為觸發時間)
+    """
+    if alert_type not in ('above', 'below'):
+        raise ValueError(f"只支援 above / below 回測: {alert_type}")
+    error = threshold_error(alert_type, threshold)
+    if error:
+        raise ValueError(error)
+    np = load_numpy()
+    if np is None:
+        return _backtest_python(timestamps, prices, threshold, alert_type, cooldown)
+
+    times = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(prices, dtype=np.float64)
+    matched = values >= threshold if alert_type == 'above' else values <= threshold
+    matched_times = times[matched]
+    crossings = int(np.count_nonzero(matched[1:] & ~matched[:-1]) + (matched[0] if len(matched) else 0))
+
+    fire_times = []
+    index = 0
+    while index < len(matched_times):
+        fired_at = matched_times[index]
+        fire_times.append(float(fired_at))
+        index = max(index + 1, int(np.searchsorted(matched_times, fired_at + cooldown, side='left')))
+    return BacktestResult(len(values), len(matched_times), crossings, fire_times)
+
+
+def _backtest_python(timestamps, prices, threshold, alert_type, cooldown):
+    """沒有 numpy 時的純 Python 版本"""
+    above = alert_type == 'above'
+    matched_times = []
+    crossings = 0
+    previous = False
+    for timestamp, price in zip(timestamps, prices):
+        matched = price >= threshold if above else price <= threshold
+        if matched:
+            matched_times.append(timestamp)
+            if not previous:
+                crossings += 1
+        previous = matched
+
+    fire_times = []
+    index = 0
+    while index < len(matched_times):
+        fired_at = matched_times[index]
+        fire_times.append(float(fired_at))
+        index = max(index + 1, bisect.bisect_left(matched_times, fired_at + cooldown))
+    return BacktestResult(len(prices), len(matched_times), crossings, fire_times)
+
+
+def run_backtest(monitor_db, symbol, threshold, alert_type='above', range_name=DEFAULT_BACKTEST_RANGE, now=None):
+    """讀取價格歷史並按監控的冷卻時間回測 (阻塞，Bot 中應在線程中執行)"""
+    now = time.time() if now is None else now
+    series = monitor_db.load_price_history(symbol, now - BACKTEST_RANGES[range_name], now)
+    return backtest(series.timestamps, series.prices, threshold, alert_type,
+                    monitor_db.alert_cooldown.total_seconds())
+
+
+def format_backtest(symbol, threshold, alert_type, range_name, result):
+    """回測結果文字"""
+    from datetime import datetime
+    text = f"🧪 **{symbol} 警報回測 ({range_name})**\n\n"
+    text += f"🎯 條件: {describe_alert(alert_type, threshold)}\n"
+    if not result.samples:
+        return text + "\n❌ 此範圍內沒有價格歷史數據\n💡 提示：開始監控後會自動回填歷史數據"
+    text += f"📈 價格樣本: {result.samples} 個\n"
+    text += f"✅ 符合條件: {result.matched} 個樣本 ({result.matched / result.samples:.1%})\n"
+    text += f"↗️ 穿越次數: {result.crossings} 次\n"
+    text += f"🚨 按冷卻規則會觸發: {len(result.fire_times)} 次\n"
+    if result.fire_times:
+        first = datetime.fromtimestamp(result.fire_times[0]).strftime('%Y-%m-%d %H:%M')
+        last = datetime.fromtimestamp(result.fire_times[-1]).strftime('%Y-%m-%d %H:%M')
+        text += f"🕐 首次: {first}\n🕐 最近: {last}\n"
+    return text
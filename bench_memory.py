@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+監控進程內存基準測試
+比較每個監控在內存中的佔用:
+- 之前: fetchall() 元組 (每行各自一份股票代碼字符串) + 每隻股票保留的完整 response.json() 回應
+- 之後: WatchSet 的 __slots__ 記錄 (股票代碼經 sys.intern 共用) + 只從回應取出 meta 和開盤價的 Quote 記錄
+
+用法: python bench_memory.py --watches 100000 --symbols 2000
+"""
+
+import argparse
+import gc
+import json
+import os
+import sqlite3
+import tempfile
+import tracemalloc
+
+from quote_cache import Quote
+from quote_client import CHART_PARAMS, extract_chart
+from stock_monitor_db import StockMonitorDB
+from watch_set import WATCH_COLUMNS, WatchSet
+
+
+def make_database(directory, watches, symbols):
+    """在 directory 中建立數據庫並批量插入監控"""
+    db_path = os.path.join(directory, 'bench_memory.db')
+    StockMonitorDB(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.executemany('''
+        INSERT INTO stock_watches (user_id, chat_id, symbol, target_price, alert_type)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((i % 5000, i % 5000, f"S{i % symbols:04d}.HK", 100.0 + i % 50, 'above' if i % 2 else 'below')
+          for i in range(watches)))
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def make_bodies(symbols):
+    """按監控的請求參數 (CHART_PARAMS) 模擬 chart 端點的完整回應字節"""
+    bodies = []
+    for i in range(symbols):
+        price = 100.0 + i
+        body = {'chart': {'result': [{
+            'meta': {
+                'currency': 'HKD', 'symbol': f"S{i:04d}.HK", 'exchangeName': 'HKG', 'fullExchangeName': 'HKSE',
+                'instrumentType': 'EQUITY', 'firstTradeDate': 946863000, 'regularMarketTime': 1718007400 + i,
+                'hasPrePostMarketData': False, 'gmtoffset': 28800, 'timezone': 'HKT',
+                'exchangeTimezoneName': 'Asia/Hong_Kong', 'regularMarketPrice': price,
+                'fiftyTwoWeekHigh': price * 1.3, 'fiftyTwoWeekLow': price * 0.7,
+                'regularMarketDayHigh': price * 1.01, 'regularMarketDayLow': price * 0.99,
+                'regularMarketVolume': 1000 + i, 'longName': f"Sample Holdings {i} Ltd",
+                'shortName': f"SAMPLE {i}", 'chartPreviousClose': price - 1, 'priceHint': 3,
+                'currentTradingPeriod': {
+                    name: {'timezone': 'HKT', 'start': 1717983000 + offset, 'end': 1718007600 + offset,
+                           'gmtoffset': 28800}
+                    for name, offset in (('pre', -3600), ('regular', 0), ('post', 3600))
+                },
+                'dataGranularity': CHART_PARAMS['interval'], 'range': CHART_PARAMS['range'],
+                'validRanges': ['1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max'],
+            },
+            'timestamp': [1717983000],
+            'indicators': {
+                'quote': [{'open': [price - 0.5], 'high': [price * 1.01], 'close': [price],
+                           'low': [price * 0.99], 'volume': [1000 + i]}],
+                'adjclose': [{'adjclose': [price]}],
+            },
+        }], 'error': None}}
+        bodies.append(json.dumps(body).encode())
+    return bodies
+
+
+def measure(build):
+    """返回 build() 的結果仍被持有時新增的內存字節數"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def before(db_path, bodies):
+    def build():
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute(f'''
+            SELECT {WATCH_COLUMNS} FROM stock_watches WHERE is_active = 1 AND suspended_at IS NULL
+        ''').fetchall()
+        conn.close()
+        # 與 response.json() 相同: 解析並持有整個回應
+        quotes = {}
+        for body in bodies:
+            data = json.loads(body)
+            quotes[data['chart']['result'][0]['meta']['symbol']] = data
+        return rows, quotes
+    return measure(build)
+
+
+def after(db_path, bodies):
+    def build():
+        conn = sqlite3.connect(db_path)
+        watch_set = WatchSet()
+        watch_set.refresh(conn)
+        conn.close()
+        # 與 QuoteClient.fetch_quote 相同: 只解碼 meta 和開盤價，保留 Quote 記錄
+        quotes = {}
+        for body in bodies:
+            meta, open_price = extract_chart(body)
+            quotes[meta['symbol']] = Quote.from_meta(meta, open_price)
+        return watch_set, quotes
+    return measure(build)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='監控進程內存基準測試')
+    parser.add_argument('--watches', type=int, default=100000, help='監控數量')
+    parser.add_argument('--symbols', type=int, default=2000, help='股票數量')
+    args = parser.parse_args()
+
+    print(f"🚀 建立 {args.watches} 個監控 ({args.symbols} 隻股票)...")
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = make_database(directory, args.watches, args.symbols)
+        bodies = make_bodies(args.symbols)
+
+        old = before(db_path, bodies)
+        new = after(db_path, bodies)
+
+    print("=" * 50)
+    print(f"之前 : {old / 1024 / 1024:8.2f} MB ({old / args.watches:6.1f} 字節/監控)")
+    print(f"之後 : {new / 1024 / 1024:8.2f} MB ({new / args.watches:6.1f} 字節/監控)")
+    print(f"節省 : {(1 - new / old) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,254 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
+from __future__ import annotations
+
+import time
+
+# 啟動計時起點 (--startup-timing)
+_STARTUP_T0 = time.perf_counter()
+
+import asyncio
+import csv
 import datetime
-import requests
-import json
+import io
+import logging
 import os
+import sys
+import threading
+from typing import TYPE_CHECKING
+from alert_rules import ALERT_TYPES, describe_alert, is_price_alert, threshold_error
+from backfill import HistoryBackfill
+from backtest import BACKTEST_RANGES, DEFAULT_BACKTEST_RANGE, format_backtest, run_backtest
+from cache_snapshot import CacheSnapshot
+from cache_warmer import CacheWarmer, FundamentalsCache, SymbolPopularity
+from calc_engine import CalcError, UnsafeExpressionError, evaluate
+from rate_limit import DEFAULT_MESSAGE, MAX_COMPARE_SYMBOLS, CommandLimiter
+from router import CallbackRouter, classify_text, route_stats, timed
+from structured_log import dropped_records, setup_logging, shutdown as shutdown_logging, with_request_id
+from webhook_server import WebhookServer
+from chart_renderer import CHART_RANGES, DEFAULT_RANGE, ChartService
+from weather_client import WeatherClient
+from symbols import SymbolError, SymbolResolver
+from quote_client import QuoteClient
+
+# telegram、requests 和數據庫等較重的模塊在首次使用時才導入，縮短重啟時間
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
 
 TOKEN = os.environ["BOT_TOKEN"]
 
-# 創建單一數據庫實例
-try:
+# 日誌經隊列由後台線程輸出 (LOG_LEVEL / LOG_FORMAT / LOG_SAMPLE)，事件循環和監控線程不會被 stdout 阻塞
+setup_logging()
+logger = logging.getLogger("bot")
+# 每個請求的上游回應狀態 (高頻，默認抽樣；非 200 以 WARNING 記錄，不受抽樣影響)
+api_logger = logging.getLogger("bot.api")
+
+# 運行模式: polling (默認) 或 webhook
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")  # Telegram 推送更新的公開網址，例如 https://example.com/webhook
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+
+# 啟動計時: python bot_test.py --startup-timing 或 BOT_STARTUP_TIMING=1，打印各階段耗時後退出
+STARTUP_TIMING = "--startup-timing" in sys.argv or os.environ.get("BOT_STARTUP_TIMING") == "1"
+startup_marks = []
+
+def mark_startup(phase):
+    """記錄啟動階段完成時間 (距離模塊開始導入的秒數)"""
+    startup_marks.append((phase, time.perf_counter() - _STARTUP_T0))
+
+def format_startup_report():
+    lines = ["⏱️ 啟動耗時"]
+    previous = 0.0
+    for phase, elapsed in startup_marks:
+        lines.append(f"{phase:20} +{(elapsed - previous) * 1000:7.1f}ms  (累計 {elapsed * 1000:.1f}ms)")
+        previous = elapsed
+    return "\n".join(lines)
+
+# 每個用戶和每個聊天的令牌桶限流 (每秒補充數 / 上限)，提示訊息中的 {wait} 為需等待的秒數
+rate_limiter = CommandLimiter(
+    user_rate=float(os.environ.get("RATE_LIMIT_USER_RATE", "0.5")),
+    user_capacity=int(os.environ.get("RATE_LIMIT_USER_BURST", "10")),
+    chat_rate=float(os.environ.get("RATE_LIMIT_CHAT_RATE", "1")),
+    chat_capacity=int(os.environ.get("RATE_LIMIT_CHAT_BURST", "20")),
+    message=os.environ.get("RATE_LIMIT_MESSAGE", DEFAULT_MESSAGE),
+)
+
+# 同時處理的更新數量上限
+CONCURRENT_UPDATES = int(os.environ.get("BOT_CONCURRENT_UPDATES", "16"))
+
+# 股票代碼解析 (所有指令和監控共用)，設置 SYMBOL_TABLE 時載入本地交易所代碼表 (CSV: symbol,name)
+symbol_resolver = SymbolResolver()
+if os.environ.get("SYMBOL_TABLE"):
+    try:
+        logger.info("✅ 已載入 %d 個股票代碼", symbol_resolver.load_table(os.environ['SYMBOL_TABLE']))
+    except OSError as e:
+        logger.error("❌ 無法載入股票代碼表: %s", e)
+
+# 單一數據庫實例，首次使用時才創建 (連接 SQLite、檢查表結構)
+_monitor_db = None
+_monitor_db_failed = False
+_monitor_db_lock = threading.Lock()
+
+def create_monitor_db():
     from stock_monitor_db import StockMonitorDB
-    monitor_db = StockMonitorDB(bot_token=TOKEN)
-    print("✅ 數據庫實例創建成功，並已綁定 Bot Token")
-except ImportError:
-    print("❌ 無法導入 StockMonitorDB 模塊")
-    monitor_db = None
-except Exception as e:
-    print(f"❌ 數據庫初始化失敗: {e}")
-    monitor_db = None
+    from tick_store import TickStore
+    from monitor_lease import FileLockLeaseBackend, ShardLeaseManager, SQLiteLeaseBackend
+    # 設置 PRICE_HISTORY_DIR 時使用列式價格歷史存儲，否則寫入 SQLite price_history 表
+    history_dir = os.environ.get("PRICE_HISTORY_DIR")
+    # 多實例部署: MONITOR_LEASE=sqlite (共享數據庫) 或 file (本機鎖文件)，每個分片只由一個實例監控
+    # MONITOR_INSTANCES 大於 1 時默認啟用 sqlite 租約，並把每個實例的分片數上限設為 ceil(分片數 / 實例數)
+    instances = int(os.environ.get("MONITOR_INSTANCES", "1"))
+    lease_mode = os.environ.get("MONITOR_LEASE") or ("sqlite" if instances > 1 else None)
+    lease_manager = None
+    if lease_mode == "sqlite":
+        lease_backend = SQLiteLeaseBackend(os.environ.get("MONITOR_LEASE_DB", "stock_monitor.db"))
+    elif lease_mode == "file":
+        lease_backend = FileLockLeaseBackend(os.environ.get("MONITOR_LEASE_DIR", "monitor_leases"))
+    else:
+        lease_backend = None
+    if lease_backend is not None:
+        max_shards = os.environ.get("MONITOR_MAX_SHARDS")
+        lease_manager = ShardLeaseManager(
+            lease_backend,
+            num_shards=int(os.environ.get("MONITOR_SHARDS", "16")),
+            ttl=int(os.environ.get("MONITOR_LEASE_TTL", "60")),
+            max_shards=int(max_shards) if max_shards else None,
+            instances=instances,
+        )
+    monitor_db = StockMonitorDB(bot_token=TOKEN, history_backend=TickStore(history_dir) if history_dir else None,
+                                lease_manager=lease_manager, symbol_resolver=symbol_resolver)
+    # 新股票第一次被監控時回填歷史數據 (BACKFILL_RANGE 設為空字串時停用)，線程在 start_monitoring 中啟動
+    backfill_range = os.environ.get("BACKFILL_RANGE", "6mo")
+    if backfill_range:
+        monitor_db.backfill = HistoryBackfill(monitor_db.history, range_=backfill_range,
+                                              interval=os.environ.get("BACKFILL_INTERVAL", "1h"),
+                                              rate=float(os.environ.get("BACKFILL_RATE", "0.5")))
+    return monitor_db
+
+def get_monitor_db():
+    """返回數據庫實例，不可用時返回 None"""
+    global _monitor_db, _monitor_db_failed
+    if _monitor_db is not None or _monitor_db_failed:
+        return _monitor_db
+    with _monitor_db_lock:
+        if _monitor_db is None and not _monitor_db_failed:
+            try:
+                _monitor_db = create_monitor_db()
+                logger.info("✅ 數據庫實例創建成功，並已綁定 Bot Token")
+            except ImportError:
+                logger.error("❌ 無法導入 StockMonitorDB 模塊")
+                _monitor_db_failed = True
+            except Exception as e:
+                logger.error("❌ 數據庫初始化失敗: %s", e, exc_info=True)
+                _monitor_db_failed = True
+    return _monitor_db
+
+def load_price_history(symbol, start=None, end=None):
+    monitor_db = get_monitor_db()
+    return monitor_db.load_price_history(symbol, start, end) if monitor_db else None
+
+async def resolve_symbol(update: Update, text):
+    """解析用戶輸入的股票代碼，無效時直接回覆並返回 None (不會請求 Yahoo)"""
+    try:
+        symbol = symbol_resolver.resolve(text)
+    except SymbolError as e:
+        await update.message.reply_text(f"❌ {e}\n請檢查股票代碼是否正確")
+        return None
+    symbol_popularity.record(symbol)
+    return symbol
+
+# 指令查詢次數 (開市前預熱按此和監控數量選股) 和 quoteSummary 基本面緩存 (同時記錄代碼有效性)
+symbol_popularity = SymbolPopularity()
+fundamentals_cache = FundamentalsCache(symbol_resolver=symbol_resolver)
+
+def cached_quote(symbol):
+    """共享報價緩存中未過期的報價 (監控線程、開市前預熱和指令都會寫入)"""
+    monitor_db = get_monitor_db()
+    return monitor_db.quote_cache.get(symbol) if monitor_db else None
+
+# 指令共用的報價客戶端 (Yahoo Finance chart 端點，每個線程一個 Session，請求有超時)
+quote_client = QuoteClient()
+
+async def request_quote(symbol):
+    """在線程中請求股票報價 (不阻塞事件循環)，成功時放入共享緩存，返回 (狀態碼, Quote 或 None)"""
+    status_code, quote = await asyncio.to_thread(quote_client.fetch_quote, symbol)
+    api_logger.log(logging.INFO if status_code == 200 else logging.WARNING,
+                   "Stock API Response Status: %s", status_code, extra={'symbol': symbol, 'status': status_code})
+    symbol_resolver.record_response(symbol, status_code)
+    if quote is not None:
+        monitor_db = get_monitor_db()
+        if monitor_db:
+            monitor_db.quote_cache.set(symbol, quote)
+    return status_code, quote
+
+async def fetch_quote(update: Update, symbol):
+    """請求股票報價並放入共享緩存，失敗時直接回覆並返回 None"""
+    status_code, quote = await request_quote(symbol)
+    if status_code != 200:
+        await update.message.reply_text(f"❌ 無法獲取 {symbol} 的股票資訊 (狀態碼: {status_code})")
+        return None
+    if quote is None:
+        await update.message.reply_text(f"❌ 無法獲取 {symbol} 的股票資訊\n請檢查股票代碼是否正確")
+        return None
+    return quote
+
+async def get_quotes(symbols):
+    """多隻股票的報價：先取共享緩存，缺少的並行請求，返回 {symbol: Quote}，失敗的股票不包括在內"""
+    quotes = {}
+    missing = []
+    for symbol in symbols:
+        quote = cached_quote(symbol)
+        if quote is not None:
+            quotes[symbol] = quote
+        else:
+            missing.append(symbol)
+    results = await asyncio.gather(*(request_quote(symbol) for symbol in missing), return_exceptions=True)
+    for symbol, result in zip(missing, results):
+        if isinstance(result, Exception):
+            logger.warning("Stock API Exception: %s", result, extra={'symbol': symbol})
+        elif result[1] is not None:
+            quotes[symbol] = result[1]
+    return quotes
+
+def format_quote_text(symbol, quote):
+    """股票基本資訊 (/stock 和 /stockinfo 共用)"""
+    def format_price(price):
+        if price is None:
+            return 'N/A'
+        return f"{price:.2f}"
+    
+    # 計算漲跌幅
+    if quote.previousClose:
+        change = quote.price - quote.previousClose
+        change_percent = (change / quote.previousClose) * 100
+        change_symbol = "📈" if change >= 0 else "📉"
+    else:
+        change = None
+        change_percent = None
+        change_symbol = "📊"
+    
+    text = f"📊 **{symbol} 股票資訊**\n\n"
+    text += f"💰 現價：{format_price(quote.price)}\n"
+    text += f"{change_symbol} 漲跌：{format_price(change)} ({format_price(change_percent)}%)\n"
+    text += f"🔄 昨收：{format_price(quote.previousClose)}\n"
+    text += f"🚪 開盤：{format_price(quote.open)}\n"
+    text += f"⬆️ 最高：{format_price(quote.high)}\n"
+    text += f"⬇️ 最低：{format_price(quote.low)}\n"
+    text += f"📈 成交量：{quote.volume:,}" if quote.volume is not None else "📈 成交量：N/A"
+    return text
+
+# 天氣查詢客戶端 (OpenWeatherMap API，免費版)
+# 你需要註冊獲取 API key: https://openweathermap.org/api
+weather_client = WeatherClient(api_key=os.environ.get("WEATHER_API_KEY", "9ffedf5725fcf3b1a942387eada4856a"))
+
+# 圖表服務 (chart 端點不可用時改用價格歷史)
+chart_service = ChartService(history_loader=load_price_history)
 
 # 當用戶輸入 /start 時觸發
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
     keyboard = [
         [InlineKeyboardButton("🕐 現在時間", callback_data='time')],
         [InlineKeyboardButton("🧮 計算器", callback_data='calculator')],
@@ -53,9 +281,18 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /stockinfo <代碼> - 詳細股票資訊 (財務數據、P/E比率等) (例: /stockinfo 0005.HK)
 /stocknews <代碼> - 股票相關新聞
 /stockcompare <代碼1> <代碼2> - 股票比較 (例: /stockcompare AAPL MSFT)
+/chart <代碼> [範圍] - 價格/成交量圖表 (例: /chart 0700.HK 3mo)
 /stockwatch <代碼> <價格> - 設置股票監控 (例: /stockwatch 0005.HK 50.0)
+/stockwatch <代碼> <門檻> <類型> - 設置相對警報 (例: /stockwatch 0700.HK 5 pct_up)
+  類型: above, below, pct_up, pct_down, volume_spike, gap_up, gap_down
+/stockwatch <代碼:價格[:類型]> ... - 批量設置監控 (例: /stockwatch 0005.HK:50 0700.HK:300:below)
+/exportwatch - 導出監控列表 (CSV)
+上傳 CSV 文件 (代碼,價格,類型) - 批量導入監控
 /watchlist - 查看監控列表
 /removewatch <ID> - 移除監控 (例: /removewatch 1)
+/resumewatch <ID> - 恢復已暫停的監控 (例: /resumewatch 1)
+/backtest <代碼> <價格> [above|below] [範圍] - 用價格歷史回測警報 (例: /backtest 0700.HK 300 above 6mo)
+/routestats - 查看各指令的調用次數和延遲
 
 互動功能:
 - 點擊下方按鈕使用功能
@@ -79,13 +316,10 @@ async def calc_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         # 安全的數學計算
-        allowed_chars = set('0123456789+-*/.() ')
-        if not all(c in allowed_chars for c in expression):
-            await update.message.reply_text("❌ 算式包含不安全的字符！")
-            return
-        
-        result = eval(expression)
+        result = evaluate(expression)
         await update.message.reply_text(f"🧮 計算結果：{expression} = {result}")
+    except UnsafeExpressionError:
+        await update.message.reply_text("❌ 算式包含不安全的字符！")
     except Exception as e:
         await update.message.reply_text(f"❌ 計算錯誤：{str(e)}")
 
@@ -97,17 +331,14 @@ async def weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     city = ' '.join(context.args)
     try:
-        # 使用 OpenWeatherMap API (免費版)
-        # 你需要註冊獲取 API key: https://openweathermap.org/api
-        api_key = "9ffedf5725fcf3b1a942387eada4856a"  # 替換成你的 API key
-        url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric&lang=zh_tw"
+        result = await weather_client.get_weather(city)
+        # 返回舊數據表示上游請求失敗，同樣以 WARNING 記錄
+        api_logger.log(logging.INFO if result.status_code == 200 and not result.stale else logging.WARNING,
+                       "Weather API Response Status: %s", result.status_code,
+                       extra={'status': result.status_code, 'stale': result.stale})
         
-        response = requests.get(url)
-        print(f"Weather API Response Status: {response.status_code}")
-        print(f"Weather API Response: {response.text}")
-        
-        if response.status_code == 200:
-            data = response.json()
+        if result.status_code == 200:
+            data = result.data
             temp = data['main']['temp']
             humidity = data['main']['humidity']
             description = data['weather'][0]['description']
@@ -116,20 +347,24 @@ async def weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             weather_info += f"🌡️ 溫度：{temp}°C\n"
             weather_info += f"💧 濕度：{humidity}%\n"
             weather_info += f"☁️ 天氣：{description}"
+            if result.stale:
+                weather_info += f"\n⚠️ 天氣服務暫時無法連線，顯示 {int(result.age // 60)} 分鐘前的數據"
             
             await update.message.reply_text(weather_info)
+        elif result.status_code is None:
+            await update.message.reply_text(f"❌ 無法獲取 {city} 的天氣資訊\n⏰ 天氣服務連線超時，請稍後再試")
         else:
-            error_msg = f"❌ 無法獲取 {city} 的天氣資訊 (狀態碼: {response.status_code})"
-            if response.status_code == 401:
+            error_msg = f"❌ 無法獲取 {city} 的天氣資訊 (狀態碼: {result.status_code})"
+            if result.status_code == 401:
                 error_msg += "\n🔑 API Key 無效或已過期"
-            elif response.status_code == 404:
+            elif result.status_code == 404:
                 error_msg += "\n🏙️ 找不到該城市，請檢查城市名稱"
-            elif response.status_code == 429:
+            elif result.status_code == 429:
                 error_msg += "\n⏰ API 請求次數已達上限，請稍後再試"
             await update.message.reply_text(error_msg)
     except Exception as e:
         await update.message.reply_text(f"❌ 天氣查詢錯誤：{str(e)}")
-        print(f"Weather API Exception: {e}")
+        logger.warning("Weather API Exception: %s", e)
 
 # 當用戶輸入 /stock 時觸發
 async def stock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -137,66 +372,16 @@ async def stock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("請輸入股票代碼！例：/stock AAPL 或 /stock 0700.HK")
         return
     
-    symbol = ' '.join(context.args).upper()
+    symbol = await resolve_symbol(update, ' '.join(context.args))
+    if symbol is None:
+        return
     try:
-        # 使用 Yahoo Finance API (免費版)
-        url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        response = requests.get(url, headers=headers)
-        print(f"Stock API Response Status: {response.status_code}")
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            if 'chart' in data and 'result' in data['chart'] and data['chart']['result']:
-                result = data['chart']['result'][0]
-                meta = result['meta']
-                quote = result['indicators']['quote'][0]
-                
-                # 獲取股票信息
-                current_price = meta.get('regularMarketPrice', 'N/A')
-                previous_close = meta.get('previousClose', 'N/A')
-                open_price = meta.get('regularMarketOpen', 'N/A')
-                high = meta.get('regularMarketDayHigh', 'N/A')
-                low = meta.get('regularMarketDayLow', 'N/A')
-                volume = meta.get('regularMarketVolume', 'N/A')
-                
-                # 計算漲跌幅
-                if current_price != 'N/A' and previous_close != 'N/A':
-                    change = current_price - previous_close
-                    change_percent = (change / previous_close) * 100
-                    change_symbol = "📈" if change >= 0 else "📉"
-                else:
-                    change = 'N/A'
-                    change_percent = 'N/A'
-                    change_symbol = "📊"
-                
-                # 格式化價格
-                def format_price(price):
-                    if price == 'N/A':
-                        return 'N/A'
-                    return f"{price:.2f}"
-                
-                stock_info = f"📊 **{symbol} 股票資訊**\n\n"
-                stock_info += f"💰 現價：{format_price(current_price)}\n"
-                stock_info += f"{change_symbol} 漲跌：{format_price(change)} ({format_price(change_percent)}%)\n"
-                stock_info += f"🔄 昨收：{format_price(previous_close)}\n"
-                stock_info += f"🚪 開盤：{format_price(open_price)}\n"
-                stock_info += f"⬆️ 最高：{format_price(high)}\n"
-                stock_info += f"⬇️ 最低：{format_price(low)}\n"
-                stock_info += f"📈 成交量：{volume:,}" if volume != 'N/A' else "📈 成交量：N/A"
-                
-                await update.message.reply_text(stock_info, parse_mode='Markdown')
-            else:
-                await update.message.reply_text(f"❌ 無法獲取 {symbol} 的股票資訊\n請檢查股票代碼是否正確")
-        else:
-            await update.message.reply_text(f"❌ 無法獲取 {symbol} 的股票資訊 (狀態碼: {response.status_code})")
+        quote = cached_quote(symbol) or await fetch_quote(update, symbol)
+        if quote is not None:
+            await update.message.reply_text(format_quote_text(symbol, quote), parse_mode='Markdown')
     except Exception as e:
         await update.message.reply_text(f"❌ 股票查詢錯誤：{str(e)}")
-        print(f"Stock API Exception: {e}")
+        logger.warning("Stock API Exception: %s", e, extra={'symbol': symbol})
 
 # 當用戶輸入 /stockinfo 時觸發 - 詳細股票信息
 async def stockinfo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -204,161 +389,106 @@ async def stockinfo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("請輸入股票代碼！例：/stockinfo 0005.HK 或 /stockinfo AAPL")
         return
     
-    symbol = ' '.join(context.args).upper()
-    
-    # 處理香港股票代碼格式
-    if symbol.endswith('.HK'):
-        # 確保是4位數字格式
-        base_symbol = symbol.replace('.HK', '')
-        if base_symbol.isdigit():
-            symbol = f"{base_symbol.zfill(4)}.HK"
-    elif symbol.isdigit() and len(symbol) <= 4:
-        # 如果是純數字，自動添加.HK後綴
-        symbol = f"{symbol.zfill(4)}.HK"
+    symbol = await resolve_symbol(update, ' '.join(context.args))
+    if symbol is None:
+        return
     
     try:
-        # 首先嘗試獲取基本股票信息
-        basic_url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        basic_response = requests.get(basic_url, headers=headers)
+        # 首先獲取基本股票信息
+        quote = cached_quote(symbol) or await fetch_quote(update, symbol)
+        if quote is None:
+            return
+        info_text = format_quote_text(symbol, quote)
         
-        if basic_response.status_code == 200:
-            basic_data = basic_response.json()
-            if 'chart' in basic_data and 'result' in basic_data['chart'] and basic_data['chart']['result']:
-                result = basic_data['chart']['result'][0]
-                meta = result['meta']
-                
-                # 獲取基本價格信息
-                current_price = meta.get('regularMarketPrice', 'N/A')
-                previous_close = meta.get('previousClose', 'N/A')
-                open_price = meta.get('regularMarketOpen', 'N/A')
-                high = meta.get('regularMarketDayHigh', 'N/A')
-                low = meta.get('regularMarketDayLow', 'N/A')
-                volume = meta.get('regularMarketVolume', 'N/A')
-                
-                # 計算漲跌幅
-                if current_price != 'N/A' and previous_close != 'N/A':
-                    change = current_price - previous_close
-                    change_percent = (change / previous_close) * 100
-                    change_symbol = "📈" if change >= 0 else "📉"
-                else:
-                    change = 'N/A'
-                    change_percent = 'N/A'
-                    change_symbol = "📊"
-                
-                # 格式化價格
-                def format_price(price):
-                    if price == 'N/A':
-                        return 'N/A'
-                    return f"{price:.2f}"
-                
-                # 構建基本信息
-                info_text = f"📊 **{symbol} 股票資訊**\n\n"
-                info_text += f"💰 現價：{format_price(current_price)}\n"
-                info_text += f"{change_symbol} 漲跌：{format_price(change)} ({format_price(change_percent)}%)\n"
-                info_text += f"🔄 昨收：{format_price(previous_close)}\n"
-                info_text += f"🚪 開盤：{format_price(open_price)}\n"
-                info_text += f"⬆️ 最高：{format_price(high)}\n"
-                info_text += f"⬇️ 最低：{format_price(low)}\n"
-                info_text += f"📈 成交量：{volume:,}" if volume != 'N/A' else "📈 成交量：N/A"
-                
-                # 嘗試獲取詳細財務數據
-                try:
-                    detail_url = f"https://query1.finance.yahoo.com/v10/finance/quoteSummary/{symbol}?modules=summaryDetail,financialData,defaultKeyStatistics"
-                    detail_response = requests.get(detail_url, headers=headers)
-                    
-                    if detail_response.status_code == 200:
-                        detail_data = detail_response.json()
-                        quote_summary = detail_data.get('quoteSummary', {}).get('result', [{}])[0]
-                        
-                        # 基本財務數據
-                        if 'financialData' in quote_summary:
-                            financial = quote_summary['financialData']
-                            info_text += "\n\n💰 **財務數據**\n"
+        # 嘗試獲取詳細財務數據 (優先使用基本面緩存，開市前會預熱)
+        try:
+            quote_summary = fundamentals_cache.get(symbol) or await asyncio.to_thread(fundamentals_cache.fetch, symbol)
+            
+            if quote_summary:
+                # 基本財務數據
+                if 'financialData' in quote_summary:
+                    financial = quote_summary['financialData']
+                    info_text += "\n\n💰 **財務數據**\n"
                             
-                            market_cap = financial.get('marketCap')
-                            if market_cap:
-                                if market_cap >= 1e12:
-                                    info_text += f"市值：${market_cap/1e12:.2f}T\n"
-                                elif market_cap >= 1e9:
-                                    info_text += f"市值：${market_cap/1e9:.2f}B\n"
-                                elif market_cap >= 1e6:
-                                    info_text += f"市值：${market_cap/1e6:.2f}M\n"
-                                else:
-                                    info_text += f"市值：${market_cap:,.0f}\n"
-                            else:
-                                info_text += "市值：N/A\n"
+                    market_cap = financial.get('marketCap')
+                    if market_cap:
+                        if market_cap >= 1e12:
+                            info_text += f"市值：${market_cap/1e12:.2f}T\n"
+                        elif market_cap >= 1e9:
+                            info_text += f"市值：${market_cap/1e9:.2f}B\n"
+                        elif market_cap >= 1e6:
+                            info_text += f"市值：${market_cap/1e6:.2f}M\n"
+                        else:
+                            info_text += f"市值：${market_cap:,.0f}\n"
+                    else:
+                        info_text += "市值：N/A\n"
                             
-                            forward_pe = financial.get('forwardPE')
-                            if forward_pe:
-                                info_text += f"P/E比率：{forward_pe:.2f}\n"
-                            else:
-                                info_text += "P/E比率：N/A\n"
+                    forward_pe = financial.get('forwardPE')
+                    if forward_pe:
+                        info_text += f"P/E比率：{forward_pe:.2f}\n"
+                    else:
+                        info_text += "P/E比率：N/A\n"
                             
-                            roe = financial.get('returnOnEquity')
-                            if roe:
-                                info_text += f"ROE：{roe:.2%}\n"
-                            else:
-                                info_text += "ROE：N/A\n"
+                    roe = financial.get('returnOnEquity')
+                    if roe:
+                        info_text += f"ROE：{roe:.2%}\n"
+                    else:
+                        info_text += "ROE：N/A\n"
                             
-                            debt_to_equity = financial.get('debtToEquity')
-                            if debt_to_equity:
-                                info_text += f"債務權益比：{debt_to_equity:.2f}\n"
-                            else:
-                                info_text += "債務權益比：N/A\n"
+                    debt_to_equity = financial.get('debtToEquity')
+                    if debt_to_equity:
+                        info_text += f"債務權益比：{debt_to_equity:.2f}\n"
+                    else:
+                        info_text += "債務權益比：N/A\n"
                         
-                        # 交易統計
-                        if 'summaryDetail' in quote_summary:
-                            summary = quote_summary['summaryDetail']
-                            info_text += "\n📈 **交易統計**\n"
+                # 交易統計
+                if 'summaryDetail' in quote_summary:
+                    summary = quote_summary['summaryDetail']
+                    info_text += "\n📈 **交易統計**\n"
                             
-                            fifty_two_week_high = summary.get('fiftyTwoWeekHigh')
-                            if fifty_two_week_high:
-                                info_text += f"52週高：{fifty_two_week_high:.2f}\n"
-                            else:
-                                info_text += "52週高：N/A\n"
+                    fifty_two_week_high = summary.get('fiftyTwoWeekHigh')
+                    if fifty_two_week_high:
+                        info_text += f"52週高：{fifty_two_week_high:.2f}\n"
+                    else:
+                        info_text += "52週高：N/A\n"
                             
-                            fifty_two_week_low = summary.get('fiftyTwoWeekLow')
-                            if fifty_two_week_low:
-                                info_text += f"52週低：{fifty_two_week_low:.2f}\n"
-                            else:
-                                info_text += "52週低：N/A\n"
+                    fifty_two_week_low = summary.get('fiftyTwoWeekLow')
+                    if fifty_two_week_low:
+                        info_text += f"52週低：{fifty_two_week_low:.2f}\n"
+                    else:
+                        info_text += "52週低：N/A\n"
                             
-                            avg_volume = summary.get('averageVolume')
-                            if avg_volume:
-                                info_text += f"平均成交量：{avg_volume:,}\n"
-                            else:
-                                info_text += "平均成交量：N/A\n"
+                    avg_volume = summary.get('averageVolume')
+                    if avg_volume:
+                        info_text += f"平均成交量：{avg_volume:,}\n"
+                    else:
+                        info_text += "平均成交量：N/A\n"
                             
-                            dividend_yield = summary.get('dividendYield')
-                            if dividend_yield:
-                                info_text += f"股息收益率：{dividend_yield:.2%}\n"
-                            else:
-                                info_text += "股息收益率：N/A\n"
+                    dividend_yield = summary.get('dividendYield')
+                    if dividend_yield:
+                        info_text += f"股息收益率：{dividend_yield:.2%}\n"
+                    else:
+                        info_text += "股息收益率：N/A\n"
                     
-                except Exception as detail_e:
-                    print(f"Detail API Exception: {detail_e}")
-                    info_text += "\n\n⚠️ 無法獲取詳細財務數據，僅顯示基本價格信息"
-                
-                await update.message.reply_text(info_text, parse_mode='Markdown')
-            else:
-                await update.message.reply_text(f"❌ 無法獲取 {symbol} 的股票資訊\n請檢查股票代碼是否正確")
-        else:
-            await update.message.reply_text(f"❌ 無法獲取 {symbol} 的股票資訊 (狀態碼: {basic_response.status_code})")
+        except Exception as detail_e:
+            logger.warning("Detail API Exception: %s", detail_e, extra={'symbol': symbol})
+            info_text += "\n\n⚠️ 無法獲取詳細財務數據，僅顯示基本價格信息"
+        
+        await update.message.reply_text(info_text, parse_mode='Markdown')
     except Exception as e:
         await update.message.reply_text(f"❌ 詳細資訊查詢錯誤：{str(e)}")
-        print(f"Stockinfo API Exception: {e}")
+        logger.warning("Stockinfo API Exception: %s", e, extra={'symbol': symbol})
 
 # 當用戶輸入 /stocknews 時觸發 - 股票相關新聞
 async def stocknews_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    import requests
     if not context.args:
         await update.message.reply_text("請輸入股票代碼！例：/stocknews AAPL")
         return
     
-    symbol = ' '.join(context.args).upper()
+    symbol = await resolve_symbol(update, ' '.join(context.args))
+    if symbol is None:
+        return
     try:
         # 獲取股票相關新聞
         url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
@@ -366,7 +496,8 @@ async def stocknews_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
         
-        response = requests.get(url, headers=headers)
+        response = await asyncio.to_thread(requests.get, url, headers=headers, timeout=10)
+        symbol_resolver.record_response(symbol, response.status_code)
         
         if response.status_code == 200:
             data = response.json()
@@ -405,89 +536,185 @@ async def stockcompare_command(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("請輸入至少兩個股票代碼進行比較！例：/stockcompare AAPL MSFT")
         return
     
-    symbols = [arg.upper() for arg in context.args[:5]]  # 最多比較5個股票
+    # 限流按比較的股票數量扣除令牌 (rate_limit.COMMAND_COSTS)
+    symbols, errors = symbol_resolver.resolve_many(context.args[:MAX_COMPARE_SYMBOLS])
+    if not symbols:
+        await update.message.reply_text("❌ " + "\n❌ ".join(errors))
+        return
     try:
         compare_text = f"📊 **股票比較** ({', '.join(symbols)})\n\n"
+        for error in errors:
+            compare_text += f"❌ {error}\n"
         
         for symbol in symbols:
-            url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            response = requests.get(url, headers=headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'chart' in data and 'result' in data['chart'] and data['chart']['result']:
-                    result = data['chart']['result'][0]
-                    meta = result['meta']
-                    
-                    current_price = meta.get('regularMarketPrice', 'N/A')
-                    previous_close = meta.get('previousClose', 'N/A')
-                    
-                    if current_price != 'N/A' and previous_close != 'N/A':
-                        change_percent = ((current_price - previous_close) / previous_close) * 100
-                        change_symbol = "📈" if change_percent >= 0 else "📉"
-                        compare_text += f"{change_symbol} **{symbol}**: ${current_price:.2f} ({change_percent:+.2f}%)\n"
-                    else:
-                        compare_text += f"📊 **{symbol}**: 數據不可用\n"
-                else:
-                    compare_text += f"❌ **{symbol}**: 無法獲取數據\n"
+            symbol_popularity.record(symbol)
+        # 先取共享緩存，缺少的股票並行請求 (每隻最多一次)
+        quotes = await get_quotes(symbols)
+        
+        for symbol in symbols:
+            quote = quotes.get(symbol)
+            if quote is None:
+                compare_text += f"❌ **{symbol}**: 無法獲取數據\n"
+            elif quote.previousClose:
+                change_percent = ((quote.price - quote.previousClose) / quote.previousClose) * 100
+                change_symbol = "📈" if change_percent >= 0 else "📉"
+                compare_text += f"{change_symbol} **{symbol}**: ${quote.price:.2f} ({change_percent:+.2f}%)\n"
             else:
-                compare_text += f"❌ **{symbol}**: 請求失敗\n"
+                compare_text += f"📊 **{symbol}**: 數據不可用\n"
         
         await update.message.reply_text(compare_text, parse_mode='Markdown')
     except Exception as e:
         await update.message.reply_text(f"❌ 股票比較錯誤：{str(e)}")
 
+# 當用戶輸入 /chart 時觸發 - 股票圖表
+async def chart_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not context.args:
+        await update.message.reply_text(f"請輸入股票代碼！例：/chart 0700.HK 3mo\n可用範圍：{', '.join(CHART_RANGES)}")
+        return
+    
+    symbol = await resolve_symbol(update, context.args[0])
+    if symbol is None:
+        return
+    range_name = context.args[1].lower() if len(context.args) > 1 else DEFAULT_RANGE
+    
+    if range_name not in CHART_RANGES:
+        await update.message.reply_text(f"❌ 不支援的範圍：{range_name}\n可用範圍：{', '.join(CHART_RANGES)}")
+        return
+    
+    if not chart_service.available():
+        await update.message.reply_text("❌ 圖表功能需要安裝 matplotlib")
+        return
+    
+    try:
+        image = await chart_service.get_chart(symbol, range_name)
+        if image is None:
+            await update.message.reply_text(f"❌ 無法獲取 {symbol} 的圖表數據\n請檢查股票代碼是否正確")
+            return
+        await update.message.reply_photo(photo=image, caption=f"📈 {symbol} ({range_name})")
+    except Exception as e:
+        await update.message.reply_text(f"❌ 圖表生成錯誤：{str(e)}")
+        logger.warning("Chart Exception: %s", e, extra={'symbol': symbol})
+
+# 批量監控的 CSV 文件大小上限
+MAX_WATCH_CSV_BYTES = 64 * 1024
+
+def parse_watch_pairs(args):
+    """解析批量監控參數 代碼:價格[:類型]"""
+    entries = []
+    errors = []
+    for arg in args:
+        parts = arg.split(':')
+        if len(parts) not in (2, 3) or not parts[0]:
+            errors.append((arg, "格式應為 代碼:價格[:類型]"))
+            continue
+        alert_type = parts[2].lower() if len(parts) == 3 else 'above'
+        entries.append((parts[0].upper(), parts[1], alert_type))
+    return entries, errors
+
+def parse_watch_csv(text):
+    """解析監控 CSV (symbol,target_price[,alert_type])，忽略標題行和 # 開頭的行"""
+    entries = []
+    for row in csv.reader(io.StringIO(text)):
+        if not row or not row[0].strip() or row[0].strip().startswith('#'):
+            continue
+        if row[0].strip().lower() == 'symbol':
+            continue
+        target_price = row[1].strip() if len(row) > 1 else ''
+        alert_type = row[2].strip().lower() if len(row) > 2 and row[2].strip() else 'above'
+        entries.append((row[0].strip().upper(), target_price, alert_type))
+    return entries
+
+async def add_watches_and_reply(update: Update, entries, errors):
+    """批量添加監控，並以一次並發請求獲取所有股票的現價"""
+    monitor_db = get_monitor_db()
+    if monitor_db is None:
+        await update.message.reply_text("⚠️ 數據庫模塊未找到\n💡 提示：請確保 stock_monitor_db.py 文件存在")
+        return
+    
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
+    loop = asyncio.get_running_loop()
+    
+    added, rejected = await loop.run_in_executor(None, monitor_db.add_watches, user_id, chat_id, entries)
+    quotes = await loop.run_in_executor(None, monitor_db.get_stock_quotes, [watch[1] for watch in added])
+    
+    lines = ["👀 批量股票監控設置", "", f"✅ 已添加 {len(added)} 個監控"]
+    for watch_id, symbol, target_price, alert_type in added:
+        line = f"🆔 {watch_id} | {symbol} | {describe_alert(alert_type, target_price)}"
+        if symbol in quotes:
+            line += f" | 現價 ${quotes[symbol]['price']:.2f}"
+        lines.append(line)
+    
+    failures = errors + [(f"{entry[0]}:{entry[1]}", reason) for entry, reason in rejected]
+    if failures:
+        lines.append("")
+        lines.append(f"❌ 未添加 {len(failures)} 個")
+        lines.extend(f"• {item}: {reason}" for item, reason in failures)
+    
+    text = "\n".join(lines)
+    if len(text) > 4000:
+        text = text[:4000] + "\n…"
+    await update.message.reply_text(text)
+
 # 當用戶輸入 /stockwatch 時觸發 - 設置股票監控
 async def stockwatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # 批量模式: /stockwatch 0005.HK:50 0700.HK:300:below
+    if any(':' in arg for arg in context.args):
+        entries, errors = parse_watch_pairs(context.args)
+        try:
+            await add_watches_and_reply(update, entries, errors)
+        except Exception as e:
+            await update.message.reply_text(f"❌ 批量監控設置錯誤：{str(e)}")
+        return
+    
     if len(context.args) < 2:
         await update.message.reply_text("請輸入股票代碼和目標價格！例：/stockwatch 0005.HK 50.0")
         return
     
+    monitor_db = get_monitor_db()
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
-    symbol = context.args[0].upper()
+    alert_type = context.args[2].lower() if len(context.args) > 2 else 'above'
+    if alert_type not in ALERT_TYPES:
+        await update.message.reply_text(f"❌ 不支援的警報類型：{alert_type}\n可用類型：{', '.join(ALERT_TYPES)}")
+        return
     try:
         target_price = float(context.args[1])
+        error = threshold_error(alert_type, target_price)
+        if error:
+            await update.message.reply_text(f"❌ {error}")
+            return
         
-        # 處理香港股票代碼格式
-        if symbol.endswith('.HK'):
-            base_symbol = symbol.replace('.HK', '')
-            if base_symbol.isdigit():
-                symbol = f"{base_symbol.zfill(4)}.HK"
-        elif symbol.isdigit() and len(symbol) <= 4:
-            symbol = f"{symbol.zfill(4)}.HK"
+        symbol = await resolve_symbol(update, context.args[0])
+        if symbol is None:
+            return
         
         # 嘗試獲取當前價格進行比較
         got_current_price = False
         try:
-            url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                if 'chart' in data and 'result' in data['chart'] and data['chart']['result']:
-                    result = data['chart']['result'][0]
-                    meta = result['meta']
-                    current_price = meta.get('regularMarketPrice')
+            quote = cached_quote(symbol) or (await request_quote(symbol))[1]
+            if quote is not None:
+                current_price = quote.price
+                
+                if current_price and is_price_alert(alert_type):
+                    change = current_price - target_price
+                    change_percent = (change / target_price) * 100
+                    status_emoji = "📈" if change >= 0 else "📉"
                     
-                    if current_price:
-                        change = current_price - target_price
-                        change_percent = (change / target_price) * 100
-                        status_emoji = "📈" if change >= 0 else "📉"
-                        
-                        watch_text = f"👀 **股票監控設置**\n\n"
-                        watch_text += f"📈 股票：{symbol}\n"
-                        watch_text += f"🎯 目標價格：${target_price:.2f}\n"
-                        watch_text += f"💰 當前價格：${current_price:.2f}\n"
-                        watch_text += f"{status_emoji} 差距：${change:.2f} ({change_percent:+.2f}%)\n"
-                        watch_text += f"✅ 狀態：監控已設置\n\n"
-                        watch_text += "💡 提示：此監控已記錄，當股票達到目標價格時會通知您"
-                        got_current_price = True
+                    watch_text = f"👀 **股票監控設置**\n\n"
+                    watch_text += f"📈 股票：{symbol}\n"
+                    watch_text += f"🎯 目標價格：${target_price:.2f}\n"
+                    watch_text += f"💰 當前價格：${current_price:.2f}\n"
+                    watch_text += f"{status_emoji} 差距：${change:.2f} ({change_percent:+.2f}%)\n"
+                    watch_text += f"✅ 狀態：監控已設置\n\n"
+                    watch_text += "💡 提示：此監控已記錄，當股票達到目標價格時會通知您"
+                    got_current_price = True
+                elif current_price:
+                    watch_text = f"👀 **股票監控設置**\n\n"
+                    watch_text += f"📈 股票：{symbol}\n"
+                    watch_text += f"🎯 警報條件：{describe_alert(alert_type, target_price)}\n"
+                    watch_text += f"💰 當前價格：${current_price:.2f}\n"
+                    got_current_price = True
         except:
             pass
         
@@ -495,7 +722,7 @@ async def stockwatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         if not got_current_price:
             watch_text = f"👀 **股票監控設置**\n\n"
             watch_text += f"📈 股票：{symbol}\n"
-            watch_text += f"🎯 目標價格：${target_price:.2f}\n"
+            watch_text += f"🎯 警報條件：{describe_alert(alert_type, target_price)}\n"
         
         # 嘗試保存到數據庫
         try:
@@ -505,7 +732,7 @@ async def stockwatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 await update.message.reply_text(watch_text, parse_mode='Markdown')
                 return
             
-            success, message = monitor_db.add_watch(user_id, chat_id, symbol, target_price)
+            success, message = monitor_db.add_watch(user_id, chat_id, symbol, target_price, alert_type)
             
             if success:
                 watch_text += f"✅ 狀態：監控已保存到數據庫\n"
@@ -530,10 +757,89 @@ async def stockwatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     except Exception as e:
         await update.message.reply_text(f"❌ 監控設置錯誤：{str(e)}")
 
+# 當用戶輸入 /exportwatch 時觸發 - 導出監控列表為 CSV
+async def exportwatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    monitor_db = get_monitor_db()
+    if monitor_db is None:
+        await update.message.reply_text("⚠️ 數據庫模塊未找到\n💡 提示：請確保 stock_monitor_db.py 文件存在")
+        return
+    
+    try:
+        rows = monitor_db.export_watches(update.effective_user.id)
+        if not rows:
+            await update.message.reply_text("📭 目前沒有設置任何股票監控")
+            return
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['symbol', 'target_price', 'alert_type'])
+        writer.writerows(rows)
+        await update.message.reply_document(
+            document=buffer.getvalue().encode('utf-8'),
+            filename='watchlist.csv',
+            caption=f"📤 已導出 {len(rows)} 個監控，修改後上傳即可批量導入"
+        )
+    except Exception as e:
+        await update.message.reply_text(f"❌ 導出監控失敗：{str(e)}")
+
+# 當用戶上傳 CSV 文件時觸發 - 批量導入監控
+async def import_watch_csv(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    document = update.message.document
+    if document.file_size and document.file_size > MAX_WATCH_CSV_BYTES:
+        await update.message.reply_text(f"❌ CSV 文件過大 (上限 {MAX_WATCH_CSV_BYTES // 1024}KB)")
+        return
+    
+    try:
+        file = await document.get_file()
+        data = await file.download_as_bytearray()
+        entries = parse_watch_csv(bytes(data).decode('utf-8-sig'))
+        if not entries:
+            await update.message.reply_text("❌ CSV 文件中沒有監控\n格式：symbol,target_price,alert_type")
+            return
+        await add_watches_and_reply(update, entries, [])
+    except UnicodeDecodeError:
+        await update.message.reply_text("❌ 請使用 UTF-8 編碼的 CSV 文件")
+    except Exception as e:
+        await update.message.reply_text(f"❌ 導入監控失敗：{str(e)}")
+
+def watchlist_keyboard(owner_id, has_prev, has_next, first_id, last_id):
+    """監控列表的翻頁按鈕 (callback_data: wl:<列表擁有者ID>:<方向>:<游標ID>)"""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton("⬅️ 上一頁", callback_data=f"wl:{owner_id}:prev:{first_id}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("下一頁 ➡️", callback_data=f"wl:{owner_id}:next:{last_id}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+# 處理監控列表翻頁按鈕
+async def watchlist_page_callback(query):
+    monitor_db = get_monitor_db()
+    parts = query.data.split(':')
+    user_id = query.from_user.id
+    if len(parts) != 4 or parts[1] != str(user_id):
+        # 群組中其他用戶點擊 (或舊格式按鈕) 時忽略，不會用點擊者的列表覆蓋原訊息
+        return
+    _, _, direction, cursor_id = parts
+    
+    page = monitor_db.render_watch_page(user_id, int(cursor_id), direction) if monitor_db else None
+    if page is None and monitor_db is not None:
+        # 該頁的監控已被移除，回到第一頁
+        page = monitor_db.render_watch_page(user_id)
+    if page is None:
+        await query.edit_message_text("📭 目前沒有設置任何股票監控")
+        return
+    
+    text, has_prev, has_next, first_id, last_id = page
+    await query.edit_message_text(
+        text, parse_mode='Markdown', reply_markup=watchlist_keyboard(user_id, has_prev, has_next, first_id, last_id))
+
 # 當用戶輸入 /watchlist 時觸發 - 查看監控列表
 async def watchlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    monitor_db = get_monitor_db()
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
+    reply_markup = None
     
     try:
         # 嘗試從數據庫獲取監控列表
@@ -552,9 +858,9 @@ async def watchlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await update.message.reply_text(watch_text, parse_mode='Markdown')
                 return
             
-            watches = monitor_db.list_watches(user_id)
+            page = monitor_db.render_watch_page(user_id)
             
-            if isinstance(watches, str) and "沒有設置任何監控" in watches:
+            if page is None:
                 watch_text = "📊 **您的股票監控列表**\n\n"
                 watch_text += "📭 目前沒有設置任何股票監控\n\n"
                 watch_text += "📋 可用的監控命令：\n"
@@ -566,7 +872,8 @@ async def watchlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 watch_text += "• /stockwatch 0700.HK 300.0\n"
                 watch_text += "• /stockwatch AAPL 150.0"
             else:
-                watch_text = watches
+                watch_text, has_prev, has_next, first_id, last_id = page
+                reply_markup = watchlist_keyboard(user_id, has_prev, has_next, first_id, last_id)
         except ImportError:
             watch_text = "📊 **您的股票監控列表**\n\n"
             watch_text += "❌ 數據庫模塊未找到，無法顯示真實監控列表\n\n"
@@ -590,13 +897,14 @@ async def watchlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             watch_text += "• /stockwatch 0700.HK 300.0\n"
             watch_text += "• /stockwatch AAPL 150.0"
         
-        await update.message.reply_text(watch_text, parse_mode='Markdown')
+        await update.message.reply_text(watch_text, parse_mode='Markdown', reply_markup=reply_markup)
         
     except Exception as e:
         await update.message.reply_text(f"❌ 獲取監控列表失敗：{str(e)}")
 
 # 當用戶輸入 /removewatch 時觸發 - 移除監控
 async def removewatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    monitor_db = get_monitor_db()
     if not context.args:
         await update.message.reply_text("請輸入監控ID！例：/removewatch 1")
         return
@@ -647,78 +955,242 @@ async def removewatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     except Exception as e:
         await update.message.reply_text(f"❌ 移除監控失敗：{str(e)}")
 
-# 處理按鈕回調
-async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    if query.data == 'time':
-        now = datetime.datetime.now()
-        time_str = now.strftime("%Y年%m月%d日 %H:%M:%S")
-        await query.edit_message_text(f"🕐 現在時間：{time_str}")
+# 當用戶輸入 /resumewatch 時觸發 - 恢復因股票數據持續獲取失敗而暫停的監控
+async def resumewatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    monitor_db = get_monitor_db()
+    if not context.args:
+        await update.message.reply_text("請輸入監控ID！例：/resumewatch 1")
+        return
+    if monitor_db is None:
+        await update.message.reply_text("⚠️ 數據庫模塊未找到\n💡 提示：請確保 stock_monitor_db.py 文件存在")
+        return
     
-    elif query.data == 'calculator':
-        await query.edit_message_text("🧮 請使用 /calc 指令來計算算式\n例：/calc 2+3*4")
+    try:
+        watch_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text("❌ 請輸入有效的監控ID！例：/resumewatch 1")
+        return
     
-    elif query.data == 'weather':
-        await query.edit_message_text("🌤️ 請使用 /weather 指令來查詢天氣\n例：/weather Hong Kong")
+    success, message = monitor_db.resume_watch(update.effective_user.id, watch_id)
+    if success:
+        await update.message.reply_text(f"▶️ {message}\n監控會在下一輪檢查時重新獲取股票數據")
+    else:
+        await update.message.reply_text(f"❌ {message}")
+
+# 當用戶輸入 /backtest 時觸發 - 用價格歷史回測警報會觸發多少次
+async def backtest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    usage = f"例：/backtest 0700.HK 300 above 6mo\n可用範圍：{', '.join(BACKTEST_RANGES)}"
+    if len(context.args) < 2:
+        await update.message.reply_text(f"請輸入股票代碼和目標價格！{usage}")
+        return
     
-    elif query.data == 'stock':
-        await query.edit_message_text("📊 請使用 /stock 指令來查詢股票價格\n例：/stock AAPL 或 /stock 0005.HK")
+    symbol = await resolve_symbol(update, context.args[0])
+    if symbol is None:
+        return
+    try:
+        threshold = float(context.args[1])
+    except ValueError:
+        await update.message.reply_text(f"❌ 請輸入有效的目標價格！{usage}")
+        return
     
-    elif query.data == 'stockcompare':
-        await query.edit_message_text("📈 請使用 /stockcompare 指令來比較股票\n例：/stockcompare AAPL MSFT GOOGL")
+    alert_type, range_name = 'above', DEFAULT_BACKTEST_RANGE
+    for arg in context.args[2:4]:
+        arg = arg.lower()
+        if arg in ('above', 'below'):
+            alert_type = arg
+        elif arg in BACKTEST_RANGES:
+            range_name = arg
+        else:
+            await update.message.reply_text(f"❌ 不支援的參數：{arg}\n類型：above, below\n{usage}")
+            return
+    error = threshold_error(alert_type, threshold)
+    if error:
+        await update.message.reply_text(f"❌ {error}")
+        return
     
-    elif query.data == 'stocknews':
-        await query.edit_message_text("📰 請使用 /stocknews 指令來查詢股票新聞\n例：/stocknews AAPL")
+    monitor_db = get_monitor_db()
+    if monitor_db is None:
+        await update.message.reply_text("⚠️ 數據庫模塊未找到\n💡 提示：請確保 stock_monitor_db.py 文件存在")
+        return
     
-    elif query.data == 'help':
-        await query.edit_message_text("❓ 請使用 /help 指令來查看完整幫助")
+    try:
+        # 讀取歷史和計算都在線程中執行，不阻塞事件循環
+        result = await asyncio.to_thread(run_backtest, monitor_db, symbol, threshold, alert_type, range_name)
+        await update.message.reply_text(format_backtest(symbol, threshold, alert_type, range_name, result))
+    except Exception as e:
+        await update.message.reply_text(f"❌ 回測錯誤：{str(e)}")
+        logger.warning("Backtest Exception: %s", e, extra={'symbol': symbol})
+
+# 當用戶輸入 /routestats 時觸發 - 查看各指令的調用次數和延遲
+async def routestats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = route_stats.format() + "\n" + rate_limiter.format()
+    if dropped_records():
+        text += f"\n📝 日誌隊列已滿而丟棄: {dropped_records()} 條"
+    await update.message.reply_text(text)
+
+# 按鈕「現在時間」
+async def time_callback(query):
+    now = datetime.datetime.now()
+    time_str = now.strftime("%Y年%m月%d日 %H:%M:%S")
+    await query.edit_message_text(f"🕐 現在時間：{time_str}")
+
+# 按鈕回調路由表
+callback_router = CallbackRouter()
+callback_router.add('time', time_callback)
+callback_router.add_reply('calculator', "🧮 請使用 /calc 指令來計算算式\n例：/calc 2+3*4")
+callback_router.add_reply('weather', "🌤️ 請使用 /weather 指令來查詢天氣\n例：/weather Hong Kong")
+callback_router.add_reply('stock', "📊 請使用 /stock 指令來查詢股票價格\n例：/stock AAPL 或 /stock 0005.HK")
+callback_router.add_reply('stockcompare', "📈 請使用 /stockcompare 指令來比較股票\n例：/stockcompare AAPL MSFT GOOGL")
+callback_router.add_reply('stocknews', "📰 請使用 /stocknews 指令來查詢股票新聞\n例：/stocknews AAPL")
+callback_router.add_reply('help', "❓ 請使用 /help 指令來查看完整幫助")
+callback_router.add_prefix('wl:', watchlist_page_callback)
+
+# 處理按鈕回調
+async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    await callback_router.dispatch(query)
 
 # 當用戶傳送普通訊息時觸發
 async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_text = update.message.text
     
-    # 檢查是否為數學算式
-    if any(op in user_text for op in ['+', '-', '*', '/', '=']):
+    # 檢查是否為數學算式 (預編譯正則，一般聊天訊息不會進入計算)
+    if classify_text(user_text) == 'math':
         try:
             # 移除等號並計算
             expression = user_text.replace('=', '').strip()
-            allowed_chars = set('0123456789+-*/.() ')
-            if all(c in allowed_chars for c in expression):
-                result = eval(expression)
-                await update.message.reply_text(f"🧮 計算結果：{expression} = {result}")
-                return
-        except:
+            result = evaluate(expression)
+            await update.message.reply_text(f"🧮 計算結果：{expression} = {result}")
+            return
+        except CalcError:
             pass
     
     await update.message.reply_text(f"你說了: {user_text}")
 
-if __name__ == "__main__":
-    app = Application.builder().token(TOKEN).build()
-    
-    # 註冊指令和訊息處理器
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("help", help_command))
-    app.add_handler(CommandHandler("time", time_command))
-    app.add_handler(CommandHandler("calc", calc_command))
-    app.add_handler(CommandHandler("weather", weather_command))
-    app.add_handler(CommandHandler("stock", stock_command))
-    app.add_handler(CommandHandler("stockinfo", stockinfo_command))
-    app.add_handler(CommandHandler("stocknews", stocknews_command))
-    app.add_handler(CommandHandler("stockcompare", stockcompare_command))
-    app.add_handler(CommandHandler("stockwatch", stockwatch_command))
-    app.add_handler(CommandHandler("watchlist", watchlist_command))
-    app.add_handler(CommandHandler("removewatch", removewatch_command))
-    app.add_handler(CallbackQueryHandler(button_callback))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, echo))
+# 指令路由表
+COMMANDS = {
+    "start": start,
+    "help": help_command,
+    "time": time_command,
+    "calc": calc_command,
+    "weather": weather_command,
+    "stock": stock_command,
+    "stockinfo": stockinfo_command,
+    "stocknews": stocknews_command,
+    "stockcompare": stockcompare_command,
+    "chart": chart_command,
+    "stockwatch": stockwatch_command,
+    "exportwatch": exportwatch_command,
+    "watchlist": watchlist_command,
+    "removewatch": removewatch_command,
+    "resumewatch": resumewatch_command,
+    "backtest": backtest_command,
+    "routestats": routestats_command,
+}
+
+async def run_webhook(app):
+    """以 webhook 模式運行：啟動本地 HTTP 服務器並向 Telegram 登記網址"""
+    from telegram import Update
+    async def handle_update(data):
+        await app.process_update(Update.de_json(data, app.bot))
     
-    # 啟動股票監控循環（後台執行）
+    server = WebhookServer(handle_update, host=WEBHOOK_HOST, port=WEBHOOK_PORT,
+                           path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+    async with app:
+        await app.start()
+        await app.bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET,
+                                  allowed_updates=Update.ALL_TYPES)
+        await server.start()
+        logger.info("Webhook 服務器運行於 %s:%s%s", WEBHOOK_HOST, server.port, WEBHOOK_PATH)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.stop()
+            await app.stop()
+            await close_clients(app)  # post_shutdown 只由 run_polling 調用
+
+# 緩存快照文件 (重啟後載入報價、基本面和代碼有效性)，設為空字串時停用
+CACHE_SNAPSHOT_PATH = os.environ.get("CACHE_SNAPSHOT_PATH", "cache_snapshot.db")
+cache_snapshot = None
+
+def start_monitoring():
+    """創建數據庫實例並啟動股票監控循環 (在後台線程執行，不阻塞 Bot 開始接收訊息)"""
+    global cache_snapshot
+    monitor_db = get_monitor_db()
     if monitor_db is not None:
+        # 先載入快照，第一輪監控按快照中的報價時間接續，指令也可直接使用未過期的緩存
+        if CACHE_SNAPSHOT_PATH:
+            cache_snapshot = CacheSnapshot(CACHE_SNAPSHOT_PATH, monitor_db.quote_cache, fundamentals_cache,
+                                           symbol_resolver)
+            logger.info("♻️ 已載入緩存快照: %d 項", cache_snapshot.load())
+            cache_snapshot.start(int(os.environ.get("CACHE_SNAPSHOT_INTERVAL", "60")))
         started, msg = monitor_db.start_monitoring(interval_seconds=15)
-        print(f"股票監控狀態：{msg}")
+        if monitor_db.backfill is not None:
+            monitor_db.backfill.start()
+        logger.info("股票監控狀態：%s", msg)
+        # 港股和美股開市前預熱熱門股票的基本面和代碼有效性 (報價交給監控調度器)
+        CacheWarmer(monitor_db, fundamentals_cache, symbol_popularity,
+                    top_n=int(os.environ.get("CACHE_WARM_TOP_N", "50"))).start()
+    else:
+        logger.warning("⚠️ 未啟用股票監控：monitor_db 不可用")
+
+async def close_clients(app):
+    """關閉事件循環結束前需要釋放的客戶端: 天氣 HTTP 連接池和圖表進程池"""
+    await weather_client.close()
+    chart_service.shutdown()
+
+def build_application():
+    from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters
+    mark_startup("導入 telegram.ext")
+    
+    # 並發處理更新 (同一聊天的重複請求由 rate_limiter 合併)
+    app = (Application.builder().token(TOKEN).concurrent_updates(CONCURRENT_UPDATES)
+           .post_shutdown(close_clients).build())
+    mark_startup("創建 Application")
+    
+    # 註冊指令和訊息處理器 (每個更新帶 request_id，處理前先限流和合併重複請求，每個路由都記錄延遲)
+    for command, handler in COMMANDS.items():
+        app.add_handler(CommandHandler(command, with_request_id(
+            rate_limiter.guard(command, timed(f"/{command}", handler)))))
+    app.add_handler(CallbackQueryHandler(with_request_id(rate_limiter.guard("callback", button_callback))))
+    app.add_handler(MessageHandler(filters.Document.FileExtension("csv"), with_request_id(
+        rate_limiter.guard("csv_import", timed("csv_import", import_watch_csv)))))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, with_request_id(
+        rate_limiter.guard("echo", timed("echo", echo)))))
+    mark_startup("註冊處理器")
+    return app
+
+def main():
+    mark_startup("導入模塊")
+    app = build_application()
+    
+    if STARTUP_TIMING:
+        # 只計時，不連接 Telegram；數據庫在正常運行時由後台線程首次使用時創建
+        get_monitor_db()
+        mark_startup("數據庫 (延遲創建)")
+        print(format_startup_report())
+        return
+    
+    # 啟動股票監控循環（後台執行）
+    threading.Thread(target=start_monitoring, name="monitor-startup", daemon=True).start()
+
+    logger.info("Bot 運行中...")
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL:
+            raise SystemExit("❌ webhook 模式需要設置 WEBHOOK_URL")
+        if not WEBHOOK_SECRET:
+            raise SystemExit("❌ webhook 模式需要設置 WEBHOOK_SECRET")
+        try:
+            asyncio.run(run_webhook(app))
+        except KeyboardInterrupt:
+            pass
     else:
-        print("⚠️ 未啟用股票監控：monitor_db 不可用")
+        app.run_polling()  # 持續監聽新訊息
+    
+    if cache_snapshot is not None:
+        cache_snapshot.stop()  # 退出前寫入最後一次快照
+    shutdown_logging()  # 輸出隊列中剩餘的日誌
 
-    print("Bot 運行中...")
-    app.run_polling()  # 持續監聽新訊息
+if __name__ == "__main__":
+    main()
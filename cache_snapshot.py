@@ -0,0 +1,137 @@
+"""
+緩存快照 (重啟後保持緩存溫熱)
+- 定期把報價緩存 (包括列表顯示的最近價格)、quoteSummary 基本面和代碼有效性寫入本地 SQLite 小文件
+- 啟動時載入快照並保留原存入時間，各緩存仍按自己的 TTL 判斷過期；超過保留時間的記錄直接略過
+- 重啟後第一輪監控和用戶指令可以直接使用快照中未過期的數據，不必全部重新請求 Yahoo
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from quote_cache import Quote
+
+logger = logging.getLogger('stock_monitor.cache')
+
+SNAPSHOT_INTERVAL = 60         # 默認每分鐘寫入一次
+QUOTE_SNAPSHOT_MAX_AGE = 86400  # 報價在列表中作為「最近價格」顯示，保留一天
+
+
+class CacheSnapshot:
+    """把多個進程內緩存寫入 / 載入同一個快照文件，未提供的緩存略過"""
+
+    def __init__(self, path, quote_cache=None, fundamentals=None, symbol_resolver=None,
+                 quote_max_age=QUOTE_SNAPSHOT_MAX_AGE):
+        self.path = path
+        self.quote_cache = quote_cache
+        self.fundamentals = fundamentals
+        self.symbol_resolver = symbol_resolver
+        self.quote_max_age = quote_max_age
+        self.running = False
+        self.thread = None
+        self.saved = 0
+        self.loaded = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                cache TEXT NOT NULL,
+                key TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (cache, key)
+            ) WITHOUT ROWID
+        ''')
+        return conn
+
+    def _rows(self, now):
+        """收集各緩存中仍值得保留的記錄 [(cache, key, 存入時間, payload), ...]"""
+        rows = []
+        if self.quote_cache is not None:
+            for symbol, stored_at, quote in self.quote_cache.items():
+                if now - stored_at <= self.quote_max_age:
+                    payload = [getattr(quote, field) for field in Quote.__slots__]
+                    rows.append(('quote', symbol, stored_at, json.dumps(payload, separators=(',', ':'))))
+        if self.fundamentals is not None:
+            for symbol, stored_at, summary in self.fundamentals.items():
+                if now - stored_at <= self.fundamentals.ttl:
+                    rows.append(('fundamentals', symbol, stored_at, json.dumps(summary, separators=(',', ':'))))
+        if self.symbol_resolver is not None:
+            for symbol, stored_at, valid in self.symbol_resolver.items(now):
+                rows.append(('symbol', symbol, stored_at, '1' if valid else '0'))
+        return rows
+
+    def save(self, now=None):
+        """把當前緩存整體替換寫入快照 (單一事務)，返回寫入的記錄數"""
+        now = time.time() if now is None else now
+        rows = self._rows(now)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM cache_entries')
+                conn.executemany('INSERT INTO cache_entries (cache, key, stored_at, payload) VALUES (?, ?, ?, ?)',
+                                 rows)
+        finally:
+            conn.close()
+        self.saved = len(rows)
+        return len(rows)
+
+    def load(self, now=None):
+        """載入快照中未過期的記錄，返回載入的數量；快照不存在或損壞時返回 0"""
+        now = time.time() if now is None else now
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute('SELECT cache, key, stored_at, payload FROM cache_entries').fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning("載入緩存快照失敗: %s", e)
+            return 0
+
+        loaded = 0
+        for cache, key, stored_at, payload in rows:
+            age = now - stored_at
+            try:
+                if cache == 'quote' and self.quote_cache is not None and age <= self.quote_max_age:
+                    self.quote_cache.restore(key, stored_at, Quote(*json.loads(payload)))
+                elif cache == 'fundamentals' and self.fundamentals is not None and age <= self.fundamentals.ttl:
+                    self.fundamentals.restore(key, stored_at, json.loads(payload))
+                elif cache == 'symbol' and self.symbol_resolver is not None:
+                    if not self.symbol_resolver.restore(key, stored_at, payload == '1', now):
+                        continue
+                else:
+                    continue
+            except (ValueError, TypeError):
+                continue  # 舊版本或損壞的記錄
+            loaded += 1
+        self.loaded = loaded
+        return loaded
+
+    def start(self, interval=SNAPSHOT_INTERVAL):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, args=(interval,), name="cache-snapshot", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止定期寫入並寫入最後一次快照"""
+        self.running = False
+        try:
+            self.save()
+        except sqlite3.Error as e:
+            logger.warning("寫入緩存快照失敗: %s", e)
+
+    def _loop(self, interval):
+        while self.running:
+            time.sleep(interval)
+            if not self.running:
+                break
+            try:
+                self.save()
+            except sqlite3.Error as e:
+                logger.warning("寫入緩存快照失敗: %s", e)
@@ -0,0 +1,237 @@
+"""
+開市前緩存預熱
+- 港股和美股開市前幾分鐘，按活躍監控數量和近期指令查詢次數選出最熱門的股票
+- 在開市前的時間窗內分散請求，預先把 quoteSummary 基本面數據和代碼有效性放入緩存，
+  避免開市第一分鐘所有請求同時落在冷緩存上
+- 不預取報價 (報價緩存只保留 60 秒，開市前的報價到開市時已過期，也不能當作開市後的現價)；
+  開市後的報價交給監控調度器按輪詢間隔分批獲取，避免開市一刻同時請求所有熱門股票
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from datetime import time as dtime
+
+from symbols import exchange_of
+
+logger = logging.getLogger('stock_monitor.cache')
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python 3.8
+    ZoneInfo = None
+    ZoneInfoNotFoundError = Exception
+
+QUOTE_SUMMARY_URL = ("https://query1.finance.yahoo.com/v10/finance/quoteSummary/{symbol}"
+                     "?modules=summaryDetail,financialData,defaultKeyStatistics")
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+
+# 交易時段: (名稱, 代碼交易所, 時區, 開市時間, 沒有時區數據時的固定 UTC 偏移)
+SESSIONS = (
+    ('HKEX', 'HK', 'Asia/Hong_Kong', dtime(9, 30), timedelta(hours=8)),
+    ('US', 'US', 'America/New_York', dtime(9, 30), timedelta(hours=-5)),
+)
+
+
+def _zone(name, offset):
+    """時區 (Windows 未安裝 tzdata 時退回固定偏移，不處理夏令時間)"""
+    if ZoneInfo is not None:
+        try:
+            return ZoneInfo(name)
+        except ZoneInfoNotFoundError:
+            pass
+    return timezone(offset, name)
+
+
+def next_openings(now=None):
+    """返回各交易時段下一次開市時間 [(UTC 開市時間, 名稱, 交易所), ...]，按時間排序 (只計算週一至週五)"""
+    now = now or datetime.now(timezone.utc)
+    openings = []
+    for name, exchange, zone_name, open_time, offset in SESSIONS:
+        zone = _zone(zone_name, offset)
+        local = now.astimezone(zone)
+        day = local.date()
+        while True:
+            opening = datetime.combine(day, open_time, tzinfo=zone)
+            if opening > local and opening.weekday() < 5:
+                break
+            day += timedelta(days=1)
+        openings.append((opening.astimezone(timezone.utc), name, exchange))
+    return sorted(openings)
+
+
+def top_watched_symbols(db_path, limit=100):
+    """按活躍監控數量排序的股票 [(symbol, 監控數量), ...]"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('''
+            SELECT symbol, COUNT(*) FROM stock_watches
+            WHERE is_active = 1 AND suspended_at IS NULL
+            GROUP BY symbol ORDER BY COUNT(*) DESC LIMIT ?
+        ''', (limit,)).fetchall()
+    finally:
+        conn.close()
+
+
+class SymbolPopularity:
+    """指令查詢次數 (按半衰期衰減)，只保留最多 max_entries 隻股票"""
+
+    def __init__(self, half_life=86400, max_entries=5000):
+        self.half_life = half_life
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._scores = {}  # symbol -> (分數, 更新時間)
+
+    def _decayed(self, score, updated, now):
+        return score * 0.5 ** ((now - updated) / self.half_life)
+
+    def record(self, symbol, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            score, updated = self._scores.get(symbol, (0.0, now))
+            self._scores[symbol] = (self._decayed(score, updated, now) + 1, now)
+            if len(self._scores) > self.max_entries:
+                # 移除分數最低的一半
+                ranked = sorted(self._scores.items(), key=lambda item: self._decayed(*item[1], now))
+                for symbol, _ in ranked[:len(ranked) // 2]:
+                    del self._scores[symbol]
+
+    def top(self, limit=100, now=None):
+        """返回 [(symbol, 分數), ...]，分數高的在前"""
+        now = time.time() if now is None else now
+        with self._lock:
+            scores = [(symbol, self._decayed(score, updated, now)) for symbol, (score, updated) in self._scores.items()]
+        return sorted(scores, key=lambda item: item[1], reverse=True)[:limit]
+
+
+class FundamentalsCache:
+    """
+    quoteSummary 基本面數據緩存 (每日變化不大，默認保留 6 小時)
+    提供 symbol_resolver 時按回應記錄代碼有效性
+    """
+
+    def __init__(self, ttl=6 * 3600, symbol_resolver=None):
+        self.ttl = ttl
+        self.symbol_resolver = symbol_resolver
+        self._lock = threading.Lock()
+        self._entries = {}  # symbol -> (存入時間, quoteSummary 結果)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, symbol):
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None and time.time() - entry[0] <= self.ttl:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, symbol, summary):
+        with self._lock:
+            self._entries[symbol] = (time.time(), summary)
+
+    def items(self):
+        """返回 [(symbol, 存入時間, summary), ...] (供快照使用)"""
+        with self._lock:
+            return [(symbol, stored_at, summary) for symbol, (stored_at, summary) in self._entries.items()]
+
+    def restore(self, symbol, stored_at, summary):
+        """載入快照中的基本面數據並保留原存入時間，已有較新的記錄時不覆蓋"""
+        with self._lock:
+            current = self._entries.get(symbol)
+            if current is None or current[0] < stored_at:
+                self._entries[symbol] = (stored_at, summary)
+
+    def fetch(self, symbol):
+        """請求 quoteSummary 並放入緩存，非 200 時返回 None；網絡錯誤時拋出異常"""
+        import requests
+        response = requests.get(QUOTE_SUMMARY_URL.format(symbol=symbol), headers=HEADERS, timeout=10)
+        if response.status_code != 200:
+            if self.symbol_resolver is not None:
+                self.symbol_resolver.record_response(symbol, response.status_code)
+            return None
+        result = response.json().get('quoteSummary', {}).get('result')
+        if self.symbol_resolver is not None:
+            self.symbol_resolver.record_response(symbol, 200, has_data=bool(result))
+        summary = (result or [{}])[0]
+        self.set(symbol, summary)
+        return summary
+
+
+class CacheWarmer:
+    """
+    開市前預熱線程
+    在每個交易時段開市前 lead 秒開始，把分數最高的 top_n 隻該交易所股票的基本面請求平均分散在 lead 秒內
+    分數 = 活躍監控數量 + command_weight * 近期指令查詢次數
+    """
+
+    def __init__(self, monitor_db, fundamentals, popularity, top_n=50, lead=180, command_weight=1.0):
+        self.monitor_db = monitor_db
+        self.fundamentals = fundamentals
+        self.popularity = popularity
+        self.top_n = top_n
+        self.lead = lead
+        self.command_weight = command_weight
+        self.running = False
+        self.thread = None
+        self.warmed = 0
+
+    def candidates(self, exchange):
+        """該交易所分數最高的股票"""
+        scores = {}
+        for symbol, count in top_watched_symbols(self.monitor_db.db_path, self.top_n * 4):
+            scores[symbol] = scores.get(symbol, 0) + count
+        for symbol, score in self.popularity.top(self.top_n * 4):
+            scores[symbol] = scores.get(symbol, 0) + self.command_weight * score
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [symbol for symbol, _ in ranked if exchange_of(symbol) == exchange][:self.top_n]
+
+    def warm(self, symbols, spacing=0.0):
+        """
+        開市前依次預取基本面 (同時確認代碼有效性)，每隻股票之間間隔 spacing 秒
+        不預取報價：開市前的報價在開市時已過期，也不是開市後的價格
+        """
+        for index, symbol in enumerate(symbols):
+            if not self.running and self.thread is not None:
+                break
+            if self.monitor_db.symbols.is_valid(symbol) is False:
+                continue
+            if index and spacing:
+                time.sleep(spacing)
+            try:
+                if self.fundamentals.get(symbol) is None:
+                    self.fundamentals.fetch(symbol)
+                self.warmed += 1
+            except Exception as e:
+                logger.warning("預熱緩存失敗 %s: %s", symbol, e, extra={'symbol': symbol})
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name="cache-warmer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def _loop(self):
+        while self.running:
+            opening, name, exchange = next_openings()[0]
+            start = opening - timedelta(seconds=self.lead)
+            delay = (start - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                time.sleep(min(delay, 600))  # 分段等待，系統休眠後也能重新計算
+                continue
+            try:
+                symbols = self.candidates(exchange)
+                logger.info("開市前預熱 %s: %d 隻股票", name, len(symbols))
+                remaining = (opening - datetime.now(timezone.utc)).total_seconds()
+                self.warm(symbols, spacing=max(remaining, 0) / (len(symbols) + 1) if symbols else 0)
+            except Exception as e:
+                logger.error("開市前預熱錯誤: %s", e, exc_info=True)
+            # 等到開市後再計算下一個時段
+            time.sleep(max((opening - datetime.now(timezone.utc)).total_seconds(), 0) + 1)
@@ -0,0 +1,117 @@
+"""
+安全的算式計算引擎
+以 AST 解析算式，只允許數字和 + - * / // ** 運算，並限制長度、嵌套深度和數值大小，
+保證任何輸入都能在有限時間內完成。解析結果以 LRU 緩存
+"""
+
+import ast
+import math
+import operator
+from functools import lru_cache
+
+# 允許的字符 (與舊版 /calc 的白名單一致)
+ALLOWED_CHARS = frozenset('0123456789+-*/.() ')
+
+MAX_LENGTH = 200          # 算式最大長度
+MAX_DEPTH = 32            # AST 最大嵌套深度
+MAX_NODES = 100           # AST 最大節點數
+MAX_DIGITS = 100          # 結果最多 100 位數 (約 1e100)
+MAX_MAGNITUDE = 10 ** MAX_DIGITS
+
+
+class CalcError(ValueError):
+    """算式無法計算"""
+
+
+class UnsafeExpressionError(CalcError):
+    """算式包含不允許的字符"""
+
+
+def _check_magnitude(value):
+    if isinstance(value, float):
+        if not math.isfinite(value) or abs(value) > MAX_MAGNITUDE:
+            raise CalcError("結果超出範圍")
+    elif abs(value) > MAX_MAGNITUDE:
+        raise CalcError("結果超出範圍")
+    return value
+
+
+def _power(base, exponent):
+    # 先估算結果位數，避免 9**9**9 之類的計算
+    if base not in (0, 1, -1):
+        if exponent * math.log10(abs(base)) > MAX_DIGITS:
+            raise CalcError("結果超出範圍")
+    if isinstance(exponent, float) and base < 0:
+        raise CalcError("負數不能進行小數次方")
+    if exponent < 0 and base == 0:
+        raise CalcError("除數不能為零")
+    return operator.pow(base, exponent)
+
+
+def _divide(op):
+    def divide(a, b):
+        if b == 0:
+            raise CalcError("除數不能為零")
+        return op(a, b)
+    return divide
+
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: _divide(operator.truediv),
+    ast.FloorDiv: _divide(operator.floordiv),
+    ast.Pow: _power,
+}
+
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+def _compile_node(node, depth):
+    """把 AST 節點轉為無參數的函數"""
+    if depth > MAX_DEPTH:
+        raise CalcError("算式嵌套過深")
+
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        value = _check_magnitude(node.value)
+        return lambda: value
+
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        op = BINARY_OPERATORS[type(node.op)]
+        left = _compile_node(node.left, depth + 1)
+        right = _compile_node(node.right, depth + 1)
+        return lambda: _check_magnitude(op(left(), right()))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        op = UNARY_OPERATORS[type(node.op)]
+        operand = _compile_node(node.operand, depth + 1)
+        return lambda: op(operand())
+
+    raise CalcError("不支援的運算")
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(expression):
+    """解析並檢查算式，返回計算函數 (結果按算式緩存)"""
+    if len(expression) > MAX_LENGTH:
+        raise CalcError(f"算式過長 (最多 {MAX_LENGTH} 個字符)")
+    if not ALLOWED_CHARS.issuperset(expression):
+        raise UnsafeExpressionError("算式包含不安全的字符")
+
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except (SyntaxError, RecursionError, MemoryError):
+        raise CalcError("算式格式錯誤")
+
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise CalcError("算式過於複雜")
+    return _compile_node(tree.body, 0)
+
+
+def evaluate(expression):
+    """計算算式，失敗時拋出 CalcError"""
+    return compile_expression(expression)()
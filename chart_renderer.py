@@ -0,0 +1,181 @@
+"""
+股票圖表生成
+在進程池中繪製價格/成交量圖表，並按 (股票, 範圍, 最後一根K線) 緩存圖片
+獲取的價格序列按 (股票, 範圍) 短暫緩存，熱門圖表在有效期內不再請求 Yahoo
+"""
+
+import asyncio
+import importlib.util
+import io
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger('bot.chart')
+
+
+# 範圍 -> (Yahoo interval, 秒數)
+CHART_RANGES = {
+    '1d': ('5m', 86400),
+    '5d': ('15m', 5 * 86400),
+    '1mo': ('1d', 31 * 86400),
+    '3mo': ('1d', 92 * 86400),
+    '6mo': ('1d', 183 * 86400),
+    '1y': ('1d', 366 * 86400),
+    '5y': ('1wk', 5 * 366 * 86400),
+}
+
+DEFAULT_RANGE = '1mo'
+SERIES_TTL = 60  # 價格序列緩存秒數
+
+
+def fetch_chart_data(symbol, range_name):
+    """
+    從 chart 端點獲取 OHLCV 陣列
+    返回 (timestamps, closes, volumes)，無數據時返回 None
+    """
+    import requests
+    interval = CHART_RANGES[range_name][0]
+    url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}?range={range_name}&interval={interval}"
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    }
+
+    response = requests.get(url, headers=headers, timeout=10)
+    if response.status_code != 200:
+        return None
+
+    data = response.json()
+    if not ('chart' in data and 'result' in data['chart'] and data['chart']['result']):
+        return None
+
+    result = data['chart']['result'][0]
+    quote = result['indicators']['quote'][0]
+    rows = [
+        (ts, close, volume or 0)
+        for ts, close, volume in zip(result.get('timestamp') or [], quote.get('close') or [], quote.get('volume') or [])
+        if close is not None
+    ]
+    if not rows:
+        return None
+    timestamps, closes, volumes = zip(*rows)
+    return list(timestamps), list(closes), list(volumes)
+
+
+def render_chart_png(symbol, range_name, timestamps, closes, volumes):
+    """繪製價格/成交量圖表，返回 PNG 字節 (在子進程中執行)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    dates = [datetime.fromtimestamp(ts) for ts in timestamps]
+    fig, (price_ax, volume_ax) = plt.subplots(
+        2, 1, figsize=(8, 5), sharex=True, gridspec_kw={'height_ratios': [3, 1]})
+
+    color = 'tab:green' if closes[-1] >= closes[0] else 'tab:red'
+    price_ax.plot(dates, closes, color=color, linewidth=1.2)
+    price_ax.set_title(f"{symbol} ({range_name})")
+    price_ax.grid(True, alpha=0.3)
+    volume_ax.vlines(dates, 0, volumes, color='tab:gray', linewidth=2)
+    volume_ax.grid(True, alpha=0.3)
+    fig.autofmt_xdate()
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=100)
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+class ChartService:
+    """圖表服務：獲取數據、在進程池中繪圖、緩存結果"""
+
+    def __init__(self, history_loader=None, max_entries=128, max_workers=2, renderer=render_chart_png,
+                 series_ttl=SERIES_TTL):
+        # history_loader(symbol, start) -> PriceSeries，chart 端點失敗時使用
+        self.history_loader = history_loader
+        # renderer(symbol, range, timestamps, closes, volumes) -> PNG，在進程池中執行
+        self.renderer = renderer
+        self.max_entries = max_entries
+        self.max_workers = max_workers
+        self._pool = None
+        self._cache = OrderedDict()   # (symbol, range, last_bar) -> PNG
+        self.series_ttl = series_ttl
+        self._series = OrderedDict()  # (symbol, range) -> (取得時間, series)
+        self._rendering = {}          # 同一 key 的渲染只做一次
+        self.hits = 0
+        self.renders = 0
+        self.series_hits = 0
+
+    @staticmethod
+    def available():
+        return importlib.util.find_spec('matplotlib') is not None
+
+    def _load_series(self, symbol, range_name):
+        try:
+            series = fetch_chart_data(symbol, range_name)
+            if series:
+                return series
+        except Exception as e:
+            logger.warning("Chart API Exception: %s", e)
+
+        if self.history_loader is None:
+            return None
+        history = self.history_loader(symbol, time.time() - CHART_RANGES[range_name][1])
+        if history is None or not history.prices:
+            return None
+        return list(history.timestamps), list(history.prices), list(history.volumes)
+
+    def _remember(self, key, image):
+        self._cache[key] = image
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def get_chart(self, symbol, range_name=DEFAULT_RANGE):
+        """返回 PNG 字節，無數據時返回 None"""
+        loop = asyncio.get_running_loop()
+        series_key = (symbol, range_name)
+        cached = self._series.get(series_key)
+        if cached is not None and time.monotonic() - cached[0] < self.series_ttl:
+            series = cached[1]
+            self.series_hits += 1
+        else:
+            series = await loop.run_in_executor(None, self._load_series, symbol, range_name)
+            if series is None:
+                return None
+            self._series[series_key] = (time.monotonic(), series)
+            self._series.move_to_end(series_key)
+            while len(self._series) > self.max_entries:
+                self._series.popitem(last=False)
+
+        timestamps, closes, volumes = series
+        key = (symbol, range_name, timestamps[-1])
+        image = self._cache.get(key)
+        if image is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return image
+
+        future = self._rendering.get(key)
+        if future is None:
+            if self._pool is None:
+                from concurrent.futures import ProcessPoolExecutor
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            future = asyncio.ensure_future(loop.run_in_executor(
+                self._pool, self.renderer, symbol, range_name, timestamps, closes, volumes))
+            self._rendering[key] = future
+            self.renders += 1
+        try:
+            image = await future
+        finally:
+            self._rendering.pop(key, None)
+
+        self._remember(key, image)
+        return image
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
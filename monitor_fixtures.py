@@ -0,0 +1,72 @@
+"""
+測試共用的監控數據庫輔助工具
+- FakeBot: 記錄已發送訊息的假 Telegram Bot
+- temp_monitor: 在臨時目錄建立 StockMonitorDB，結束時刪除臨時目錄
+- legacy_database: 在臨時目錄建立未升級的舊結構數據庫
+"""
+
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+from stock_monitor_db import StockMonitorDB
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((chat_id, text))
+
+
+def fixed_quotes(price):
+    """所有股票報價固定為 price 的 get_stock_quotes (前收市價 price - 10，開市價 price - 9)"""
+    return lambda symbols, max_workers=8: {
+        symbol: {'price': price, 'volume': 1, 'previousClose': price - 10, 'open': price - 9} for symbol in symbols}
+
+
+@contextmanager
+def temp_monitor(name='monitor.db', price=None):
+    """
+    在臨時目錄建立 StockMonitorDB，離開 with 區塊時刪除整個目錄
+    指定 price 時使用 FakeBot 發送警報，並以 fixed_quotes(price) 代替 Yahoo 報價
+    """
+    with tempfile.TemporaryDirectory() as root:
+        monitor = StockMonitorDB(os.path.join(root, name))
+        if price is not None:
+            monitor._bot = FakeBot()
+            monitor.get_stock_quotes = fixed_quotes(price)
+        yield monitor
+
+
+@contextmanager
+def legacy_database(name='legacy.db'):
+    """建立未升級的舊結構數據庫 (只有原始的 stock_watches 表)，返回數據庫路徑"""
+    with tempfile.TemporaryDirectory() as root:
+        db_path = os.path.join(root, name)
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+            CREATE TABLE stock_watches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                symbol TEXT NOT NULL,
+                target_price REAL NOT NULL,
+                alert_type TEXT DEFAULT 'above',
+                is_active BOOLEAN DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_checked TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_alert TIMESTAMP DEFAULT NULL,
+                alert_count INTEGER DEFAULT 0
+            )
+        ''')
+        conn.executemany('''
+            INSERT INTO stock_watches (user_id, chat_id, symbol, target_price, alert_type, alert_count)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(1, 10, 'AAPL', 100.0, 'above', 2), (2, 20, 'AAPL', 100.0, 'above', 4),
+              (2, 20, 'MSFT', 100.0, 'above', 0)])
+        conn.commit()
+        conn.close()
+        yield db_path
@@ -0,0 +1,172 @@
+"""
+監控分片租約
+多個 Bot 實例同時運行時，按股票代碼把監控分為若干分片，每個分片同一時間只由一個實例持有租約並負責檢查。
+實例停止續約 (例如進程退出) 後租約過期，其他實例會自動接手
+
+後端:
+- SQLiteLeaseBackend: 租約存於共享的 SQLite 數據庫 (monitor_leases 表)，按 TTL 過期
+- FileLockLeaseBackend: 每個分片一個鎖文件 (flock)，進程退出時由系統自動釋放
+"""
+
+import logging
+import math
+import os
+import socket
+import sqlite3
+import time
+import uuid
+import zlib
+
+logger = logging.getLogger('stock_monitor.lease')
+
+
+def shard_for(symbol, num_shards):
+    """股票代碼所屬的分片"""
+    return zlib.crc32(symbol.encode('utf-8')) % num_shards
+
+
+class LeaseBackend:
+    """租約後端接口"""
+
+    def acquire(self, shard, owner, ttl):
+        """取得或續約分片租約，成功時返回 True"""
+        raise NotImplementedError
+
+    def release(self, shard, owner):
+        """釋放自己持有的租約"""
+        raise NotImplementedError
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    def __init__(self, db_path):
+        self.db_path = db_path
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS monitor_leases (
+                shard INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def acquire(self, shard, owner, ttl):
+        now = time.time()
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            # 單條 UPSERT：分片無人持有、已過期或本來就屬於自己時才會寫入
+            cursor = conn.execute('''
+                INSERT INTO monitor_leases (shard, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(shard) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE monitor_leases.owner = excluded.owner OR monitor_leases.expires_at < ?
+            ''', (shard, owner, now + ttl, now))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def release(self, shard, owner):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute('DELETE FROM monitor_leases WHERE shard = ? AND owner = ?', (shard, owner))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def owners(self):
+        """返回 {shard: (owner, expires_at)}"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute('SELECT shard, owner, expires_at FROM monitor_leases').fetchall()
+        finally:
+            conn.close()
+        return {shard: (owner, expires_at) for shard, owner, expires_at in rows}
+
+
+class FileLockLeaseBackend(LeaseBackend):
+    """基於 flock 的租約，適用於同一台機器上的多個實例 (ttl 不適用)"""
+
+    def __init__(self, lock_dir):
+        import fcntl
+        self._fcntl = fcntl
+        self.lock_dir = lock_dir
+        self._held = {}  # shard -> 文件描述符
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def acquire(self, shard, owner, ttl):
+        if shard in self._held:
+            return True
+        fd = os.open(os.path.join(self.lock_dir, f"shard-{shard}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            self._fcntl.flock(fd, self._fcntl.LOCK_EX | self._fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, owner.encode('utf-8'))
+        self._held[shard] = fd
+        return True
+
+    def release(self, shard, owner):
+        fd = self._held.pop(shard, None)
+        if fd is not None:
+            self._fcntl.flock(fd, self._fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class ShardLeaseManager:
+    """管理本實例持有的分片租約"""
+
+    def __init__(self, backend, num_shards=16, ttl=60, max_shards=None, owner=None, instances=None,
+                 takeover_after=None):
+        self.backend = backend
+        self.num_shards = num_shards
+        self.ttl = ttl
+        # 本實例最多持有的分片數，None 表示接手所有可用分片；
+        # 未指定但已知實例數時平均分配 (ceil(分片數 / 實例數))，避免第一個啟動的實例取得所有分片
+        if max_shards is None and instances and instances > 1:
+            max_shards = math.ceil(num_shards / instances)
+        self.max_shards = max_shards
+        # 超出上限的分片持續無人持有超過此秒數 (其他實例已停止) 時仍會接手，默認兩個租約期
+        self.takeover_after = 2 * ttl if takeover_after is None else takeover_after
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.owned = frozenset()
+        self._free_since = {}  # 超出上限的空閒分片 -> 第一次發現空閒的時間
+
+    def refresh(self):
+        """續約已持有的分片並嘗試接手無人持有的分片，返回目前持有的分片"""
+        now = time.monotonic()
+        owned = set()
+        for shard in sorted(range(self.num_shards), key=lambda s: s not in self.owned):
+            try:
+                acquired = self.backend.acquire(shard, self.owner, self.ttl)
+            except Exception as e:
+                logger.warning("取得分片租約失敗 %s: %s", shard, e)
+                continue
+            if not acquired:
+                self._free_since.pop(shard, None)
+                continue
+            if self.max_shards is not None and len(owned) >= self.max_shards and shard not in self.owned:
+                # 已達上限：空閒的分片留給其他實例，持續無人接手時才由本實例接手
+                if now - self._free_since.setdefault(shard, now) < self.takeover_after:
+                    try:
+                        self.backend.release(shard, self.owner)
+                    except Exception as e:
+                        logger.warning("釋放分片租約失敗 %s: %s", shard, e)
+                    continue
+            self._free_since.pop(shard, None)
+            owned.add(shard)
+        self.owned = frozenset(owned)
+        return self.owned
+
+    def owns_symbol(self, symbol):
+        return shard_for(symbol, self.num_shards) in self.owned
+
+    def release_all(self):
+        for shard in self.owned:
+            try:
+                self.backend.release(shard, self.owner)
+            except Exception as e:
+                logger.warning("釋放分片租約失敗 %s: %s", shard, e)
+        self.owned = frozenset()
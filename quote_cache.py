@@ -0,0 +1,114 @@
+"""
+共享報價緩存
+監控線程和 Bot 指令共用，按股票代碼保存最近一次報價
+"""
+
+import threading
+import time
+
+
+def session_open(opens):
+    """chart 的 open 序列中第一個有效值 (當日第一個時段的開盤價)，沒有時返回 None"""
+    for value in opens or ():
+        if isinstance(value, (int, float)):
+            return value
+    return None
+
+
+class Quote:
+    """
+    緊湊的報價記錄，只保存警報、列表和 /stock 需要的欄位 (不保留整個 chart 回應)
+    支援 quote['price']、quote.get('price') 和 quote['averageVolume'] = ... 的字典式讀寫
+    """
+    __slots__ = ('price', 'volume', 'previousClose', 'open', 'averageVolume', 'high', 'low')
+
+    def __init__(self, price, volume=None, previousClose=None, open=None, averageVolume=None, high=None, low=None):
+        self.price = price
+        self.volume = volume
+        self.previousClose = previousClose
+        self.open = open
+        self.averageVolume = averageVolume
+        self.high = high
+        self.low = low
+
+    @classmethod
+    def from_meta(cls, meta, open_price=None):
+        """
+        從 chart 回應的 meta 建立報價，沒有現價時返回 None
+        meta 中沒有當日開盤價，open_price 需要從 indicators.quote[0].open 取得 (見 session_open)
+        """
+        price = meta.get('regularMarketPrice')
+        if not price:
+            return None
+        return cls(price, meta.get('regularMarketVolume'),
+                   meta.get('previousClose', meta.get('chartPreviousClose')),
+                   open_price,
+                   high=meta.get('regularMarketDayHigh'), low=meta.get('regularMarketDayLow'))
+
+    @classmethod
+    def from_chart(cls, result):
+        """從完整解析的 chart 結果 (chart.result[0]) 建立報價"""
+        if not result or not result.get('meta'):
+            return None
+        quotes = (result.get('indicators') or {}).get('quote') or [{}]
+        return cls.from_meta(result['meta'], session_open((quotes[0] or {}).get('open')))
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __repr__(self):
+        return f"Quote(price={self.price!r}, volume={self.volume!r})"
+
+
+class QuoteCache:
+    """線程安全的 TTL 報價緩存"""
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # symbol -> (存入時間, quote)
+
+    def set(self, symbol, quote):
+        with self._lock:
+            self._entries[symbol] = (time.time(), quote)
+
+    def get(self, symbol, max_age=None):
+        """返回未過期的報價，否則返回 None"""
+        entry = self.peek(symbol)
+        if entry is None:
+            return None
+        age, quote = entry
+        return quote if age <= (self.ttl if max_age is None else max_age) else None
+
+    def peek(self, symbol):
+        """返回 (距今秒數, quote)，不論是否過期；沒有記錄時返回 None"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+        if entry is None:
+            return None
+        return time.time() - entry[0], entry[1]
+
+    def items(self):
+        """返回 [(symbol, 存入時間, quote), ...] (供快照使用)"""
+        with self._lock:
+            return [(symbol, stored_at, quote) for symbol, (stored_at, quote) in self._entries.items()]
+
+    def restore(self, symbol, stored_at, quote):
+        """載入快照中的報價並保留原存入時間 (過期判斷不變)，已有較新的記錄時不覆蓋"""
+        with self._lock:
+            current = self._entries.get(symbol)
+            if current is None or current[0] < stored_at:
+                self._entries[symbol] = (stored_at, quote)
+
+    def __len__(self):
+        return len(self._entries)
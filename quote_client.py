@@ -0,0 +1,106 @@
+"""
+監控線程使用的輕量報價客戶端
+- 只請求 range=1d&interval=1d 且不含盤前盤後 (最小的 chart 回應)
+- 每個線程共用一個 requests.Session，接受 gzip 壓縮回應；監控的報價線程池長期保留，
+  Session 和其中的 keep-alive 連接可以跨輪重用
+- 不解析整個 JSON，只解碼回應中第一個 "meta" 物件和 indicators 中的 open 序列
+  (meta 不包含當日開盤價，跳空警報需要 indicators.quote[0].open)
+"""
+
+import json
+import threading
+
+from quote_cache import Quote, session_open
+
+CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+CHART_PARAMS = {'range': '1d', 'interval': '1d', 'includePrePost': 'false'}
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'application/json',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+_META_KEY = '"meta":'
+_QUOTE_KEY = '"quote":'
+_OPEN_KEY = '"open":'
+_decoder = json.JSONDecoder()
+
+
+def _decode_after(body, key, start=0):
+    """解碼 body 中 start 之後第一個 key 的值，返回 (值, 結束位置)；找不到或不完整時返回 (None, -1)"""
+    start = body.find(key, start)
+    if start < 0:
+        return None, -1
+    start += len(key)
+    while body[start:start + 1].isspace():
+        start += 1
+    try:
+        return _decoder.raw_decode(body, start)
+    except ValueError:
+        return None, -1
+
+
+def extract_chart(body):
+    """
+    從 chart 回應中取出第一個結果的 meta 物件和當日開盤價，返回 (meta 或 None, 開盤價 或 None)
+    raw_decode 在各物件結束處停止，timestamp、close 等其餘序列不會被解析
+    """
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+    meta, end = _decode_after(body, _META_KEY)
+    if not isinstance(meta, dict):
+        return None, None
+    opens = None
+    quote_start = body.find(_QUOTE_KEY, end)
+    if quote_start >= 0:
+        opens, _ = _decode_after(body, _OPEN_KEY, quote_start)
+    return meta, session_open(opens if isinstance(opens, list) else None)
+
+
+def extract_meta(body):
+    """從 chart 回應中取出第一個結果的 meta 物件，找不到時返回 None"""
+    return extract_chart(body)[0]
+
+
+class QuoteClient:
+    def __init__(self, timeout=10, session_factory=None):
+        self.timeout = timeout
+        self._session_factory = session_factory
+        self._local = threading.local()
+        self.requests = 0
+        self.bytes_received = 0  # 解壓前的回應大小
+
+    def session(self):
+        """當前線程的 Session (requests 在首次使用時才導入)"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            if self._session_factory is not None:
+                session = self._session_factory()
+            else:
+                import requests
+                session = requests.Session()
+            session.headers.update(HEADERS)
+            self._local.session = session
+        return session
+
+    def fetch_quote(self, symbol):
+        """請求股票報價，返回 (狀態碼, Quote 或 None)；網絡錯誤時拋出異常"""
+        response = self.session().get(CHART_URL.format(symbol=symbol), params=CHART_PARAMS,
+                                      timeout=self.timeout)
+        self.requests += 1
+        self.bytes_received += int(response.headers.get('Content-Length') or 0)
+        if response.status_code != 200:
+            return response.status_code, None
+        meta, open_price = extract_chart(response.content)
+        return response.status_code, Quote.from_meta(meta, open_price) if meta is not None else None
+
+    def fetch_history(self, symbol, range_='6mo', interval='1h'):
+        """請求歷史 OHLCV (整個 chart 結果)，返回 (狀態碼, result 或 None)；網絡錯誤時拋出異常"""
+        params = {'range': range_, 'interval': interval, 'includePrePost': 'false'}
+        response = self.session().get(CHART_URL.format(symbol=symbol), params=params, timeout=self.timeout)
+        self.requests += 1
+        self.bytes_received += int(response.headers.get('Content-Length') or 0)
+        if response.status_code != 200:
+            return response.status_code, None
+        result = (response.json().get('chart', {}).get('result') or [None])[0]
+        return response.status_code, result
@@ -0,0 +1,148 @@
+"""
+指令限流
+- 每個用戶和每個聊天各有一個令牌桶，在處理函數運行前扣除令牌；
+  指令按上游請求數計算成本 (/stockinfo 2 個，/stockcompare 每隻股票 1 個)
+- 同一聊天中完全相同的請求仍在處理時，重複的請求直接略過 (結果會由處理中的請求回覆到同一聊天)
+- 超出限額時回覆可配置的提示訊息，每個等待期內只提示一次
+"""
+
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MESSAGE = "⏳ 請求太頻繁，請在 {wait} 秒後再試"
+
+# /stockcompare 每次最多比較的股票數量
+MAX_COMPARE_SYMBOLS = 5
+
+# 指令成本 (預設 1)，可為整數或 args -> 整數
+# /stockcompare 按實際比較的股票數量扣除，一次允許的指令不會變成多次未計算的上游請求
+COMMAND_COSTS = {
+    'stockinfo': 2,
+    'stockcompare': lambda args: min(max(1, len(args)), MAX_COMPARE_SYMBOLS),
+}
+
+
+class TokenBuckets:
+    """按 key 分開的令牌桶，每秒補充 rate 個，最多 capacity 個；只保留最近使用的 max_keys 個桶"""
+
+    def __init__(self, rate, capacity, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> [令牌數, 上次補充時間]
+
+    def _refill(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.capacity), now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def acquire(self, key, cost=1, now=None):
+        """扣除 cost 個令牌，成功返回 0，否則返回需要等待的秒數 (不扣除)"""
+        now = time.monotonic() if now is None else now
+        cost = min(cost, self.capacity)
+        with self._lock:
+            bucket = self._refill(key, now)
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / self.rate
+
+    def refund(self, key, cost=1):
+        """退回令牌 (另一個限額拒絕時使用)"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(self.capacity, bucket[0] + min(cost, self.capacity))
+
+
+class CommandLimiter:
+    def __init__(self, user_rate=0.5, user_capacity=10, chat_rate=1.0, chat_capacity=20,
+                 message=DEFAULT_MESSAGE, costs=None):
+        self.users = TokenBuckets(user_rate, user_capacity)
+        self.chats = TokenBuckets(chat_rate, chat_capacity)
+        self.message = message
+        self.costs = COMMAND_COSTS if costs is None else costs
+        self._in_flight = set()  # (chat_id, 路由, 內容)
+        self._notified = {}      # user_id -> 已提示的等待結束時間
+        self.limited = 0
+        self.coalesced = 0
+
+    def cost(self, name, args):
+        cost = self.costs.get(name, 1)
+        return cost(args) if callable(cost) else cost
+
+    def check(self, user_id, chat_id, cost=1, now=None):
+        """同時檢查用戶和聊天限額，通過返回 0，否則返回等待秒數"""
+        now = time.monotonic() if now is None else now
+        wait = self.users.acquire(user_id, cost, now)
+        if wait:
+            return wait
+        wait = self.chats.acquire(chat_id, cost, now)
+        if wait:
+            self.users.refund(user_id, cost)
+        return wait
+
+    def should_notify(self, user_id, wait, now=None):
+        """每個等待期內只提示一次，避免對刷屏的用戶逐條回覆"""
+        now = time.monotonic() if now is None else now
+        if self._notified.get(user_id, 0) > now:
+            return False
+        if len(self._notified) > 10000:
+            self._notified = {key: until for key, until in self._notified.items() if until > now}
+        self._notified[user_id] = now + wait
+        return True
+
+    def guard(self, name, handler):
+        """包裝處理函數 handler(update, context)：先去重再限流"""
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            user = update.effective_user
+            chat = update.effective_chat
+            if user is None or chat is None:
+                return await handler(update, context)
+
+            message = update.effective_message
+            query = update.callback_query
+            content = query.data if query is not None else (message.text if message is not None else None)
+            key = (chat.id, name, content) if content is not None else None
+            if key is not None and key in self._in_flight:
+                self.coalesced += 1
+                if query is not None:
+                    await query.answer()
+                return None
+
+            wait = self.check(user.id, chat.id, self.cost(name, getattr(context, 'args', None) or []))
+            if wait:
+                self.limited += 1
+                if self.should_notify(user.id, wait):
+                    text = self.message.format(wait=math.ceil(wait))
+                    if query is not None:
+                        await query.answer(text)
+                    elif message is not None:
+                        await message.reply_text(text)
+                elif query is not None:
+                    await query.answer()
+                return None
+
+            if key is not None:
+                self._in_flight.add(key)
+            try:
+                return await handler(update, context)
+            finally:
+                if key is not None:
+                    self._in_flight.discard(key)
+        return wrapper
+
+    def format(self):
+        return f"🚦 限流: 拒絕 {self.limited} 次 / 合併重複請求 {self.coalesced} 次"
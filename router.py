@@ -0,0 +1,110 @@
+"""
+指令路由
+- 按鈕回調以查表方式分派，代替 if/elif 鏈
+- 普通文字訊息以預編譯正則分類
+- 記錄每個路由的調用次數和延遲
+"""
+
+import functools
+import re
+import threading
+import time
+
+# 只由數字、運算符、括號、小數點、等號和空白組成，且至少包含一個運算符
+MATH_TEXT = re.compile(r'[0-9.() ]*[-+*/=][-+*/=0-9.() ]*')
+
+
+def classify_text(text):
+    """把普通文字訊息分類為 'math' 或 'text'"""
+    return 'math' if MATH_TEXT.fullmatch(text) else 'text'
+
+
+class RouteStats:
+    """每個路由的調用次數、錯誤次數、總延遲和最大延遲"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}  # name -> [count, errors, total_seconds, max_seconds]
+
+    def record(self, name, elapsed, error=False):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = [0, 0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += error
+            stats[2] += elapsed
+            if elapsed > stats[3]:
+                stats[3] = elapsed
+
+    def snapshot(self):
+        """返回 {name: (count, errors, avg_ms, max_ms)}"""
+        with self._lock:
+            return {
+                name: (count, errors, total / count * 1000, maximum * 1000)
+                for name, (count, errors, total, maximum) in self._stats.items()
+            }
+
+    def format(self, limit=20):
+        rows = sorted(self.snapshot().items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        if not rows:
+            return "📊 尚未有路由統計"
+        lines = ["📊 路由統計 (次數 / 錯誤 / 平均 / 最大)"]
+        for name, (count, errors, avg_ms, max_ms) in rows:
+            lines.append(f"{name}: {count} / {errors} / {avg_ms:.1f}ms / {max_ms:.1f}ms")
+        return "\n".join(lines)
+
+
+route_stats = RouteStats()
+
+
+def timed(name, handler, stats=route_stats):
+    """包裝異步處理函數，記錄延遲"""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        error = False
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            stats.record(name, time.perf_counter() - start, error)
+    return wrapper
+
+
+class CallbackRouter:
+    """按 callback_data 分派按鈕回調：先查精確匹配表，再按前綴匹配"""
+
+    def __init__(self, stats=route_stats):
+        self.stats = stats
+        self._exact = {}
+        self._prefixes = []
+
+    def add(self, data, handler):
+        """handler(query) 處理 callback_data == data 的回調"""
+        self._exact[data] = timed(f"callback:{data}", handler, self.stats)
+
+    def add_reply(self, data, text):
+        """callback_data == data 時把訊息改為固定文字"""
+        async def reply(query):
+            await query.edit_message_text(text)
+        self.add(data, reply)
+
+    def add_prefix(self, prefix, handler):
+        """handler(query) 處理以 prefix 開頭的回調"""
+        self._prefixes.append((prefix, timed(f"callback:{prefix}*", handler, self.stats)))
+
+    async def dispatch(self, query):
+        """分派回調，找不到路由時返回 False"""
+        handler = self._exact.get(query.data)
+        if handler is None:
+            for prefix, prefix_handler in self._prefixes:
+                if query.data.startswith(prefix):
+                    handler = prefix_handler
+                    break
+            else:
+                return False
+        await handler(query)
+        return True
@@ -3,6 +3,7 @@ import requests
 import time
 import threading
 from datetime import datetime
+from symbols import normalize_symbol
 
 class StockMonitor:
     def __init__(self, db_path="stock_monitor.db"):
@@ -32,12 +33,7 @@ class StockMonitor:
     
     def add_watch(self, user_id, chat_id, symbol, target_price, alert_type='above'):
         try:
-            if symbol.endswith('.HK'):
-                base_symbol = symbol.replace('.HK', '')
-                if base_symbol.isdigit():
-                    symbol = f"{base_symbol.zfill(4)}.HK"
-            elif symbol.isdigit() and len(symbol) <= 4:
-                symbol = f"{symbol.zfill(4)}.HK"
+            symbol = normalize_symbol(symbol)
             
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
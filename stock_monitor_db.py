@@ -1,27 +1,112 @@
+import logging
 import sqlite3
-import requests
 import time
 import threading
-from datetime import datetime, timedelta
-import asyncio
-from telegram import Bot
-import json
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+from operator import attrgetter
+from alert_rules import (ALERT_TYPES, WatchColumns, describe_alert, evaluate_alerts,
+                         format_alert_message, needs_average_volume, threshold_error)
+from quote_cache import QuoteCache
+from quote_client import QuoteClient
+from symbol_health import FAILURE_NO_DATA, FAILURE_NOT_FOUND, FAILURE_TRANSIENT, SymbolHealth
+from structured_log import bind, current_ids, new_cycle_id
+from symbols import SymbolError, SymbolResolver
+from tick_store import SQLiteHistoryStore
+from timer_wheel import TimerWheel
+from watch_set import WatchSet
+
+# 數據庫結構版本 (PRAGMA user_version)，已是最新版本時跳過建表檢查
+SCHEMA_VERSION = 6
+
+# 批量添加監控的上限
+MAX_BULK_WATCHES = 200
+
+# 並發請求報價的線程數 (線程長期保留，每個線程的 Session 和連接可以跨輪重用)
+QUOTE_WORKERS = 8
+
+# 監控變更日誌保留時間 (天)，監控線程落後超過此時間時會完整重新載入
+WATCH_CHANGES_RETENTION_DAYS = 1
+
+# 檢查間隔等級 (秒)，用戶沒有設置時使用監控的全局 check_interval
+CHECK_INTERVAL_TIERS = {'premium': 5, 'default': 60, 'digest': 900}
+# 調度時間輪每格秒數，以及重新讀取用戶設置的間隔
+SCHEDULER_TICK = 1.0
+USER_SETTINGS_RELOAD = 60
+
+logger = logging.getLogger('stock_monitor')
+# 每輪檢查的記錄 (高頻，默認抽樣)
+cycle_logger = logging.getLogger('stock_monitor.cycle')
+
+# 監控列表每頁數量，以及最多緩存多少個用戶的已渲染頁面
+WATCHLIST_PAGE_SIZE = 10
+WATCHLIST_CACHE_USERS = 1000
 
 class StockMonitorDB:
-    def __init__(self, db_path="stock_monitor.db", bot_token=None):
+    def __init__(self, db_path="stock_monitor.db", bot_token=None, history_backend=None, lease_manager=None,
+                 symbol_resolver=None):
         self.db_path = db_path
         self.bot_token = bot_token
-        self.bot = Bot(token=bot_token) if bot_token else None
+        self._bot = None
         self.init_database()
+        # 價格歷史後端，默認寫入 price_history 表，可替換為 tick_store.TickStore
+        self.history = history_backend or SQLiteHistoryStore(db_path)
+        # 多實例部署時的分片租約 (monitor_lease.ShardLeaseManager)，None 表示負責所有監控
+        self.lease_manager = lease_manager
+        # 代碼解析與有效性緩存 (symbols.SymbolResolver)，可與 Bot 指令共用
+        self.symbols = symbol_resolver or SymbolResolver()
+        # 每隻股票的連續失敗次數和退避時間
+        self.symbol_health = SymbolHealth()
+        self._failure_kinds = {}  # symbol -> 最近一次獲取報價失敗的類型 (由 check_alerts 取出)
+        # 監控線程持有的活躍監控，每輪只套用變更日誌中的新變更
+        self.watch_set = WatchSet()
+        self._watch_columns = None
+        self._watch_columns_owned = None
+        self._subscribers = {}  # trigger_id -> {watch_id: WatchRecord}
+        self.scheduler = TimerWheel(tick=SCHEDULER_TICK, slots=1024)
+        self._symbol_intervals = {}  # symbol -> 檢查間隔 (秒)
+        self._schedule_key = None
+        self._schedule_dirty = None  # 上次調度之後監控有變化的股票，None 表示需要全部重新計算
+        self._user_intervals = None  # user_id -> 檢查間隔 (秒)
+        self._user_intervals_loaded = 0
+        self._user_intervals_version = 0
         self.monitoring = False
         self.monitor_thread = None
         self.check_interval = 300  # 5分鐘檢查一次
+        self.alert_cooldown = timedelta(hours=1)
+        self._average_volume_cache = {}  # symbol -> (日期, 平均成交量)
+        self.quote_cache = QuoteCache(ttl=60)
+        self.quote_client = QuoteClient()
+        self._quote_executor = None
+        self._quote_executor_lock = threading.Lock()
+        # 歷史數據回填隊列 (backfill.HistoryBackfill)，設置後新股票第一次被監控時回填
+        self.backfill = None
+        self._page_cache = OrderedDict()  # user_id -> {(cursor, direction): page}
+        self._page_cache_lock = threading.Lock()
+        self._page_cache_version = 0  # 每次失效遞增，避免把失效前查詢的頁面寫回緩存
+    
+    @property
+    def bot(self):
+        """發送警報用的 Telegram Bot，首次發送時才創建"""
+        if self._bot is None and self.bot_token:
+            from telegram import Bot
+            self._bot = Bot(token=self.bot_token)
+        return self._bot
     
     def init_database(self):
-        """初始化數據庫和表結構"""
+        """初始化數據庫和表結構 (結構版本已是最新時直接返回)"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            conn.close()
+            return
+        
+        # 多個實例同時啟動時只由一個實例升級
+        cursor.execute('BEGIN IMMEDIATE')
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        
         # 創建股票監控表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS stock_watches (
@@ -50,6 +135,16 @@ class StockMonitorDB:
             )
         ''')
         
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_stock_watches_user_active
+            ON stock_watches (user_id, is_active, id)
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_price_history_symbol_time
+            ON price_history (symbol, timestamp)
+        ''')
+        
         # 創建用戶設置表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS user_settings (
@@ -61,34 +156,207 @@ class StockMonitorDB:
             )
         ''')
         
+        if version < 2:
+            # 股票數據持續獲取失敗時暫停的監控
+            cursor.execute('ALTER TABLE stock_watches ADD COLUMN suspended_at TIMESTAMP DEFAULT NULL')
+        
+        if version < 3:
+            # 監控變更日誌，由觸發器在新增監控和修改監控相關欄位時寫入 (不包括 last_checked)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS watch_changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    watch_id INTEGER NOT NULL,
+                    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_stock_watches_insert AFTER INSERT ON stock_watches
+                BEGIN
+                    INSERT INTO watch_changes (watch_id) VALUES (NEW.id);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_stock_watches_update
+                AFTER UPDATE OF user_id, chat_id, symbol, target_price, alert_type, is_active,
+                                last_alert, alert_count, suspended_at ON stock_watches
+                BEGIN
+                    INSERT INTO watch_changes (watch_id) VALUES (NEW.id);
+                END
+            ''')
+        
+        if version < 4:
+            # 只追加的警報事件日誌，每次發送警報寫入一行
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS alert_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    watch_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    symbol TEXT NOT NULL,
+                    alert_type TEXT NOT NULL,
+                    target_price REAL NOT NULL,
+                    price REAL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_alert_events_user_time ON alert_events (user_id, created_at)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_alert_events_symbol_time ON alert_events (symbol, created_at)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_alert_events_watch_time ON alert_events (watch_id, created_at)
+            ''')
+            # 預先計算的警報計數 (scope: total / day / symbol / user)，由觸發器隨事件遞增
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS alert_counters (
+                    scope TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    alerts INTEGER NOT NULL DEFAULT 0,
+                    last_alert TIMESTAMP,
+                    PRIMARY KEY (scope, key)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_alert_events_insert AFTER INSERT ON alert_events
+                BEGIN
+                    INSERT INTO alert_counters (scope, key, alerts, last_alert)
+                    VALUES ('total', '', 1, NEW.created_at),
+                           ('day', DATE(NEW.created_at, 'localtime'), 1, NEW.created_at),
+                           ('symbol', NEW.symbol, 1, NEW.created_at),
+                           ('user', CAST(NEW.user_id AS TEXT), 1, NEW.created_at)
+                    ON CONFLICT (scope, key) DO UPDATE
+                    SET alerts = alerts + 1, last_alert = excluded.last_alert;
+                END
+            ''')
+            # 以現有監控的 alert_count 作為總數、股票和用戶計數的起點 (舊警報沒有逐次記錄，無法按日拆分)
+            cursor.execute('''
+                INSERT OR IGNORE INTO alert_counters (scope, key, alerts, last_alert)
+                SELECT 'total', '', alerts, last_alert FROM (
+                    SELECT SUM(alert_count) AS alerts, MAX(last_alert) AS last_alert FROM stock_watches
+                ) WHERE alerts > 0
+                UNION ALL
+                SELECT 'symbol', symbol, SUM(alert_count), MAX(last_alert) FROM stock_watches
+                GROUP BY symbol HAVING SUM(alert_count) > 0
+                UNION ALL
+                SELECT 'user', CAST(user_id AS TEXT), SUM(alert_count), MAX(last_alert) FROM stock_watches
+                GROUP BY user_id HAVING SUM(alert_count) > 0
+            ''')
+        
+        if version < 5:
+            # 共享觸發器: 相同 (股票, 警報類型, 門檻) 的監控共用一個觸發器，每輪只評估一次
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS alert_triggers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    symbol TEXT NOT NULL,
+                    alert_type TEXT NOT NULL,
+                    threshold REAL NOT NULL,
+                    last_checked TIMESTAMP DEFAULT NULL,
+                    UNIQUE (symbol, alert_type, threshold)
+                )
+            ''')
+            cursor.execute('ALTER TABLE stock_watches ADD COLUMN trigger_id INTEGER REFERENCES alert_triggers (id)')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_stock_watches_trigger ON stock_watches (trigger_id)
+            ''')
+            # 新增、修改條件或恢復暫停的活躍監控自動關聯到 (或建立) 對應的觸發器
+            for event in ('INSERT', 'UPDATE OF symbol, alert_type, target_price, suspended_at'):
+                name = 'trg_stock_watches_link_' + event.split()[0].lower()
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON stock_watches
+                    WHEN NEW.is_active = 1 AND NEW.suspended_at IS NULL
+                    BEGIN
+                        INSERT OR IGNORE INTO alert_triggers (symbol, alert_type, threshold)
+                        VALUES (NEW.symbol, COALESCE(NEW.alert_type, 'above'), NEW.target_price);
+                        UPDATE stock_watches SET trigger_id = (
+                            SELECT id FROM alert_triggers
+                            WHERE symbol = NEW.symbol AND alert_type = COALESCE(NEW.alert_type, 'above')
+                              AND threshold = NEW.target_price
+                        ) WHERE id = NEW.id;
+                    END
+                ''')
+            # 監控被移除、暫停、刪除或改用其他觸發器後，沒有其他活躍監控訂閱的觸發器一併刪除
+            # (不論經哪個路徑修改 stock_watches；相同條件再次出現時由上面的觸發器重新建立)
+            orphaned = '''
+                DELETE FROM alert_triggers
+                WHERE id = OLD.trigger_id AND NOT EXISTS (
+                    SELECT 1 FROM stock_watches
+                    WHERE trigger_id = OLD.trigger_id AND is_active = 1 AND suspended_at IS NULL
+                );
+            '''
+            for event in ('UPDATE OF is_active, suspended_at, trigger_id', 'DELETE'):
+                name = 'trg_stock_watches_unlink_' + event.split()[0].lower()
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON stock_watches
+                    WHEN OLD.trigger_id IS NOT NULL
+                    BEGIN
+                        {orphaned}
+                    END
+                ''')
+            # 遷移現有監控 (已移除或暫停的監控不建立觸發器)
+            cursor.execute('''
+                INSERT OR IGNORE INTO alert_triggers (symbol, alert_type, threshold, last_checked)
+                SELECT symbol, COALESCE(alert_type, 'above'), target_price, MAX(last_checked)
+                FROM stock_watches WHERE is_active = 1 AND suspended_at IS NULL
+                GROUP BY symbol, COALESCE(alert_type, 'above'), target_price
+            ''')
+            cursor.execute('''
+                UPDATE stock_watches SET trigger_id = (
+                    SELECT id FROM alert_triggers t
+                    WHERE t.symbol = stock_watches.symbol
+                      AND t.alert_type = COALESCE(stock_watches.alert_type, 'above')
+                      AND t.threshold = stock_watches.target_price
+                )
+            ''')
+        
+        if version < 6:
+            # 警報記錄 (last_alert / alert_count) 不再寫入變更日誌：監控線程發送警報時直接更新內存中的記錄，
+            # 不必為每次警報重新載入監控
+            cursor.execute('DROP TRIGGER IF EXISTS trg_stock_watches_update')
+            cursor.execute('''
+                CREATE TRIGGER trg_stock_watches_update
+                AFTER UPDATE OF user_id, chat_id, symbol, target_price, alert_type, is_active,
+                                suspended_at ON stock_watches
+                BEGIN
+                    INSERT INTO watch_changes (watch_id) VALUES (NEW.id);
+                END
+            ''')
+        
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
         conn.close()
-        print(f"數據庫 {self.db_path} 初始化完成")
+        logger.info("數據庫 %s 初始化完成 (結構版本 %s)", self.db_path, SCHEMA_VERSION)
     
     def add_watch(self, user_id, chat_id, symbol, target_price, alert_type='above'):
         """添加股票監控"""
+        if alert_type not in ALERT_TYPES:
+            return False, f"不支援的警報類型: {alert_type}"
+        error = threshold_error(alert_type, target_price)
+        if error:
+            return False, error
+        
+        try:
+            symbol = self.symbols.resolve(symbol)
+        except SymbolError as e:
+            return False, str(e)
+        
         try:
-            # 處理香港股票代碼格式
-            if symbol.endswith('.HK'):
-                base_symbol = symbol.replace('.HK', '')
-                if base_symbol.isdigit():
-                    symbol = f"{base_symbol.zfill(4)}.HK"
-            elif symbol.isdigit() and len(symbol) <= 4:
-                symbol = f"{symbol.zfill(4)}.HK"
-            
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             # 檢查是否已存在相同的監控
             cursor.execute('''
                 SELECT id FROM stock_watches 
-                WHERE user_id = ? AND symbol = ? AND target_price = ? AND is_active = 1
-            ''', (user_id, symbol, target_price))
+                WHERE user_id = ? AND symbol = ? AND target_price = ? AND alert_type = ? AND is_active = 1
+            ''', (user_id, symbol, target_price, alert_type))
             
             if cursor.fetchone():
                 conn.close()
                 return False, "此股票監控已存在"
             
+            new_symbols = self._new_symbols(cursor, [symbol]) if self.backfill is not None else ()
+            
             # 添加新的監控
             cursor.execute('''
                 INSERT INTO stock_watches (user_id, chat_id, symbol, target_price, alert_type)
@@ -98,12 +366,128 @@ class StockMonitorDB:
             watch_id = cursor.lastrowid
             conn.commit()
             conn.close()
+            self.invalidate_watch_pages(user_id)
+            for new_symbol in new_symbols:
+                self.backfill.enqueue(new_symbol)
             
             return True, f"股票監控已添加 (ID: {watch_id})"
             
         except Exception as e:
             return False, f"添加監控失敗: {str(e)}"
     
+    def add_watches(self, user_id, chat_id, entries):
+        """
+        批量添加股票監控 (單一事務)
+        entries: [(symbol, target_price, alert_type), ...]
+        返回 (added, rejected)
+        added: [(watch_id, symbol, target_price, alert_type), ...]
+        rejected: [(entry, 原因), ...]
+        """
+        added = []
+        rejected = []
+        new_symbols = ()
+        
+        # 驗證並在批次內去重
+        pending = []
+        seen = set()
+        for entry in entries[:MAX_BULK_WATCHES]:
+            symbol, target_price, alert_type = entry
+            if alert_type not in ALERT_TYPES:
+                rejected.append((entry, f"不支援的警報類型: {alert_type}"))
+                continue
+            try:
+                target_price = float(target_price)
+            except (TypeError, ValueError):
+                rejected.append((entry, "無效的目標價格"))
+                continue
+            if not symbol:
+                rejected.append((entry, "無效的股票代碼"))
+                continue
+            error = threshold_error(alert_type, target_price)
+            if error:
+                rejected.append((entry, error))
+                continue
+            try:
+                key = (self.symbols.resolve(symbol), target_price, alert_type)
+            except SymbolError as e:
+                rejected.append((entry, str(e)))
+                continue
+            if key in seen:
+                rejected.append((entry, "批次內重複"))
+                continue
+            seen.add(key)
+            pending.append((entry, key))
+        for entry in entries[MAX_BULK_WATCHES:]:
+            rejected.append((entry, f"超過單次上限 {MAX_BULK_WATCHES} 個"))
+        
+        if not pending:
+            return added, rejected
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            
+            # 一次查詢用戶現有的監控
+            cursor.execute('''
+                SELECT symbol, target_price, alert_type FROM stock_watches 
+                WHERE user_id = ? AND is_active = 1
+            ''', (user_id,))
+            existing = set(cursor.fetchall())
+            
+            to_insert = []
+            for entry, key in pending:
+                if key in existing:
+                    rejected.append((entry, "此股票監控已存在"))
+                else:
+                    to_insert.append((entry, key))
+            if self.backfill is not None and to_insert:
+                new_symbols = self._new_symbols(cursor, [key[0] for _, key in to_insert])
+            
+            try:
+                with conn:
+                    for entry, key in to_insert:
+                        cursor.execute('''
+                            INSERT INTO stock_watches (user_id, chat_id, symbol, target_price, alert_type)
+                            VALUES (?, ?, ?, ?, ?)
+                        ''', (user_id, chat_id) + key)
+                        added.append((cursor.lastrowid,) + key)
+            except Exception as e:
+                # 事務已回滾
+                added = []
+                rejected.extend((entry, f"添加監控失敗: {str(e)}") for entry, _ in to_insert)
+        except Exception as e:
+            rejected.extend((entry, f"添加監控失敗: {str(e)}") for entry, _ in pending)
+        finally:
+            conn.close()
+        
+        if added:
+            self.invalidate_watch_pages(user_id)
+            for symbol in new_symbols:
+                self.backfill.enqueue(symbol)
+        return added, rejected
+    
+    def _new_symbols(self, cursor, symbols):
+        """還沒有任何活躍監控的股票 (第一次被監控時回填歷史數據)"""
+        symbols = set(symbols)
+        cursor.execute(f'''
+            SELECT DISTINCT symbol FROM stock_watches
+            WHERE is_active = 1 AND symbol IN ({",".join("?" * len(symbols))})
+        ''', tuple(symbols))
+        return symbols - {row[0] for row in cursor.fetchall()}
+    
+    def export_watches(self, user_id):
+        """導出用戶的活躍監控 [(symbol, target_price, alert_type), ...]"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT symbol, target_price, alert_type FROM stock_watches 
+            WHERE user_id = ? AND is_active = 1
+            ORDER BY id
+        ''', (user_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
     def remove_watch(self, user_id, watch_id):
         """移除股票監控"""
         try:
@@ -118,6 +502,7 @@ class StockMonitorDB:
             if cursor.rowcount > 0:
                 conn.commit()
                 conn.close()
+                self.invalidate_watch_pages(user_id)
                 return True, "監控已移除"
             else:
                 conn.close()
@@ -126,17 +511,65 @@ class StockMonitorDB:
         except Exception as e:
             return False, f"移除監控失敗: {str(e)}"
     
+    def resume_watch(self, user_id, watch_id):
+        """恢復被暫停的監控"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT symbol FROM stock_watches
+                WHERE id = ? AND user_id = ? AND is_active = 1 AND suspended_at IS NOT NULL
+            ''', (watch_id, user_id))
+            row = cursor.fetchone()
+            if row is None:
+                conn.close()
+                return False, "找不到指定的暫停監控"
+            
+            cursor.execute('UPDATE stock_watches SET suspended_at = NULL WHERE id = ?', (watch_id,))
+            conn.commit()
+            conn.close()
+            
+            # 下一輪重新嘗試獲取該股票
+            self.symbol_health.reset(row[0])
+            self.symbols.forget(row[0])
+            self.invalidate_watch_pages(user_id)
+            return True, f"監控已恢復 ({row[0]})"
+        
+        except Exception as e:
+            return False, f"恢復監控失敗: {str(e)}"
+    
+    def suspend_symbols(self, symbols):
+        """暫停這些股票的所有監控，返回被暫停的 [(watch_id, user_id, chat_id, symbol), ...]"""
+        placeholders = ','.join('?' * len(symbols))
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                rows = conn.execute(f'''
+                    SELECT id, user_id, chat_id, symbol FROM stock_watches
+                    WHERE symbol IN ({placeholders}) AND is_active = 1 AND suspended_at IS NULL
+                ''', list(symbols)).fetchall()
+                conn.executemany('UPDATE stock_watches SET suspended_at = CURRENT_TIMESTAMP WHERE id = ?',
+                                 [(row[0],) for row in rows])
+        finally:
+            conn.close()
+        for user_id in {row[1] for row in rows}:
+            self.invalidate_watch_pages(user_id)
+        return rows
+    
     def list_watches(self, user_id):
         """列出用戶的所有監控"""
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
+            # 最後檢查時間記錄在共享觸發器上
             cursor.execute('''
-                SELECT id, symbol, target_price, alert_type, created_at, last_checked, alert_count
-                FROM stock_watches 
-                WHERE user_id = ? AND is_active = 1
-                ORDER BY created_at DESC
+                SELECT w.id, w.symbol, w.target_price, w.alert_type, w.created_at,
+                       COALESCE(t.last_checked, w.last_checked), w.alert_count
+                FROM stock_watches w LEFT JOIN alert_triggers t ON t.id = w.trigger_id
+                WHERE w.user_id = ? AND w.is_active = 1
+                ORDER BY w.created_at DESC
             ''', (user_id,))
             
             watches = cursor.fetchall()
@@ -145,26 +578,180 @@ class StockMonitorDB:
             if not watches:
                 return "您目前沒有設置任何股票監控"
             
-            result = "📊 **您的股票監控列表**\n\n"
+            parts = ["📊 **您的股票監控列表**\n\n"]
             for watch in watches:
                 watch_id, symbol, target_price, alert_type, created_at, last_checked, alert_count = watch
-                alert_text = "高於" if alert_type == 'above' else "低於"
-                result += f"🆔 **ID: {watch_id}**\n"
-                result += f"📈 股票: {symbol}\n"
-                result += f"🎯 目標: {alert_text} ${target_price:.2f}\n"
-                result += f"📅 創建: {created_at}\n"
-                result += f"⏰ 最後檢查: {last_checked}\n"
-                result += f"🚨 警報次數: {alert_count}\n\n"
+                parts.append(
+                    f"🆔 **ID: {watch_id}**\n"
+                    f"📈 股票: {symbol}\n"
+                    f"🎯 目標: {describe_alert(alert_type, target_price)}\n"
+                    f"📅 創建: {created_at}\n"
+                    f"⏰ 最後檢查: {last_checked}\n"
+                    f"🚨 警報次數: {alert_count}\n\n"
+                )
             
-            return result
+            return "".join(parts)
             
         except Exception as e:
             return f"獲取監控列表失敗: {str(e)}"
     
+    def list_watches_page(self, user_id, cursor_id=None, direction='next', page_size=WATCHLIST_PAGE_SIZE):
+        """
+        按 ID 倒序分頁列出監控 (keyset 分頁)
+        direction='next' 返回 ID 小於 cursor_id 的一頁，'prev' 返回 ID 大於 cursor_id 的一頁
+        返回 (rows, has_prev, has_next)
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        columns = "SELECT id, symbol, target_price, alert_type, created_at, alert_count, suspended_at FROM stock_watches"
+        if cursor_id is None:
+            cursor.execute(columns + '''
+                WHERE user_id = ? AND is_active = 1
+                ORDER BY id DESC LIMIT ?
+            ''', (user_id, page_size + 1))
+        elif direction == 'prev':
+            cursor.execute(columns + '''
+                WHERE user_id = ? AND is_active = 1 AND id > ?
+                ORDER BY id ASC LIMIT ?
+            ''', (user_id, cursor_id, page_size + 1))
+        else:
+            cursor.execute(columns + '''
+                WHERE user_id = ? AND is_active = 1 AND id < ?
+                ORDER BY id DESC LIMIT ?
+            ''', (user_id, cursor_id, page_size + 1))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if cursor_id is not None and direction == 'prev':
+            rows.reverse()
+            return rows, more, True
+        return rows, cursor_id is not None, more
+    
+    def render_watch_page(self, user_id, cursor_id=None, direction='next'):
+        """
+        渲染一頁監控列表，現價取自共享報價緩存
+        返回 (text, has_prev, has_next, first_id, last_id)；沒有監控時返回 None
+        靜態部分按用戶緩存，添加/移除監控或發出警報時失效
+        """
+        key = (cursor_id, direction)
+        with self._page_cache_lock:
+            page = self._page_cache.get(user_id, {}).get(key)
+            version = self._page_cache_version
+        
+        if page is None:
+            rows, has_prev, has_next = self.list_watches_page(user_id, cursor_id, direction)
+            if not rows:
+                return None
+            blocks = tuple(
+                (symbol,
+                 f"🆔 **ID: {watch_id}**\n"
+                 f"📈 股票: {symbol}\n"
+                 f"🎯 目標: {describe_alert(alert_type, target_price)}\n"
+                 f"📅 創建: {created_at}\n"
+                 f"🚨 警報次數: {alert_count}\n"
+                 + (f"⏸️ 已暫停: 股票數據持續獲取失敗 (/resumewatch {watch_id} 恢復)\n" if suspended_at else ""))
+                for watch_id, symbol, target_price, alert_type, created_at, alert_count, suspended_at in rows
+            )
+            page = (blocks, has_prev, has_next, rows[0][0], rows[-1][0])
+            with self._page_cache_lock:
+                if version == self._page_cache_version:
+                    self._page_cache.setdefault(user_id, {})[key] = page
+                    self._page_cache.move_to_end(user_id)
+                    while len(self._page_cache) > WATCHLIST_CACHE_USERS:
+                        self._page_cache.popitem(last=False)
+        
+        blocks, has_prev, has_next, first_id, last_id = page
+        parts = ["📊 **您的股票監控列表**\n\n"]
+        for symbol, block in blocks:
+            parts.append(block)
+            cached = self.quote_cache.peek(symbol)
+            if cached is not None:
+                age, quote = cached
+                parts.append(f"💰 現價: ${quote['price']:.2f} ({int(age)}秒前)\n")
+            parts.append("\n")
+        return "".join(parts), has_prev, has_next, first_id, last_id
+    
+    def invalidate_watch_pages(self, user_id):
+        """清除用戶已渲染的監控列表頁面"""
+        with self._page_cache_lock:
+            self._page_cache.pop(user_id, None)
+            self._page_cache_version += 1
+    
+    def get_stock_quote(self, symbol):
+        """獲取股票當前報價 (現價、成交量、昨收、開盤)"""
+        if self.symbols.is_valid(symbol) is False:
+            self._failure_kinds[symbol] = FAILURE_NOT_FOUND
+            return None
+        try:
+            # 只保留需要的 meta 欄位和開盤價，不持有整個回應
+            status_code, quote = self.quote_client.fetch_quote(symbol)
+            
+            if status_code == 404:
+                self.symbols.record_response(symbol, 404)
+                self._failure_kinds[symbol] = FAILURE_NOT_FOUND
+            elif status_code == 200 and quote is not None:
+                self.symbols.record_response(symbol, 200)
+                # 保存價格歷史
+                self.save_price_history(symbol, quote.price, quote.volume)
+                self.quote_cache.set(symbol, quote)
+                return quote
+            elif status_code == 200:
+                self._failure_kinds[symbol] = FAILURE_NO_DATA
+            else:
+                # 429、5xx 等上游錯誤
+                self._failure_kinds[symbol] = FAILURE_TRANSIENT
+            
+            return None
+            
+        except Exception as e:
+            logger.warning("獲取股票價格失敗 %s: %s", symbol, e, extra={'symbol': symbol})
+            self._failure_kinds[symbol] = FAILURE_TRANSIENT
+            return None
+    
+    def _quote_pool(self):
+        """報價請求線程池 (首次使用時創建並一直保留，QuoteClient 的線程內 Session 因此可以跨輪重用連接)"""
+        with self._quote_executor_lock:
+            if self._quote_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._quote_executor = ThreadPoolExecutor(max_workers=QUOTE_WORKERS, thread_name_prefix="quote")
+            return self._quote_executor
+    
+    def get_stock_quotes(self, symbols):
+        """並發獲取多隻股票的報價，返回 {symbol: quote}，失敗的股票不包括在內"""
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+        ids = current_ids()  # 線程池不繼承 contextvars，把關聯 ID 帶到每個任務
+
+        def fetch(symbol):
+            with bind(**ids):
+                return self.get_stock_quote(symbol)
+
+        results = self._quote_pool().map(fetch, symbols)
+        return {symbol: quote for symbol, quote in zip(symbols, results) if quote is not None}
+    
     def get_stock_price(self, symbol):
         """獲取股票當前價格"""
+        quote = self.get_stock_quote(symbol)
+        if quote is None:
+            return None, None
+        return quote['price'], quote['volume']
+    
+    def get_average_volume(self, symbol):
+        """獲取平均成交量 (每日只請求一次 quoteSummary)"""
+        import requests
+        today = datetime.now().date()
+        cached = self._average_volume_cache.get(symbol)
+        if cached and cached[0] == today:
+            return cached[1]
+        
+        average_volume = None
         try:
-            url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+            url = f"https://query1.finance.yahoo.com/v10/finance/quoteSummary/{symbol}?modules=summaryDetail"
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             }
@@ -173,127 +760,299 @@ class StockMonitorDB:
             
             if response.status_code == 200:
                 data = response.json()
-                if 'chart' in data and 'result' in data['chart'] and data['chart']['result']:
-                    result = data['chart']['result'][0]
-                    meta = result['meta']
-                    
-                    current_price = meta.get('regularMarketPrice')
-                    volume = meta.get('regularMarketVolume')
-                    
-                    if current_price:
-                        # 保存價格歷史
-                        self.save_price_history(symbol, current_price, volume)
-                        return current_price, volume
-            
-            return None, None
-            
+                quote_summary = data.get('quoteSummary', {}).get('result') or [{}]
+                average_volume = quote_summary[0].get('summaryDetail', {}).get('averageVolume')
+                if isinstance(average_volume, dict):
+                    average_volume = average_volume.get('raw')
         except Exception as e:
-            print(f"獲取股票價格失敗 {symbol}: {str(e)}")
-            return None, None
+            logger.warning("獲取平均成交量失敗 %s: %s", symbol, e, extra={'symbol': symbol})
+        
+        self._average_volume_cache[symbol] = (today, average_volume)
+        return average_volume
+
     
     def save_price_history(self, symbol, price, volume):
-        """保存價格歷史到數據庫"""
+        """保存價格歷史到歷史後端"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO price_history (symbol, price, volume)
-                VALUES (?, ?, ?)
-            ''', (symbol, price, volume))
-            
-            conn.commit()
-            conn.close()
-            
+            self.history.save(symbol, price, volume)
         except Exception as e:
-            print(f"保存價格歷史失敗: {str(e)}")
+            logger.warning("保存價格歷史失敗 %s: %s", symbol, e, extra={'symbol': symbol})
+    
+    def load_price_history(self, symbol, start=None, end=None):
+        """讀取價格歷史，返回 tick_store.PriceSeries (start/end 為 UNIX 秒)"""
+        return self.history.load(symbol, start, end)
     
-    def check_alerts(self):
-        """檢查所有監控並發送警報"""
+    def check_alerts(self, symbols=None):
+        """檢查所有監控並發送警報 (指定 symbols 時只檢查這些股票)"""
+        import asyncio
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            watches = self.load_watch_columns()
+            if symbols is not None:
+                watches = watches.subset(symbols)
             
-            # 獲取所有活躍的監控
-            cursor.execute('''
-                SELECT id, user_id, chat_id, symbol, target_price, alert_type, last_alert, alert_count
-                FROM stock_watches 
-                WHERE is_active = 1
-            ''')
+            # 每隻股票每輪只請求一次報價，仍在失敗退避期內的股票本輪略過
+            symbols = self.symbol_health.due(watches.symbols)
+            quotes = self.get_stock_quotes(symbols)
+            failed = []
+            for symbol in symbols:
+                kind = self._failure_kinds.pop(symbol, FAILURE_TRANSIENT)
+                if symbol in quotes:
+                    self.symbol_health.record_success(symbol)
+                    continue
+                if self.symbols.is_valid(symbol) is False:
+                    kind = FAILURE_NOT_FOUND
+                # 只有代碼本身的失敗會導致暫停，上游錯誤只延長退避
+                self.symbol_health.record_failure(symbol, kind)
+                if self.symbol_health.should_suspend(symbol):
+                    failed.append(symbol)
+            if failed:
+                self.suspend_failed_symbols(failed)
             
-            watches = cursor.fetchall()
-            conn.close()
+            for symbol in watches.symbols_needing(needs_average_volume):
+                if symbol in quotes:
+                    quotes[symbol]['averageVolume'] = self.get_average_volume(symbol)
             
-            for watch in watches:
-                watch_id, user_id, chat_id, symbol, target_price, alert_type, last_alert, alert_count = watch
-                
-                # 獲取當前價格
-                current_price, volume = self.get_stock_price(symbol)
-                
-                if current_price is None:
-                    continue
-                
-                # 檢查是否需要發送警報
-                should_alert = False
-                alert_message = ""
-                
-                if alert_type == 'above' and current_price >= target_price:
-                    should_alert = True
-                    alert_message = f"🚨 **股票警報** 🚨\n\n"
-                    alert_message += f"📈 **{symbol}** 已達到目標價格！\n"
-                    alert_message += f"🎯 目標價格: ${target_price:.2f}\n"
-                    alert_message += f"💰 當前價格: ${current_price:.2f}\n"
-                    alert_message += f"📊 成交量: {volume:,}" if volume else "📊 成交量: N/A"
-                
-                elif alert_type == 'below' and current_price <= target_price:
-                    should_alert = True
-                    alert_message = f"🚨 **股票警報** 🚨\n\n"
-                    alert_message += f"📉 **{symbol}** 已跌至目標價格！\n"
-                    alert_message += f"🎯 目標價格: ${target_price:.2f}\n"
-                    alert_message += f"💰 當前價格: ${current_price:.2f}\n"
-                    alert_message += f"📊 成交量: {volume:,}" if volume else "📊 成交量: N/A"
-                
-                # 發送警報
-                if should_alert and self.bot:
-                    try:
-                        # 檢查是否在冷卻期內（避免重複警報）
-                        if last_alert:
-                            last_alert_time = datetime.fromisoformat(last_alert)
-                            if datetime.now() - last_alert_time < timedelta(hours=1):
-                                continue
-                        
-                        # 發送Telegram消息
-                        asyncio.run(self.send_telegram_message(chat_id, alert_message))
-                        
-                        # 更新最後警報時間和警報次數
-                        conn = sqlite3.connect(self.db_path)
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                            UPDATE stock_watches 
-                            SET last_alert = CURRENT_TIMESTAMP, alert_count = alert_count + 1
-                            WHERE id = ?
-                        ''', (watch_id,))
-                        conn.commit()
-                        conn.close()
-                        
-                        print(f"已發送警報: {symbol} 達到目標價格 ${target_price}")
-                        
-                    except Exception as e:
-                        print(f"發送警報失敗: {str(e)}")
-                
-                # 更新最後檢查時間
+            # 一次過評估所有觸發器 (每個不同的條件一行)
+            fired = evaluate_alerts(watches, quotes)
+            
+            alerted_ids = []
+            events = []
+            # last_alert 與 CURRENT_TIMESTAMP 一樣以 UTC 記錄，冷卻期同樣以 UTC 比較 (不受主機時區影響)
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            if self.bot:
+                for index in fired:
+                    trigger = watches.rows[index]
+                    symbol, target_price, alert_type = trigger.symbol, trigger.target_price, trigger.alert_type
+                    alert_message = format_alert_message(symbol, alert_type, target_price, quotes[symbol])
+                    
+                    # 觸發後分發給所有訂閱者，每個監控各自計算冷卻期
+                    for watch in self._subscribers.get(trigger.trigger_id, {}).values():
+                        try:
+                            # 檢查是否在冷卻期內（避免重複警報）
+                            if watch.last_alert:
+                                last_alert_time = datetime.fromisoformat(watch.last_alert)
+                                if now - last_alert_time < self.alert_cooldown:
+                                    continue
+                            
+                            # 發送Telegram消息
+                            asyncio.run(self.send_telegram_message(watch.chat_id, alert_message))
+                            alerted_ids.append(watch)
+                            events.append((watch.id, watch.user_id, watch.chat_id, symbol, alert_type, target_price,
+                                           quotes[symbol]['price']))
+                            
+                            logger.info("已發送警報: %s %s", symbol, describe_alert(alert_type, target_price),
+                                        extra={'symbol': symbol, 'watch_id': watch.id, 'chat_id': watch.chat_id})
+                            
+                        except Exception as e:
+                            logger.warning("發送警報失敗: %s", e, extra={'symbol': symbol, 'watch_id': watch.id})
+            
+            # 批量更新最後警報時間、警報次數和觸發器的最後檢查時間 (每個觸發器一行，不按監控更新)
+            checked_ids = ((row.trigger_id,) for row in watches.rows if row.symbol in quotes)
+            if alerted_ids or quotes:
+                # 與 CURRENT_TIMESTAMP 相同的格式 (UTC)，同時寫入數據庫和內存中的記錄
+                alerted_at = now.strftime('%Y-%m-%d %H:%M:%S')
                 conn = sqlite3.connect(self.db_path)
                 cursor = conn.cursor()
-                cursor.execute('''
+                cursor.executemany('''
                     UPDATE stock_watches 
+                    SET last_alert = ?, alert_count = alert_count + 1
+                    WHERE id = ?
+                ''', ((alerted_at, watch.id) for watch in alerted_ids))
+                # 警報事件與監控更新在同一事務寫入，計數由觸發器維護
+                cursor.executemany('''
+                    INSERT INTO alert_events (watch_id, user_id, chat_id, symbol, alert_type, target_price, price)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', events)
+                cursor.executemany('''
+                    UPDATE alert_triggers
                     SET last_checked = CURRENT_TIMESTAMP
                     WHERE id = ?
-                ''', (watch_id,))
+                ''', checked_ids)
                 conn.commit()
                 conn.close()
+                # 警報記錄不經變更日誌，提交後直接更新內存中的冷卻時間和次數
+                for watch in alerted_ids:
+                    watch.last_alert = alerted_at
+                    watch.alert_count += 1
+                # 提交後才清除已渲染的列表頁面，避免期間重新緩存舊的警報次數
+                for user_id in {watch.user_id for watch in alerted_ids}:
+                    self.invalidate_watch_pages(user_id)
                 
         except Exception as e:
-            print(f"檢查警報失敗: {str(e)}")
+            logger.error("檢查警報失敗: %s", e, exc_info=True)
+    
+    def suspend_failed_symbols(self, symbols):
+        """暫停持續獲取失敗的股票的監控，並通知相關用戶"""
+        import asyncio
+        suspended = self.suspend_symbols(symbols)
+        if not suspended:
+            return
+        logger.warning("已暫停 %d 個監控: %s", len(suspended), ', '.join(symbols))
+        if not self.bot:
+            return
+        
+        by_chat = {}
+        for watch_id, user_id, chat_id, symbol in suspended:
+            by_chat.setdefault(chat_id, []).append((watch_id, symbol))
+        for chat_id, watches in by_chat.items():
+            message = "⏸️ **股票監控已暫停**\n\n以下股票多次無法獲取數據 (可能已退市或代碼錯誤)：\n"
+            for watch_id, symbol in watches:
+                message += f"🆔 {watch_id} - {symbol}\n"
+            message += "\n💡 使用 /resumewatch <監控ID> 恢復，或 /removewatch <監控ID> 移除"
+            asyncio.run(self.send_telegram_message(chat_id, message))
+    
+    def load_watch_columns(self):
+        """
+        套用變更日誌後返回本輪的 WatchColumns (每個共享觸發器一行，訂閱者見 self._subscribers)
+        新增和移除的監控逐項套用到訂閱者和陣列，每輪的成本只與變更數量有關；
+        首次載入、變更日誌被清理或持有的分片變化時才完整重建
+        """
+        owned = self.lease_manager.owned if self.lease_manager is not None else None
+        if self._watch_columns is not None and owned != self._watch_columns_owned:
+            # 接手的分片中的警報記錄由其他實例寫入 (不經變更日誌)，需要重新載入
+            self.watch_set.reload()
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.watch_set.refresh(conn)
+        finally:
+            conn.close()
+        
+        # 只處理本實例持有租約的分片
+        owns_symbol = self.lease_manager.owns_symbol if self.lease_manager is not None else None
+        changes = self.watch_set.take_changes()
+        if changes is None or self._watch_columns is None:
+            self._subscribers = {
+                trigger_id: {record.id: record for record in records}
+                for trigger_id, records in self.watch_set.subscribers(owns_symbol).items()
+            }
+            self._watch_columns = WatchColumns(
+                (next(iter(records.values())) for records in self._subscribers.values()), key=attrgetter('trigger_id'))
+            self._watch_columns_owned = owned
+            self._schedule_dirty = None
+            return self._watch_columns
+        
+        columns = self._watch_columns
+        dirty = self._schedule_dirty
+        for record, added in changes:
+            if owns_symbol is not None and not owns_symbol(record.symbol):
+                continue
+            if dirty is not None:
+                dirty.add(record.symbol)
+            records = self._subscribers.get(record.trigger_id)
+            if added:
+                if records is None:
+                    self._subscribers[record.trigger_id] = {record.id: record}
+                    columns.append(record)
+                else:
+                    records[record.id] = record
+            elif records is not None and records.get(record.id) is record:
+                del records[record.id]
+                if records:
+                    columns.replace(record.trigger_id, next(iter(records.values())))
+                else:
+                    del self._subscribers[record.trigger_id]
+                    columns.remove(record.trigger_id)
+        return columns
+    
+    def set_check_interval(self, user_id, chat_id, interval):
+        """設置用戶的檢查間隔，interval 可為等級名稱 (premium/default/digest) 或秒數"""
+        seconds = CHECK_INTERVAL_TIERS.get(interval, interval)
+        if not isinstance(seconds, (int, float)) or seconds < SCHEDULER_TICK:
+            return False, f"無效的檢查間隔: {interval}"
+        try:
+            conn = sqlite3.connect(self.db_path)
+            with conn:
+                conn.execute('''
+                    INSERT INTO user_settings (user_id, chat_id, check_interval) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET check_interval = excluded.check_interval
+                ''', (user_id, chat_id, int(seconds)))
+            conn.close()
+        except Exception as e:
+            return False, f"設置檢查間隔失敗: {str(e)}"
+        self._user_intervals = None
+        return True, f"檢查間隔已設為 {int(seconds)} 秒"
+    
+    def load_user_intervals(self, now=None):
+        """用戶的檢查間隔 (定期重新讀取 user_settings)"""
+        now = time.monotonic() if now is None else now
+        intervals = self._user_intervals
+        if intervals is None or now - self._user_intervals_loaded >= USER_SETTINGS_RELOAD:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                loaded = dict(conn.execute(
+                    'SELECT user_id, check_interval FROM user_settings WHERE check_interval IS NOT NULL'))
+            finally:
+                conn.close()
+            if loaded != intervals:
+                self._user_intervals_version += 1
+            self._user_intervals = intervals = loaded
+            self._user_intervals_loaded = now
+        return intervals
+    
+    def sync_schedule(self, now=None):
+        """
+        監控或用戶設置變化時更新每隻股票的檢查間隔 (取訂閱用戶中最短的)
+        平時只重新計算監控有變化的股票；用戶設置或全局間隔變化、監控完整重建時才計算所有股票
+        新股票立即調度，間隔縮短的股票提前到下一格，已沒有監控的股票取消
+        首次調度時 (重啟後) 緩存中仍有最近報價的股票按上次報價時間接續，不在第一格一次過全部請求
+        """
+        now = time.monotonic() if now is None else now
+        self.load_watch_columns()
+        user_intervals = self.load_user_intervals(now)
+        key = (self._user_intervals_version, self.check_interval)
+        first_sync = self._schedule_key is None
+        if key != self._schedule_key or self._schedule_dirty is None:
+            symbols = self._symbol_intervals.keys() | self.watch_set.by_symbol.keys()
+        else:
+            symbols = self._schedule_dirty
+        self._schedule_dirty = set()
+        self._schedule_key = key
+        
+        owns_symbol = self.lease_manager.owns_symbol if self.lease_manager is not None else None
+        for symbol in symbols:
+            records = self.watch_set.by_symbol.get(symbol)
+            if not records or (owns_symbol is not None and not owns_symbol(symbol)):
+                if self._symbol_intervals.pop(symbol, None) is not None:
+                    self.scheduler.cancel(symbol)
+                continue
+            interval = min(user_intervals.get(record.user_id, self.check_interval) for record in records)
+            previous = self._symbol_intervals.get(symbol)
+            if previous is None or symbol not in self.scheduler or interval < previous:
+                delay = 0
+                cached = self.quote_cache.peek(symbol) if first_sync else None
+                if cached is not None and cached[0] < interval:
+                    delay = interval - cached[0]
+                self.scheduler.schedule(symbol, delay, now)
+            self._symbol_intervals[symbol] = interval
+    
+    def run_scheduled(self, now=None):
+        """推進時間輪，批量檢查本格到期的股票並按各自間隔重新調度，返回檢查的股票"""
+        now = time.monotonic() if now is None else now
+        self.sync_schedule(now)
+        due = self.scheduler.advance(now)
+        if not due:
+            return []
+        cycle_logger.info("檢查股票警報 (%d 隻股票)", len(due), extra={'symbols': len(due)})
+        try:
+            # 本輪的報價請求、警報和錯誤記錄共用一個 cycle_id
+            with bind(cycle_id=new_cycle_id()):
+                self.check_alerts(due)
+        finally:
+            for symbol in due:
+                self.scheduler.schedule(symbol, self._symbol_intervals.get(symbol, self.check_interval), now)
+        return due
+    
+    def prune_watch_changes(self):
+        """清理過期的監控變更日誌"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "DELETE FROM watch_changes WHERE changed_at < datetime('now', ?)",
+                    (f'-{WATCH_CHANGES_RETENTION_DAYS} days',))
+        finally:
+            conn.close()
     
     async def send_telegram_message(self, chat_id, message):
         """發送Telegram消息"""
@@ -304,7 +1063,7 @@ class StockMonitorDB:
                 parse_mode='Markdown'
             )
         except Exception as e:
-            print(f"發送Telegram消息失敗: {str(e)}")
+            logger.warning("發送Telegram消息失敗: %s", e, extra={'chat_id': chat_id})
     
     def start_monitoring(self, interval_seconds=None):
         """開始監控"""
@@ -317,13 +1076,22 @@ class StockMonitorDB:
         self.monitoring = True
         
         def monitor_loop():
+            last_prune = 0
+            last_lease = float('-inf')
             while self.monitoring:
                 try:
-                    print(f"檢查股票警報... {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                    self.check_alerts()
-                    time.sleep(self.check_interval)
+                    # 租約在到期前續期，不必每格都寫入
+                    now = time.monotonic()
+                    if self.lease_manager is not None and now - last_lease >= self.lease_manager.ttl / 3:
+                        self.lease_manager.refresh()
+                        last_lease = now
+                    self.run_scheduled(now)
+                    if now - last_prune >= 3600:
+                        self.prune_watch_changes()
+                        last_prune = now
+                    time.sleep(self.scheduler.tick)
                 except Exception as e:
-                    print(f"監控循環錯誤: {str(e)}")
+                    logger.error("監控循環錯誤: %s", e, exc_info=True)
                     time.sleep(60)  # 錯誤時等待1分鐘
         
         self.monitor_thread = threading.Thread(target=monitor_loop, daemon=True)
@@ -339,6 +1107,12 @@ class StockMonitorDB:
         self.monitoring = False
         if self.monitor_thread:
             self.monitor_thread.join(timeout=5)
+        if self.lease_manager is not None:
+            self.lease_manager.release_all()
+        with self._quote_executor_lock:
+            if self._quote_executor is not None:
+                self._quote_executor.shutdown(wait=False)
+                self._quote_executor = None
         
         return True, "股票監控已停止"
     
@@ -348,9 +1122,59 @@ class StockMonitorDB:
             'is_monitoring': self.monitoring,
             'thread_alive': self.monitor_thread.is_alive() if self.monitor_thread else False,
             'check_interval': self.check_interval,
-            'database_path': self.db_path
+            'database_path': self.db_path,
+            'owned_shards': sorted(self.lease_manager.owned) if self.lease_manager else None
         }
     
+    def _alert_counter(self, cursor, scope, key):
+        cursor.execute('SELECT alerts FROM alert_counters WHERE scope = ? AND key = ?', (scope, str(key)))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    
+    def get_alert_count(self, symbol=None, user_id=None, day=None):
+        """
+        查詢警報次數 (一次主鍵查詢)
+        可按股票、用戶或日期 (date 或 'YYYY-MM-DD') 查詢，都不指定時返回總數
+        """
+        if symbol is not None:
+            scope, key = 'symbol', symbol
+        elif user_id is not None:
+            scope, key = 'user', user_id
+        elif day is not None:
+            scope, key = 'day', day.isoformat() if hasattr(day, 'isoformat') else day
+        else:
+            scope, key = 'total', ''
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return self._alert_counter(conn.cursor(), scope, key)
+        finally:
+            conn.close()
+    
+    def get_alert_events(self, user_id=None, symbol=None, watch_id=None, limit=20):
+        """
+        查詢警報事件 (最新的在前)，按用戶、股票或監控過濾
+        返回 [(id, watch_id, symbol, alert_type, target_price, price, created_at), ...]
+        """
+        conditions = []
+        params = []
+        for column, value in (('user_id', user_id), ('symbol', symbol), ('watch_id', watch_id)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT id, watch_id, symbol, alert_type, target_price, price, created_at
+                FROM alert_events {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', params + [limit])
+            return cursor.fetchall()
+        finally:
+            conn.close()
+    
     def get_statistics(self):
         """獲取監控統計信息"""
         try:
@@ -361,17 +1185,10 @@ class StockMonitorDB:
             cursor.execute('SELECT COUNT(*) FROM stock_watches WHERE is_active = 1')
             total_watches = cursor.fetchone()[0]
             
-            # 今日警報數量
-            today = datetime.now().date()
-            cursor.execute('''
-                SELECT COUNT(*) FROM stock_watches 
-                WHERE is_active = 1 AND DATE(last_alert) = ?
-            ''', (today,))
-            today_alerts = cursor.fetchone()[0]
-            
-            # 總警報數量
-            cursor.execute('SELECT SUM(alert_count) FROM stock_watches WHERE is_active = 1')
-            total_alerts = cursor.fetchone()[0] or 0
+            # 今日和總警報數量 (預先計算的計數，不掃描監控表)
+            today = datetime.now().date().isoformat()
+            today_alerts = self._alert_counter(cursor, 'day', today)
+            total_alerts = self._alert_counter(cursor, 'total', '')
             
             conn.close()
             
@@ -387,6 +1204,8 @@ class StockMonitorDB:
 
 # 測試代碼
 if __name__ == "__main__":
+    import json
+    
     # 創建監控實例
     monitor = StockMonitorDB()
     
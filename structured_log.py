@@ -0,0 +1,229 @@
+"""
+結構化日誌
+- 所有模塊使用標準 logging；setup_logging() 在根 logger 上只安裝一個 QueueHandler，
+  調用方只建立記錄並放入隊列 (隊列滿時丟棄並計數，不會阻塞)，由 QueueListener 線程格式化和輸出
+- JSON 輸出 (每行一個物件)，包括時間、級別、logger、訊息、額外欄位和關聯 ID
+- 關聯 ID 以 contextvars 保存：Bot 每個更新一個 request_id，監控每輪一個 cycle_id，
+  asyncio 任務和 asyncio.to_thread 會自動帶上，線程池需要用 bind() 傳遞
+- 高頻事件可按 logger 抽樣 (每 N 條記錄保留 1 條，只適用於 WARNING 以下)
+"""
+
+import atexit
+import contextlib
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+# 關聯 ID 欄位 -> ContextVar
+CORRELATION_IDS = {
+    'request_id': contextvars.ContextVar('request_id', default=None),
+    'cycle_id': contextvars.ContextVar('cycle_id', default=None),
+}
+
+# 默認抽樣: logger 名稱 -> 每 N 條保留 1 條
+DEFAULT_SAMPLING = {
+    'bot.api': 20,              # 每個請求的上游回應狀態
+    'stock_monitor.cycle': 10,  # 每輪檢查
+    'httpx': 100,               # python-telegram-bot 每次輪詢的 HTTP 請求
+}
+
+# LogRecord 自帶的屬性，其餘屬性視為 extra 欄位
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_cycle_counter = itertools.count(1)
+_listener = None
+_handler = None
+_atexit_registered = False
+
+
+def current_ids():
+    """當前上下文中已設置的關聯 ID"""
+    ids = {}
+    for name, var in CORRELATION_IDS.items():
+        value = var.get()
+        if value is not None:
+            ids[name] = value
+    return ids
+
+
+@contextlib.contextmanager
+def bind(**ids):
+    """在 with 區塊內設置關聯 ID (例如把 cycle_id 傳給線程池中的任務)"""
+    tokens = [(CORRELATION_IDS[name], CORRELATION_IDS[name].set(value)) for name, value in ids.items()]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def new_cycle_id():
+    """監控輪次 ID (進程內遞增)"""
+    return f"c{next(_cycle_counter)}"
+
+
+def with_request_id(handler):
+    """包裝 Bot 處理函數 handler(update, context)，以 Telegram update_id 作為 request_id"""
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        with bind(request_id=f"u{getattr(update, 'update_id', None)}"):
+            return await handler(update, context)
+    return wrapper
+
+
+class SamplingFilter(logging.Filter):
+    """按 logger 抽樣：rates 為 {logger 名稱: N}，子 logger 使用最接近的設定，WARNING 及以上全部保留"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self._counters = {}  # (logger, 訊息模板) -> itertools.count
+
+    def _rate(self, name):
+        while name:
+            rate = self.rates.get(name)
+            if rate is not None:
+                return rate
+            name = name.rpartition('.')[0]
+        return 1
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate <= 1:
+            return True
+        key = (record.name, record.msg)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        if next(counter) % rate:
+            return False
+        record.sampled = rate
+        return True
+
+
+class ContextFilter(logging.Filter):
+    """在調用方的上下文中把關聯 ID 附加到記錄 (輸出線程中已無法讀取)"""
+
+    def filter(self, record):
+        for name, var in CORRELATION_IDS.items():
+            value = var.get()
+            if value is not None:
+                setattr(record, name, value)
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    使用 queue.SimpleQueue (C 實現，放入時不需要條件變量)，超過 max_size 條時丟棄記錄並計數，不阻塞調用方
+    只在同一進程內使用，prepare() 不預先格式化，格式化在輸出線程中進行
+    """
+
+    def __init__(self, max_size=10000):
+        super().__init__(queue.SimpleQueue())
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """每條記錄輸出一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """人類可讀格式，關聯 ID 附加在訊息後"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        ids = [f"{name}={getattr(record, name)}" for name in CORRELATION_IDS if hasattr(record, name)]
+        return f"{text} [{' '.join(ids)}]" if ids else text
+
+
+def parse_sampling(text):
+    """解析 "bot.api=100,stock_monitor.cycle=10" -> {名稱: N}，無效的項目略過"""
+    rates = {}
+    for item in (text or '').split(','):
+        name, _, rate = item.strip().partition('=')
+        if name and rate.isdigit():
+            rates[name] = int(rate)
+    return rates
+
+
+def setup_logging(level=None, fmt=None, stream=None, sampling=None, max_queue=10000):
+    """
+    安裝隊列日誌 (重複調用時先停止舊的輸出線程)，返回 QueueListener
+    環境變量: LOG_LEVEL (默認 INFO)、LOG_FORMAT (json / text，默認 json)、LOG_SAMPLE (覆蓋默認抽樣)
+    """
+    global _listener, _handler, _atexit_registered
+    level = level or os.environ.get('LOG_LEVEL', 'INFO')
+    fmt = fmt or os.environ.get('LOG_FORMAT', 'json')
+    if sampling is None:
+        sampling = dict(DEFAULT_SAMPLING, **parse_sampling(os.environ.get('LOG_SAMPLE')))
+
+    shutdown()
+    if not _atexit_registered:
+        atexit.register(shutdown)
+        _atexit_registered = True
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+    _handler = NonBlockingQueueHandler(max_queue)
+    _handler.addFilter(SamplingFilter(sampling))
+    _handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    # 輸出中不使用進程資訊，建立記錄時略過 (logging 文檔的「Optimization」建議)
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown():
+    """移除隊列 handler 並停止輸出線程 (會先輸出隊列中剩餘的記錄)，可重複調用"""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    if _listener is not None:
+        _listener.stop()
+    _listener = None
+
+
+def dropped_records():
+    """隊列已滿而丟棄的記錄數 (最近一次 setup_logging 之後)"""
+    return _handler.dropped if _handler is not None else 0
@@ -0,0 +1,82 @@
+"""
+監控股票的獲取失敗追蹤
+- 每隻股票連續失敗後按指數退避延後下一次請求 (60秒、120秒 ... 最多 1 小時)
+- 只有代碼本身的失敗 (404、200 但沒有數據) 計入暫停，持續出現的股票標記為應暫停，
+  由監控暫停相關警報並通知用戶；超時、連接錯誤、429 和 5xx 是上游的問題，只影響退避，
+  Yahoo 故障或限流期間不會暫停所有監控
+"""
+
+import threading
+import time
+
+# 失敗類型
+FAILURE_NOT_FOUND = 'not_found'  # 404 / 代碼已確認不存在
+FAILURE_NO_DATA = 'no_data'      # 200 但結果為空
+FAILURE_TRANSIENT = 'transient'  # 超時、連接錯誤、429、5xx 等
+
+
+class SymbolHealth:
+    def __init__(self, base_delay=60, max_delay=3600, suspend_after=8, suspend_not_found=3):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.suspend_after = suspend_after          # 連續多少次代碼失敗 (不存在或沒有數據) 後暫停
+        self.suspend_not_found = suspend_not_found  # 連續多少次代碼不存在後暫停
+        self._lock = threading.Lock()
+        # symbol -> [連續失敗次數, 其中代碼失敗次數, 其中代碼不存在次數, 下次請求時間]
+        self._failures = {}
+        self.skipped = 0     # 因退避而略過的請求次數
+
+    def should_fetch(self, symbol, now=None):
+        """是否已過退避時間，可以再次請求"""
+        with self._lock:
+            state = self._failures.get(symbol)
+            if state is None:
+                return True
+            if (time.monotonic() if now is None else now) >= state[3]:
+                return True
+            self.skipped += 1
+            return False
+
+    def due(self, symbols, now=None):
+        """過濾出本輪應請求的股票"""
+        now = time.monotonic() if now is None else now
+        return [symbol for symbol in symbols if self.should_fetch(symbol, now)]
+
+    def record_success(self, symbol):
+        with self._lock:
+            self._failures.pop(symbol, None)
+
+    def record_failure(self, symbol, kind=FAILURE_TRANSIENT, now=None):
+        """
+        記錄一次失敗，返回退避秒數
+        所有失敗都延長退避；暫時性失敗不說明代碼是否有效，代碼失敗的連續計數保持不變
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            state = self._failures.setdefault(symbol, [0, 0, 0, now])
+            state[0] += 1
+            if kind == FAILURE_NOT_FOUND:
+                state[1] += 1
+                state[2] += 1
+            elif kind == FAILURE_NO_DATA:
+                state[1] += 1
+                state[2] = 0
+            delay = min(self.base_delay * 2 ** (state[0] - 1), self.max_delay)
+            state[3] = now + delay
+            return delay
+
+    def failures(self, symbol):
+        with self._lock:
+            state = self._failures.get(symbol)
+            return state[0] if state else 0
+
+    def should_suspend(self, symbol):
+        with self._lock:
+            state = self._failures.get(symbol)
+            if state is None:
+                return False
+            return state[1] >= self.suspend_after or state[2] >= self.suspend_not_found
+
+    def reset(self, symbol):
+        """恢復監控時清除失敗記錄"""
+        self.record_success(symbol)
@@ -0,0 +1,182 @@
+"""
+股票代碼解析
+- normalize_symbol: 統一代碼格式 (5 / 5.HK / 0005.hk -> 0005.HK)
+- SymbolResolver: 別名、本地交易所代碼表，以及有效性緩存 (包括不存在代碼的負緩存)
+
+代碼表為 CSV (symbol,name)，載入後表內交易所的代碼只接受表中存在的，
+其他代碼在請求 Yahoo 之前就會被拒絕
+"""
+
+import csv
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Yahoo 代碼格式: AAPL、0005.HK、BRK-B、^HSI、EURUSD=X
+SYMBOL_PATTERN = re.compile(r'\^?[A-Z0-9][A-Z0-9.\-=]{0,19}')
+
+# 常用中文名稱 -> 代碼
+DEFAULT_ALIASES = {
+    '匯豐': '0005.HK',
+    '匯豐控股': '0005.HK',
+    '騰訊': '0700.HK',
+    '騰訊控股': '0700.HK',
+    '阿里巴巴': '9988.HK',
+    '美團': '3690.HK',
+    '小米': '1810.HK',
+    '港交所': '0388.HK',
+    '恆指': '^HSI',
+    '恒指': '^HSI',
+}
+
+
+class SymbolError(ValueError):
+    """股票代碼無效"""
+
+
+def normalize_symbol(symbol):
+    """處理香港股票代碼格式 (5 / 5.HK -> 0005.HK)"""
+    symbol = symbol.strip().upper()
+    if symbol.endswith('.HK'):
+        base_symbol = symbol[:-3]
+        if base_symbol.isdigit():
+            symbol = f"{base_symbol.lstrip('0').zfill(4)}.HK"
+    elif symbol.isdigit() and len(symbol) <= 5:
+        symbol = f"{symbol.lstrip('0').zfill(4)}.HK"
+    return symbol
+
+
+def exchange_of(symbol):
+    """代碼所屬交易所後綴 (0005.HK -> HK，AAPL -> US)，指數和外匯返回 None"""
+    if symbol.startswith('^') or '=' in symbol:
+        return None
+    if '.' in symbol:
+        return symbol.rsplit('.', 1)[1]
+    return 'US'
+
+
+class SymbolResolver:
+    def __init__(self, aliases=None, ttl=86400, negative_ttl=3600, max_entries=10000):
+        self.aliases = dict(DEFAULT_ALIASES if aliases is None else aliases)
+        self.ttl = ttl                    # 已確認有效的代碼緩存秒數
+        self.negative_ttl = negative_ttl  # 不存在的代碼緩存秒數
+        self.max_entries = max_entries
+        self._names = {}                  # 代碼表: symbol -> 名稱
+        self._exchanges = frozenset()     # 代碼表覆蓋的交易所
+        self._validity = OrderedDict()    # symbol -> (過期時間, 是否有效)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def load_table(self, path):
+        """載入交易所代碼表 (CSV: symbol,name)，返回載入數量"""
+        names = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if not row or not row[0].strip() or row[0].strip().startswith('#'):
+                    continue
+                if row[0].strip().lower() == 'symbol':
+                    continue
+                symbol = normalize_symbol(row[0])
+                name = row[1].strip() if len(row) > 1 else ''
+                names[symbol] = name
+                if name:
+                    self.aliases.setdefault(name, symbol)
+        self._names = names
+        self._exchanges = frozenset(filter(None, map(exchange_of, names)))
+        return len(names)
+
+    def name(self, symbol):
+        """代碼表中的名稱，未載入或不在表中時返回 None"""
+        return self._names.get(symbol) or None
+
+    def resolve(self, text):
+        """把用戶輸入解析為標準代碼，無效時拋出 SymbolError"""
+        text = ' '.join(text.split())
+        alias = self.aliases.get(text) or self.aliases.get(text.upper())
+        symbol = alias or normalize_symbol(text)
+
+        if not SYMBOL_PATTERN.fullmatch(symbol):
+            self.rejected += 1
+            raise SymbolError(f"無效的股票代碼: {text}")
+        if self._names and exchange_of(symbol) in self._exchanges and symbol not in self._names:
+            self.rejected += 1
+            raise SymbolError(f"找不到股票代碼: {symbol}")
+        if self.is_valid(symbol) is False:
+            self.rejected += 1
+            raise SymbolError(f"找不到股票代碼: {symbol}")
+        return symbol
+
+    def resolve_many(self, texts):
+        """解析多個代碼並去重，返回 (symbols, errors)"""
+        symbols = []
+        errors = []
+        for text in texts:
+            try:
+                symbol = self.resolve(text)
+            except SymbolError as e:
+                errors.append(str(e))
+                continue
+            if symbol not in symbols:
+                symbols.append(symbol)
+        return symbols, errors
+
+    def is_valid(self, symbol):
+        """緩存中的有效性: True / False，未知時返回 None"""
+        if symbol in self._names:
+            return True
+        with self._lock:
+            cached = self._validity.get(symbol)
+            if cached is None:
+                return None
+            expires_at, valid = cached
+            if time.monotonic() >= expires_at:
+                del self._validity[symbol]
+                return None
+            return valid
+
+    def record(self, symbol, valid):
+        """記錄上游確認的結果"""
+        ttl = self.ttl if valid else self.negative_ttl
+        with self._lock:
+            self._validity[symbol] = (time.monotonic() + ttl, valid)
+            self._validity.move_to_end(symbol)
+            while len(self._validity) > self.max_entries:
+                self._validity.popitem(last=False)
+
+    def items(self, now=None):
+        """返回未過期的 [(symbol, 記錄時間 (time.time), 是否有效), ...] (供快照使用)"""
+        now = time.time() if now is None else now
+        remaining = {}
+        with self._lock:
+            monotonic = time.monotonic()
+            for symbol, (expires_at, valid) in self._validity.items():
+                if expires_at > monotonic:
+                    remaining[symbol] = (expires_at - monotonic, valid)
+        return [(symbol, now - ((self.ttl if valid else self.negative_ttl) - left), valid)
+                for symbol, (left, valid) in remaining.items()]
+
+    def restore(self, symbol, stored_at, valid, now=None):
+        """載入快照中的有效性，按原記錄時間計算剩餘緩存時間；已過期時忽略"""
+        now = time.time() if now is None else now
+        left = (self.ttl if valid else self.negative_ttl) - (now - stored_at)
+        if left <= 0:
+            return False
+        with self._lock:
+            if symbol not in self._validity:
+                self._validity[symbol] = (time.monotonic() + left, valid)
+                while len(self._validity) > self.max_entries:
+                    self._validity.popitem(last=False)
+        return True
+
+    def forget(self, symbol):
+        """清除緩存的有效性，下次使用時重新確認"""
+        with self._lock:
+            self._validity.pop(symbol, None)
+
+    def record_response(self, symbol, status_code, has_data=True):
+        """按 Yahoo 回應記錄: 200 且有數據為有效，404 為不存在，其他錯誤不記錄"""
+        if status_code == 200 and has_data:
+            self.record(symbol, True)
+        elif status_code == 404:
+            self.record(symbol, False)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+警報事件日誌測試腳本
+測試 alert_events 事件記錄和預先計算的警報計數
+"""
+
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from monitor_fixtures import legacy_database, temp_monitor
+from stock_monitor_db import StockMonitorDB
+
+
+def test_events_and_counters():
+    """測試每次警報寫入事件並遞增各項計數"""
+    with temp_monitor('alert_events.db', price=150.0) as monitor:
+        monitor.alert_cooldown = monitor.alert_cooldown * 0  # 不設冷卻，每輪都觸發
+        monitor.add_watch(1, 10, 'AAPL', 100.0)
+        monitor.add_watch(1, 10, 'MSFT', 100.0)
+        monitor.add_watch(2, 20, 'AAPL', 120.0)
+        monitor.add_watch(2, 20, 'AAPL', 200.0)  # 不觸發
+
+        monitor.check_alerts()
+        monitor.check_alerts()
+        assert len(monitor._bot.sent) == 6
+
+        assert monitor.get_alert_count() == 6
+        assert monitor.get_alert_count(symbol='AAPL') == 4
+        assert monitor.get_alert_count(user_id=2) == 2
+        assert monitor.get_alert_count(day=datetime.now().date()) == 6
+        stats = monitor.get_statistics()
+        assert stats['today_alerts'] == 6 and stats['total_alerts'] == 6
+
+        events = monitor.get_alert_events(user_id=1, symbol='MSFT')
+        assert len(events) == 2 and events[0][0] > events[1][0]
+        assert events[0][2:6] == ('MSFT', 'above', 100.0, 150.0)
+        assert len(monitor.get_alert_events(limit=3)) == 3
+
+
+def test_counters_seeded_on_upgrade():
+    """測試從舊結構升級時以 alert_count 作為計數起點"""
+    with legacy_database() as db_path:
+        monitor = StockMonitorDB(db_path)
+        assert monitor.get_alert_count() == 6
+        assert monitor.get_alert_count(symbol='AAPL') == 6
+        assert monitor.get_alert_count(user_id=2) == 4
+        assert monitor.get_alert_count(symbol='MSFT') == 0
+        assert monitor.get_statistics()['today_alerts'] == 0
+
+
+def test_cooldown_across_timezones():
+    """測試冷卻期以 UTC 比較: 主機時區在 UTC 之前或之後都按實際經過的時間計算"""
+    original = os.environ.get('TZ')
+    try:
+        for zone, minutes_ago, expected in [('Asia/Hong_Kong', 0, 0), ('America/New_York', 0, 0),
+                                            ('Asia/Hong_Kong', 120, 1), ('America/New_York', 120, 1)]:
+            os.environ['TZ'] = zone
+            time.tzset()
+            with temp_monitor('alert_events.db', price=150.0) as monitor:
+                monitor.add_watch(1, 10, 'AAPL', 100.0)
+                conn = sqlite3.connect(monitor.db_path)
+                conn.execute("UPDATE stock_watches SET last_alert = DATETIME('now', ?)", (f'-{minutes_ago} minutes',))
+                conn.commit()
+                conn.close()
+                monitor.check_alerts()
+                assert len(monitor._bot.sent) == expected, (zone, minutes_ago)
+    finally:
+        if original is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = original
+        time.tzset()
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始警報事件日誌測試\n")
+
+    tests = [
+        ("事件與計數", test_events_and_counters),
+        ("升級計數起點", test_counters_seeded_on_upgrade),
+        ("跨時區冷卻期", test_cooldown_across_timezones),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+股票警報規則測試腳本
+測試 alert_rules.py 的列式評估
+"""
+
+
+import alert_rules
+from alert_rules import WatchColumns, evaluate_alerts, threshold_error
+from monitor_fixtures import temp_monitor
+from quote_cache import Quote
+
+QUOTES = {
+    '0700.HK': {'price': 315.0, 'previousClose': 300.0, 'open': 309.0,
+                'volume': 90_000_000, 'averageVolume': 20_000_000},
+    '0005.HK': {'price': 48.0, 'previousClose': 50.0, 'open': 49.9, 'volume': 1_000},
+}
+
+ROWS = [
+    (1, 1, 1, '0700.HK', 300.0, 'above', None, 0),         # 觸發
+    (2, 1, 1, '0700.HK', 310.0, 'below', None, 0),         # 不觸發
+    (3, 1, 1, '0700.HK', 5.0, 'pct_up', None, 0),          # +5% 觸發
+    (4, 1, 1, '0700.HK', 4.0, 'volume_spike', None, 0),    # 4.5 倍觸發
+    (5, 1, 1, '0700.HK', 2.0, 'gap_up', None, 0),          # +3% 觸發
+    (6, 1, 1, '0005.HK', 3.0, 'pct_down', None, 0),        # -4% 觸發
+    (7, 1, 1, '0005.HK', 5.0, 'pct_down', None, 0),        # 不觸發
+    (8, 1, 1, '0005.HK', 1.0, 'volume_spike', None, 0),    # 沒有平均成交量
+    (9, 1, 1, '0005.HK', 1.0, 'gap_down', None, 0),        # -0.2% 不觸發
+    (10, 1, 1, 'AAPL', 1.0, 'above', None, 0),             # 沒有報價
+    (11, 1, 1, '0005.HK', 1.0, 'unknown', None, 0),        # 不支援
+]
+
+EXPECTED_IDS = [1, 3, 4, 5, 6]
+
+
+def fired_ids(rows):
+    watches = WatchColumns(rows)
+    return [watches.rows[i][0] for i in evaluate_alerts(watches, QUOTES)]
+
+
+def test_python_evaluation():
+    """測試純 Python 評估"""
+    assert fired_ids(ROWS) == EXPECTED_IDS
+
+
+def test_numpy_evaluation():
+    """測試向量化評估與純 Python 結果一致"""
+    if alert_rules.load_numpy() is None:
+        return
+    rows = ROWS * 10
+    original = alert_rules.NUMPY_MIN_ROWS
+    alert_rules.NUMPY_MIN_ROWS = 1
+    try:
+        assert fired_ids(rows) == EXPECTED_IDS * 10
+    finally:
+        alert_rules.NUMPY_MIN_ROWS = original
+
+
+def test_skipped_rows():
+    """測試不支援的類型會被略過"""
+    watches = WatchColumns(ROWS)
+    assert [row[0] for row in watches.skipped] == [11]
+    assert watches.symbols == ['0700.HK', '0005.HK', 'AAPL']
+
+
+def test_chart_quote():
+    """測試從完整的 chart 結果建立報價 (開盤價來自 indicators，meta 中沒有)"""
+    result = {
+        'meta': {'symbol': '0700.HK', 'regularMarketPrice': 315.0, 'regularMarketVolume': 90_000_000,
+                 'chartPreviousClose': 300.0, 'previousClose': 300.0},
+        'timestamp': [1718067600],
+        'indicators': {'quote': [{'open': [309.0], 'close': [315.0], 'volume': [90_000_000]}]},
+    }
+    quote = Quote.from_chart(result)
+    assert quote['open'] == 309.0
+    rows = [(1, 1, 1, '0700.HK', 2.0, 'gap_up', None, 0), (2, 1, 1, '0700.HK', 1.0, 'gap_down', None, 0)]
+    watches = WatchColumns(rows)
+    assert evaluate_alerts(watches, {'0700.HK': quote}) == [0]
+    assert Quote.from_chart({'meta': {'regularMarketPrice': 1.0}})['open'] is None
+    assert Quote.from_chart(None) is None
+
+
+def test_threshold_validation():
+    """測試相對警報的門檻必須為正數"""
+    assert threshold_error('pct_down', 3.0) is None and threshold_error('above', 50) is None
+    for alert_type in ('pct_up', 'pct_down', 'gap_up', 'gap_down', 'volume_spike', 'below'):
+        assert threshold_error(alert_type, 0) and threshold_error(alert_type, -3.0)
+    assert threshold_error('pct_up', float('nan'))
+    assert threshold_error('above', float('inf')) and threshold_error('below', float('-inf'))
+
+    with temp_monitor('alert_rules.db') as monitor:
+        success, message = monitor.add_watch(1, 1, 'AAPL', -3.0, 'pct_down')
+        assert not success and "大於 0" in message
+        added, rejected = monitor.add_watches(1, 1, [('AAPL', '-3', 'pct_down'), ('AAPL', '3', 'pct_down')])
+        assert [row[1:] for row in added] == [('AAPL', 3.0, 'pct_down')] and len(rejected) == 1
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始股票警報規則測試\n")
+
+    tests = [
+        ("純 Python 評估", test_python_evaluation),
+        ("向量化評估", test_numpy_evaluation),
+        ("略過不支援類型", test_skipped_rows),
+        ("chart 報價", test_chart_quote),
+        ("門檻驗證", test_threshold_validation),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
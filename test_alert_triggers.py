@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享警報觸發器測試腳本
+測試相同條件的監控共用 alert_triggers，評估一次後分發給所有訂閱者
+"""
+
+import sqlite3
+
+from monitor_fixtures import legacy_database, temp_monitor
+from stock_monitor_db import StockMonitorDB
+
+
+def trigger_ids(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute('SELECT id, trigger_id FROM stock_watches').fetchall())
+    finally:
+        conn.close()
+
+
+def test_migration_links_existing_watches():
+    """測試升級時相同條件的現有監控關聯到同一觸發器"""
+    with legacy_database() as db_path:
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+            INSERT INTO stock_watches (user_id, chat_id, symbol, target_price, alert_type, is_active)
+            VALUES (3, 30, 'TSLA', 100.0, 'above', 0)
+        ''')
+        conn.commit()
+        conn.close()
+        StockMonitorDB(db_path)
+        links = trigger_ids(db_path)
+        assert links[1] == links[2] and links[3] != links[1]
+        assert links[4] is None  # 已移除的監控不建立觸發器
+        conn = sqlite3.connect(db_path)
+        assert conn.execute('SELECT COUNT(*) FROM alert_triggers').fetchone()[0] == 2
+        conn.close()
+
+
+def test_fan_out():
+    """測試每個觸發器評估一次並分發給所有訂閱者"""
+    with temp_monitor('alert_triggers.db', price=350.0) as monitor:
+        for user_id in (1, 2, 3):
+            assert monitor.add_watch(user_id, user_id * 10, '0700.HK', 300.0)[0]
+        monitor.add_watch(1, 10, '0700.HK', 400.0)
+        links = trigger_ids(monitor.db_path)
+        assert len(set(links.values())) == 2
+
+        watches = monitor.load_watch_columns()
+        assert len(watches) == 2
+        monitor.check_alerts()
+        assert sorted(chat_id for chat_id, _ in monitor._bot.sent) == [10, 20, 30]
+
+        # 冷卻期按監控計算: 新訂閱者仍會收到警報
+        monitor.add_watch(4, 40, '0700.HK', 300.0)
+        monitor.check_alerts()
+        assert [chat_id for chat_id, _ in monitor._bot.sent[3:]] == [40]
+        assert monitor.get_alert_count(symbol='0700.HK') == 4
+
+        conn = sqlite3.connect(monitor.db_path)
+        assert conn.execute('SELECT COUNT(*) FROM alert_triggers WHERE last_checked IS NOT NULL').fetchone()[0] == 2
+        conn.close()
+        assert "最後檢查" in monitor.list_watches(1)
+
+        # 移除監控只影響該訂閱者
+        assert monitor.remove_watch(2, 2)[0]
+        assert len(monitor.load_watch_columns()) == 2
+        assert len(monitor._subscribers[links[1]]) == 3
+
+
+def trigger_count(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM alert_triggers').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_orphaned_triggers_removed():
+    """測試最後一個活躍訂閱者被移除、暫停、刪除或改變條件後刪除觸發器"""
+    with temp_monitor('alert_triggers.db', price=350.0) as monitor:
+        monitor.add_watch(1, 10, '0700.HK', 300.0)
+        monitor.add_watch(2, 20, '0700.HK', 300.0)
+        monitor.add_watch(1, 10, 'AAPL', 200.0)
+        monitor.add_watch(3, 30, 'MSFT', 100.0)
+        watch_ids = sorted(trigger_ids(monitor.db_path))
+        assert trigger_count(monitor.db_path) == 3
+
+        # 仍有其他訂閱者時保留
+        assert monitor.remove_watch(1, watch_ids[0])[0]
+        assert trigger_count(monitor.db_path) == 3
+        assert monitor.remove_watch(2, watch_ids[1])[0]
+        assert trigger_count(monitor.db_path) == 2
+
+        # 改變條件: 舊觸發器被刪除，新條件建立新觸發器；直接刪除監控同樣清理
+        conn = sqlite3.connect(monitor.db_path)
+        conn.execute('UPDATE stock_watches SET target_price = 210.0 WHERE id = ?', (watch_ids[2],))
+        conn.commit()
+        assert conn.execute("SELECT threshold FROM alert_triggers WHERE symbol = 'AAPL'").fetchall() == [(210.0,)]
+        conn.execute('DELETE FROM stock_watches WHERE id = ?', (watch_ids[2],))
+        conn.commit()
+        conn.close()
+        assert trigger_count(monitor.db_path) == 1
+
+        # 暫停 (不經 remove_watch) 後刪除，恢復時重新建立並關聯
+        assert [row[0] for row in monitor.suspend_symbols(['MSFT'])] == [watch_ids[3]]
+        assert trigger_count(monitor.db_path) == 0
+        assert monitor.resume_watch(3, watch_ids[3])[0]
+        links = trigger_ids(monitor.db_path)
+        assert trigger_count(monitor.db_path) == 1 and links[watch_ids[3]] is not None
+        assert len(monitor.load_watch_columns()) == 1
+
+        # 批量導入相同條件時重新建立
+        added, rejected = monitor.add_watches(1, 10, [('0700.HK', 300.0, 'above')])
+        assert len(added) == 1 and not rejected
+        assert trigger_count(monitor.db_path) == 2
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始共享警報觸發器測試\n")
+
+    tests = [
+        ("遷移現有監控", test_migration_links_existing_watches),
+        ("觸發分發", test_fan_out),
+        ("清理孤立觸發器", test_orphaned_triggers_removed),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
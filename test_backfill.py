@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+歷史數據回填測試腳本
+測試 backfill.py 的 chart 解析、批量寫入兩個歷史後端，以及第一次監控時加入回填隊列
+"""
+
+import shutil
+import tempfile
+
+from backfill import HistoryBackfill, chart_rows
+from monitor_fixtures import temp_monitor
+from tick_store import TickStore
+
+DAY = 1_700_006_400  # 2023-11-15 00:00 UTC
+
+
+def make_result(timestamps, closes, volumes):
+    return {'timestamp': timestamps, 'indicators': {'quote': [{'close': closes, 'volume': volumes}]}}
+
+
+class FakeClient:
+    def __init__(self, result, status_code=200):
+        self.result = result
+        self.status_code = status_code
+        self.calls = []
+
+    def fetch_history(self, symbol, range_, interval):
+        self.calls.append((symbol, range_, interval))
+        return self.status_code, self.result
+
+
+def test_chart_rows():
+    """測試略過沒有收市價的時段"""
+    result = make_result([DAY, DAY + 3600, DAY + 7200], [10.0, None, 11.5], [100, None, None])
+    assert chart_rows(result) == [(DAY, 10.0, 100), (DAY + 7200, 11.5, 0)]
+    assert chart_rows(None) == [] and chart_rows({}) == []
+
+
+def test_save_many():
+    """測試 SQLite 只寫入比現有記錄更早的數據，列式存儲略過已有數據的日期"""
+    with temp_monitor('backfill.db') as monitor:
+        monitor.history.save('AAPL', 200.0, 5, DAY + 86400)
+        rows = [(DAY + 3600 * i, 190.0 + i, 10 * i) for i in range(24)] + [(DAY + 86400 + 60, 1.0, 1)]
+        assert monitor.history.save_many('AAPL', rows) == 24
+        series = monitor.load_price_history('AAPL')
+        assert len(series.prices) == 25 and series.prices[0] == 190.0 and series.prices[-1] == 200.0
+
+        root = tempfile.mkdtemp()
+        try:
+            store = TickStore(root)
+            store.save('AAPL', 200.0, 5, DAY + 86400 + 30)
+            assert store.save_many('AAPL', list(reversed(rows))) == 24
+            series = store.load('AAPL')
+            assert list(series.timestamps) == [DAY + 3600 * i for i in range(24)] + [DAY + 86400 + 30]
+            del series
+            store.close()
+        finally:
+            shutil.rmtree(root)
+
+
+def test_first_watch_enqueues():
+    """測試只有第一次被監控的股票加入回填隊列，回填後寫入歷史"""
+    with temp_monitor('backfill.db') as monitor:
+        client = FakeClient(make_result([DAY, DAY + 60], [10.0, 10.5], [1, 2]))
+        monitor.backfill = HistoryBackfill(monitor.history, client, range_='1mo', interval='1m')
+
+        assert monitor.add_watch(1, 1, 'AAPL', 200.0)[0]
+        assert monitor.add_watch(2, 2, 'AAPL', 210.0)[0]  # 已有監控
+        added, _ = monitor.add_watches(3, 3, [('AAPL', 220.0, 'above'), ('MSFT', 400.0, 'above'),
+                                              ('0700.HK', 300.0, 'below')])
+        assert len(added) == 3
+        symbols = [monitor.backfill.queue.get_nowait() for _ in range(monitor.backfill.queue.qsize())]
+        assert symbols[0] == 'AAPL' and sorted(symbols[1:]) == ['0700.HK', 'MSFT']
+        assert not monitor.backfill.enqueue('MSFT')  # 仍在隊列中
+
+        assert monitor.backfill.backfill('MSFT') == 2 and monitor.backfill.rows == 2
+        assert client.calls == [('MSFT', '1mo', '1m')]
+        assert list(monitor.load_price_history('MSFT').prices) == [10.0, 10.5]
+        client.status_code = 404
+        assert monitor.backfill.backfill('NOPE') == 0
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始歷史數據回填測試\n")
+
+    tests = [
+        ("解析 chart", test_chart_rows),
+        ("批量寫入", test_save_many),
+        ("第一次監控", test_first_watch_enqueues),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
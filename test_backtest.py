@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+警報回測測試腳本
+測試 backtest.py 的冷卻規則、穿越次數、純 Python 版本和讀取價格歷史
+"""
+
+from datetime import datetime, timezone
+
+import alert_rules
+import stock_monitor_db
+from backtest import _backtest_python, backtest, format_backtest, run_backtest
+from monitor_fixtures import FakeBot, temp_monitor
+
+DAY = 1_700_006_400  # 2023-11-15 00:00 UTC
+
+
+def test_cooldown_and_crossings():
+    """測試持續符合條件時按冷卻時間觸發，並統計穿越次數"""
+    timestamps = [DAY + 600 * i for i in range(12)]
+    prices = [9, 11, 12, 11, 9, 11, 12, 13, 14, 8, 10, 12]
+    result = backtest(timestamps, prices, 10, 'above', cooldown=1800)
+    # 符合的樣本: 1,2,3,5,6,7,8,10,11；觸發於 1、5 (1 之後 3 個樣本內冷卻)、8、11
+    assert result.samples == 12 and result.matched == 9 and result.crossings == 3
+    assert result.fire_times == [timestamps[1], timestamps[5], timestamps[8], timestamps[11]]
+
+    below = backtest(timestamps, prices, 9, 'below', cooldown=0)
+    assert below.fire_times == [timestamps[0], timestamps[4], timestamps[9]] and below.crossings == 3
+    assert _backtest_python(timestamps, prices, 10, 'above', 1800) == result
+    assert backtest([], [], 10).samples == 0
+
+    for alert_type, threshold in [('pct_up', 5), ('above', 0), ('below', -1), ('above', float('nan')),
+                                  ('above', float('inf'))]:
+        try:
+            backtest(timestamps, prices, threshold, alert_type)
+            assert False, f"應拒絕 {alert_type} {threshold}"
+        except ValueError:
+            pass
+
+
+def test_run_backtest():
+    """測試讀取價格歷史並使用監控的冷卻時間"""
+    with temp_monitor('backtest.db') as monitor:
+        # 每 40 分鐘高於門檻一次，冷卻 1 小時內只觸發一次
+        monitor.history.save_many('AAPL', [(DAY + 60 * i, 100.0 + (i % 40 == 0), 1) for i in range(600)])
+        result = run_backtest(monitor, 'AAPL', 100.5, 'above', '1mo', now=DAY + 86400)
+        assert result.samples == 600 and result.matched == 15 and result.crossings == 15
+        assert result.fire_times == [DAY + 60 * i for i in range(0, 600, 80)]
+        text = format_backtest('AAPL', 100.5, 'above', '1mo', result)
+        assert "觸發: 8 次" in text and "穿越次數: 15 次" in text
+        empty = run_backtest(monitor, 'AAPL', 1, now=DAY - 1)
+        assert "沒有價格歷史" in format_backtest('AAPL', 1, 'above', '1mo', empty)
+
+
+def test_matches_live_monitor():
+    """測試回測的觸發次數與監控線程逐輪檢查同一價格序列的警報次數一致 (包括冷卻期)"""
+    timestamps = [DAY + 900 * i for i in range(40)]
+    prices = [99, 101, 102, 101, 99, 98, 101, 103, 104, 102, 101, 100, 99, 101, 102, 103, 97, 98, 101, 105] * 2
+    expected = backtest(timestamps, prices, 100.5, 'above', 3600).fire_times
+
+    class Clock(datetime):
+        current = None
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.current.astimezone(tz) if tz else cls.current.replace(tzinfo=None)
+
+    with temp_monitor('backtest_live.db') as monitor:
+        monitor._bot = FakeBot()
+        monitor.add_watch(1, 10, 'AAPL', 100.5)
+        fired = []
+        original = stock_monitor_db.datetime
+        stock_monitor_db.datetime = Clock
+        try:
+            for timestamp, price in zip(timestamps, prices):
+                Clock.current = datetime.fromtimestamp(timestamp, timezone.utc)
+                monitor.get_stock_quotes = lambda symbols, price=price: {symbol: {'price': price} for symbol in symbols}
+                sent = len(monitor._bot.sent)
+                monitor.check_alerts()
+                if len(monitor._bot.sent) > sent:
+                    fired.append(timestamp)
+        finally:
+            stock_monitor_db.datetime = original
+        assert fired == expected and len(fired) > 2
+
+
+def test_numpy_matches_python():
+    """測試 numpy 版本與純 Python 版本結果一致"""
+    if alert_rules.load_numpy() is None:
+        return
+    import random
+    rng = random.Random(7)
+    timestamps = [DAY + 60 * i for i in range(5000)]
+    prices = [100 + rng.uniform(-5, 5) for _ in timestamps]
+    assert backtest(timestamps, prices, 103, 'above', 900) == _backtest_python(timestamps, prices, 103, 'above', 900)
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始警報回測測試\n")
+
+    tests = [
+        ("冷卻與穿越", test_cooldown_and_crossings),
+        ("讀取歷史", test_run_backtest),
+        ("與監控一致", test_matches_live_monitor),
+        ("numpy 一致", test_numpy_matches_python),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+緩存快照測試腳本
+測試 cache_snapshot.py 的寫入、按 TTL 載入，以及重啟後按快照報價時間接續調度
+"""
+
+import os
+import tempfile
+import time
+
+from cache_snapshot import CacheSnapshot
+from cache_warmer import FundamentalsCache
+from monitor_fixtures import temp_monitor
+from quote_cache import Quote, QuoteCache
+from symbols import SymbolResolver
+from timer_wheel import TimerWheel
+
+
+def test_round_trip():
+    """測試快照寫入後載入到新的緩存，保留存入時間並略過已過期的記錄"""
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'cache_snapshot.db')
+        now = time.time()
+        quotes, fundamentals, resolver = QuoteCache(ttl=60), FundamentalsCache(ttl=3600), SymbolResolver()
+        quotes.set('AAPL', Quote(200.5, 1000, 198.0, 199.0, high=201.0, low=197.5))
+        quotes.restore('MSFT', now - 600, Quote(400.0))           # 已過 TTL，但仍作為最近價格保留
+        quotes.restore('OLD', now - 2 * 86400, Quote(1.0))        # 超過保留時間
+        fundamentals.set('AAPL', {'summaryDetail': {'marketCap': {'raw': 3}}})
+        fundamentals.restore('MSFT', now - 7200, {})              # 已過期
+        resolver.record('AAPL', True)
+        resolver.record('NOPE', False)
+        assert CacheSnapshot(path, quotes, fundamentals, resolver).save(now) == 5
+
+        quotes2, fundamentals2, resolver2 = QuoteCache(ttl=60), FundamentalsCache(ttl=3600), SymbolResolver()
+        snapshot = CacheSnapshot(path, quotes2, fundamentals2, resolver2)
+        assert snapshot.load(now + 10) == 5 and snapshot.loaded == 5
+        assert quotes2.get('AAPL').high == 201.0 and quotes2.get('MSFT') is None
+        age, quote = quotes2.peek('MSFT')
+        assert quote.price == 400.0 and age >= 600 and quotes2.peek('OLD') is None
+        assert fundamentals2.get('AAPL') == {'summaryDetail': {'marketCap': {'raw': 3}}}
+        assert fundamentals2.get('MSFT') is None
+        assert resolver2.is_valid('AAPL') is True and resolver2.is_valid('NOPE') is False
+
+        # 否定結果只緩存 negative_ttl，一小時後載入時已過期
+        resolver3 = SymbolResolver()
+        assert CacheSnapshot(path, symbol_resolver=resolver3).load(now + 3700) == 1
+        assert resolver3.is_valid('NOPE') is None and resolver3.is_valid('AAPL') is True
+
+        # 快照文件損壞時不影響啟動
+        with open(path, 'wb') as f:
+            f.write(b'not a database')
+        assert CacheSnapshot(path, QuoteCache()).load() == 0
+
+
+def test_warm_restart_schedule():
+    """測試重啟後首次調度按快照報價時間接續，沒有報價的股票立即檢查"""
+    with temp_monitor('cache_snapshot.db') as monitor:
+        monitor.scheduler = TimerWheel(tick=1, slots=64, now=0)
+        monitor.check_interval = 60
+        requested = []
+        monitor.get_stock_quotes = lambda symbols, max_workers=8: requested.append(sorted(symbols)) or {}
+        monitor.add_watch(1, 1, 'AAPL', 1000.0)
+        monitor.add_watch(1, 1, 'MSFT', 1000.0)
+        monitor.quote_cache.restore('AAPL', time.time() - 20, Quote(100.0))
+
+        assert monitor.run_scheduled(0) == []
+        assert monitor.run_scheduled(1) == ['MSFT']
+        for second in range(2, 45):
+            monitor.run_scheduled(second)
+        assert requested == [['MSFT'], ['AAPL']]
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始緩存快照測試\n")
+
+    tests = [
+        ("寫入與載入", test_round_trip),
+        ("重啟後調度", test_warm_restart_schedule),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+開市前緩存預熱測試腳本
+測試 cache_warmer.py 的開市時間、熱門股票選擇和分散預取
+"""
+
+from datetime import datetime, timezone
+
+from cache_warmer import CacheWarmer, FundamentalsCache, SymbolPopularity, next_openings
+from monitor_fixtures import temp_monitor
+
+
+def test_next_openings():
+    """測試下一次開市時間 (UTC)，週末順延到週一"""
+    # 2026-10-16 是星期五，香港 09:30 = 01:30 UTC，紐約 (夏令時間) 09:30 = 13:30 UTC
+    friday = datetime(2026, 10, 16, 0, 0, tzinfo=timezone.utc)
+    openings = next_openings(friday)
+    assert [name for _, name, _ in openings] == ['HKEX', 'US']
+    assert openings[0][0] == datetime(2026, 10, 16, 1, 30, tzinfo=timezone.utc)
+    assert openings[1][0] == datetime(2026, 10, 16, 13, 30, tzinfo=timezone.utc)
+
+    after_close = datetime(2026, 10, 16, 21, 0, tzinfo=timezone.utc)
+    hkex = next_openings(after_close)[0]
+    assert hkex[1] == 'HKEX' and hkex[0] == datetime(2026, 10, 19, 1, 30, tzinfo=timezone.utc)
+
+
+def test_popularity():
+    """測試查詢次數按半衰期衰減"""
+    popularity = SymbolPopularity(half_life=100)
+    for _ in range(4):
+        popularity.record('AAPL', now=0)
+    popularity.record('MSFT', now=0)
+    assert [symbol for symbol, _ in popularity.top(now=0)] == ['AAPL', 'MSFT']
+
+    popularity.record('MSFT', now=100)
+    popularity.record('MSFT', now=100)
+    top = popularity.top(now=100)
+    assert top[0][0] == 'MSFT' and abs(top[0][1] - 2.5) < 1e-9 and abs(top[1][1] - 2.0) < 1e-9
+    assert [symbol for symbol, _ in popularity.top(1, now=300)] == ['MSFT']
+
+
+def test_candidates_and_warm():
+    """測試按監控數量和查詢次數選出該交易所的熱門股票並預取"""
+    with temp_monitor('cache_warmer.db') as monitor:
+        for user_id in range(3):
+            monitor.add_watch(user_id, user_id, '0700.HK', 300.0 + user_id)
+        monitor.add_watch(1, 1, '0005.HK', 50.0)
+        monitor.add_watch(1, 1, 'AAPL', 200.0)
+
+        popularity = SymbolPopularity()
+        for _ in range(5):
+            popularity.record('0388.HK')
+
+        fetched = []
+        fundamentals = FundamentalsCache()
+        fundamentals.fetch = lambda symbol: fetched.append(('summary', symbol)) or fundamentals.set(symbol, {})
+        monitor.get_stock_quote = lambda symbol: fetched.append(('quote', symbol))
+
+        warmer = CacheWarmer(monitor, fundamentals, popularity, top_n=2)
+        assert warmer.candidates('HK') == ['0388.HK', '0700.HK']
+        assert warmer.candidates('US') == ['AAPL']
+
+        # 開市前只預取基本面，不預取報價；已確認無效的代碼略過
+        monitor.symbols.record('DEAD.HK', False)
+        warmer.warm(['0700.HK', 'AAPL', 'DEAD.HK'])
+        warmer.warm(['0700.HK'])  # 基本面已在緩存中
+        assert fetched == [('summary', '0700.HK'), ('summary', 'AAPL')]
+        assert warmer.warmed == 3 and fundamentals.get('AAPL') == {}
+        assert not hasattr(warmer, 'warm_quotes')  # 報價交給監控調度器，不在開市時集中預取
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始開市前緩存預熱測試\n")
+
+    tests = [
+        ("開市時間", test_next_openings),
+        ("查詢熱度", test_popularity),
+        ("選股與預取", test_candidates_and_warm),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+算式計算引擎測試腳本
+測試 calc_engine.py 的計算結果和各項限制
+"""
+
+import time
+
+from calc_engine import CalcError, UnsafeExpressionError, evaluate
+
+
+def test_arithmetic():
+    """測試基本運算"""
+    assert evaluate("2+3*4") == 14
+    assert evaluate("(1+2)*3") == 9
+    assert evaluate("7//2") == 3
+    assert evaluate("-2**2") == -4
+    assert evaluate(" 10 / 4 ") == 2.5
+
+
+def test_rejected_inputs():
+    """測試危險或無效的算式會被拒絕"""
+    for expression in ["9**9**9", "10**100*10", "10/0", "(-8)**0.5", "1+" * 100 + "1", "3 -", ""]:
+        try:
+            evaluate(expression)
+        except CalcError:
+            continue
+        raise AssertionError(f"應拒絕: {expression[:20]}")
+
+    try:
+        evaluate("__import__('os')")
+        raise AssertionError("應拒絕不安全字符")
+    except UnsafeExpressionError:
+        pass
+
+
+def test_bounded_time():
+    """測試最壞情況的算式也能快速完成"""
+    start = time.perf_counter()
+    for expression in ["9**9**9**9", "2**332**2", "(" * 90 + "1" + ")" * 90]:
+        try:
+            evaluate(expression)
+        except CalcError:
+            pass
+    assert time.perf_counter() - start < 0.1
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始算式計算引擎測試\n")
+
+    tests = [
+        ("基本運算", test_arithmetic),
+        ("拒絕危險算式", test_rejected_inputs),
+        ("有限時間計算", test_bounded_time),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
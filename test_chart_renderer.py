@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+圖表服務測試腳本
+測試 chart_renderer.py 的價格序列緩存、圖片緩存命中和同一圖表的並發渲染合併
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chart_renderer import ChartService
+
+
+class CountingRenderer:
+    """計算調用次數的假渲染器 (代替 matplotlib)"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol, range_name, timestamps, closes, volumes):
+        with self._lock:
+            self.calls.append((symbol, range_name, timestamps[-1]))
+        time.sleep(self.delay)
+        return f"{symbol}:{range_name}:{timestamps[-1]}".encode()
+
+
+def make_service(renderer, series, series_ttl=0, loads=None):
+    """series: {(symbol, range): (timestamps, closes, volumes)}，以線程池代替進程池，loads 記錄每次獲取"""
+    service = ChartService(renderer=renderer, series_ttl=series_ttl)
+    service._pool = ThreadPoolExecutor(max_workers=4)
+
+    def load(symbol, range_name):
+        if loads is not None:
+            loads.append((symbol, range_name))
+        return series.get((symbol, range_name))
+    service._load_series = load
+    return service
+
+
+def test_cache_hit():
+    """測試同一股票、範圍和最後一根K線只渲染一次，新K線使緩存失效"""
+    renderer = CountingRenderer()
+    series = {('AAPL', '1mo'): ([1, 2, 3], [10.0, 11.0, 12.0], [100, 200, 300])}
+    service = make_service(renderer, series)
+
+    async def scenario():
+        first = await service.get_chart('AAPL', '1mo')
+        second = await service.get_chart('AAPL', '1mo')
+        assert first == second == b"AAPL:1mo:3"
+        assert len(renderer.calls) == 1 and service.hits == 1 and service.renders == 1
+
+        series[('AAPL', '1mo')] = ([1, 2, 3, 4], [10.0, 11.0, 12.0, 13.0], [100, 200, 300, 400])
+        assert await service.get_chart('AAPL', '1mo') == b"AAPL:1mo:4"
+        assert len(renderer.calls) == 2
+
+        assert await service.get_chart('MSFT', '1mo') is None  # 無數據時不渲染
+        assert len(renderer.calls) == 2
+    try:
+        asyncio.run(scenario())
+    finally:
+        service.shutdown()
+
+
+def test_series_ttl():
+    """測試有效期內重複的圖表請求不再獲取價格序列，過期後重新獲取"""
+    renderer = CountingRenderer()
+    series = {('AAPL', '1mo'): ([1, 2, 3], [10.0, 11.0, 12.0], [100, 200, 300])}
+    loads = []
+    service = make_service(renderer, series, series_ttl=60, loads=loads)
+
+    async def scenario():
+        for _ in range(3):
+            assert await service.get_chart('AAPL', '1mo') == b"AAPL:1mo:3"
+        assert loads == [('AAPL', '1mo')] and service.series_hits == 2 and len(renderer.calls) == 1
+
+        await service.get_chart('AAPL', '5d')  # 不同範圍分開緩存
+        assert loads == [('AAPL', '1mo'), ('AAPL', '5d')]
+
+        service.series_ttl = 0
+        series[('AAPL', '1mo')] = ([1, 2, 3, 4], [10.0, 11.0, 12.0, 13.0], [100, 200, 300, 400])
+        assert await service.get_chart('AAPL', '1mo') == b"AAPL:1mo:4"
+        assert loads[-1] == ('AAPL', '1mo')
+    try:
+        asyncio.run(scenario())
+    finally:
+        service.shutdown()
+
+
+def test_single_flight():
+    """測試同一圖表的並發請求共用一次渲染，不同範圍各自渲染"""
+    renderer = CountingRenderer(delay=0.1)
+    series = {
+        ('AAPL', '1mo'): ([1, 2, 3], [10.0, 11.0, 12.0], [100, 200, 300]),
+        ('AAPL', '5d'): ([1, 2], [10.0, 11.0], [100, 200]),
+    }
+    service = make_service(renderer, series)
+
+    async def scenario():
+        images = await asyncio.gather(*(service.get_chart('AAPL', '1mo') for _ in range(10)),
+                                      service.get_chart('AAPL', '5d'))
+        assert set(images[:10]) == {b"AAPL:1mo:3"} and images[10] == b"AAPL:5d:2"
+        assert sorted(renderer.calls) == [('AAPL', '1mo', 3), ('AAPL', '5d', 2)]
+        assert service.renders == 2 and not service._rendering
+    try:
+        asyncio.run(scenario())
+    finally:
+        service.shutdown()
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始圖表服務測試\n")
+
+    tests = [
+        ("序列緩存", test_series_ttl),
+        ("圖片緩存命中", test_cache_hit),
+        ("並發渲染合併", test_single_flight),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -133,6 +133,98 @@ def test_remove_watch(monitor_db):
         print(f"❌ 移除監控測試失敗：{e}")
         return False
 
+def test_add_watches(monitor_db):
+    """測試批量添加監控"""
+    print("\n🔍 測試批量添加股票監控...")
+    
+    try:
+        test_user_id = 24680
+        entries = [
+            ("0005.HK", 50.0, "above"),
+            ("700", "300", "below"),
+            ("0700.HK", 300.0, "below"),   # 批次內重複
+            ("AAPL", "abc", "above"),      # 無效價格
+            ("AAPL", 150.0, "sideways"),   # 不支援的類型
+        ]
+        added, rejected = monitor_db.add_watches(test_user_id, 13579, entries)
+        print(f"批量添加結果：添加 {len(added)} 個，拒絕 {len(rejected)} 個")
+        
+        if [watch[1] for watch in added] != ["0005.HK", "0700.HK"] or len(rejected) != 3:
+            print("❌ 批量添加結果不正確")
+            return False
+        
+        # 再次添加相同監控應全部被拒絕
+        added_again, rejected_again = monitor_db.add_watches(test_user_id, 13579, entries[:2])
+        if added_again or len(rejected_again) != 2:
+            print("❌ 重複監控未被拒絕")
+            return False
+        
+        if len(monitor_db.export_watches(test_user_id)) != 2:
+            print("❌ 導出監控數量不正確")
+            return False
+        
+        print("✅ 成功批量添加股票監控")
+        return True
+    except Exception as e:
+        print(f"❌ 批量添加監控測試失敗：{e}")
+        return False
+
+def test_watch_pages(monitor_db):
+    """測試 keyset 分頁的上下頁邊界，以及列表頁面緩存的失效"""
+    print("\n🔍 測試監控列表分頁...")
+    
+    try:
+        from monitor_fixtures import FakeBot
+        
+        test_user_id = 97531
+        for symbol in ("AAPL", "MSFT", "NVDA", "TSLA", "AMZN"):
+            monitor_db.add_watch(test_user_id, 13579, symbol, 1000.0)
+        ids = [row[0] for row in monitor_db.list_watches_page(test_user_id, page_size=10)[0]]
+        
+        # ID 倒序，每頁 2 個: 第一頁沒有上一頁，最後一頁沒有下一頁
+        pages = [
+            (monitor_db.list_watches_page(test_user_id, page_size=2), ids[0:2], False, True),
+            (monitor_db.list_watches_page(test_user_id, ids[1], 'next', page_size=2), ids[2:4], True, True),
+            (monitor_db.list_watches_page(test_user_id, ids[3], 'next', page_size=2), ids[4:], True, False),
+            (monitor_db.list_watches_page(test_user_id, ids[4], 'prev', page_size=2), ids[2:4], True, True),
+            (monitor_db.list_watches_page(test_user_id, ids[2], 'prev', page_size=2), ids[0:2], False, True),
+            (monitor_db.list_watches_page(test_user_id, ids[4], 'next', page_size=2), [], True, False),
+        ]
+        for (rows, has_prev, has_next), expected, expected_prev, expected_next in pages:
+            if [row[0] for row in rows] != expected or (has_prev, has_next) != (expected_prev, expected_next):
+                print(f"❌ 分頁結果不正確：{[row[0] for row in rows]} {has_prev} {has_next}，應為 {expected}")
+                return False
+        
+        # 添加監控後已緩存的頁面失效
+        monitor_db.render_watch_page(test_user_id)
+        if test_user_id not in monitor_db._page_cache:
+            print("❌ 列表頁面未被緩存")
+            return False
+        monitor_db.add_watch(test_user_id, 13579, "META", 1000.0)
+        if test_user_id in monitor_db._page_cache or "META" not in monitor_db.render_watch_page(test_user_id)[0]:
+            print("❌ 添加監控後列表頁面未失效")
+            return False
+        
+        # 發出警報並提交後頁面失效，重新渲染顯示新的警報次數
+        monitor_db._bot = FakeBot()
+        original_quotes = monitor_db.get_stock_quotes
+        monitor_db.get_stock_quotes = lambda symbols: {symbol: {'price': 2000.0} for symbol in symbols}
+        try:
+            monitor_db.check_alerts(["META"])
+        finally:
+            monitor_db._bot = None
+            monitor_db.get_stock_quotes = original_quotes
+        text = monitor_db.render_watch_page(test_user_id)[0]
+        if "🚨 警報次數: 1" not in text:
+            print("❌ 發出警報後列表頁面未失效")
+            return False
+        
+        print("✅ 監控列表分頁正確")
+        return True
+    except Exception as e:
+        print(f"❌ 監控列表分頁測試失敗：{e}")
+        return False
+
 def test_database_structure():
     """測試數據庫結構"""
     print("\n🔍 測試數據庫結構...")
@@ -165,6 +257,37 @@ def test_database_structure():
         print(f"❌ 數據庫結構測試失敗：{e}")
         return False
 
+def test_schema_version():
+    """測試表結構版本記錄，以及版本已是最新時跳過建表"""
+    print("\n🔍 測試數據庫結構版本...")
+    
+    try:
+        from stock_monitor_db import SCHEMA_VERSION, StockMonitorDB
+        
+        conn = sqlite3.connect("test_stock_monitor.db")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        count = conn.execute("SELECT COUNT(*) FROM stock_watches").fetchone()[0]
+        conn.close()
+        print(f"結構版本：{version}")
+        if version != SCHEMA_VERSION:
+            print("❌ 結構版本不正確")
+            return False
+        
+        # 重新打開已是最新版本的數據庫，現有數據應保持不變
+        StockMonitorDB("test_stock_monitor.db")
+        conn = sqlite3.connect("test_stock_monitor.db")
+        count_after = conn.execute("SELECT COUNT(*) FROM stock_watches").fetchone()[0]
+        conn.close()
+        if count_after != count:
+            print("❌ 重新打開後數據不一致")
+            return False
+        
+        print("✅ 數據庫結構版本正確")
+        return True
+    except Exception as e:
+        print(f"❌ 數據庫結構版本測試失敗：{e}")
+        return False
+
 def cleanup_test_database():
     """清理測試數據庫"""
     print("\n🧹 清理測試數據庫...")
@@ -195,6 +318,9 @@ def main():
     test_results.append(("添加監控", test_add_watch(monitor_db)))
     test_results.append(("列出監控", test_list_watches(monitor_db)))
     test_results.append(("移除監控", test_remove_watch(monitor_db)))
+    test_results.append(("批量添加監控", test_add_watches(monitor_db)))
+    test_results.append(("列表分頁", test_watch_pages(monitor_db)))
+    test_results.append(("結構版本", test_schema_version()))
     
     # 顯示測試結果
     print("\n📊 測試結果總結：")
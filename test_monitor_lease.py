@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+監控分片租約測試腳本
+測試 monitor_lease.py 的租約取得、續約和故障轉移
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from monitor_lease import FileLockLeaseBackend, ShardLeaseManager, SQLiteLeaseBackend, shard_for
+
+
+def test_sqlite_failover():
+    """測試 SQLite 租約的獨佔和過期接手"""
+    root = tempfile.mkdtemp()
+    try:
+        backend = SQLiteLeaseBackend(os.path.join(root, "leases.db"))
+        first = ShardLeaseManager(backend, num_shards=8, ttl=0.2, owner="a")
+        second = ShardLeaseManager(backend, num_shards=8, ttl=0.2, owner="b")
+
+        assert first.refresh() == frozenset(range(8))
+        assert second.refresh() == frozenset()
+        assert first.refresh() == frozenset(range(8))  # 續約
+
+        # first 停止續約，租約過期後由 second 接手
+        time.sleep(0.3)
+        assert second.refresh() == frozenset(range(8))
+        assert first.refresh() == frozenset()
+
+        second.release_all()
+        assert first.refresh() == frozenset(range(8))
+    finally:
+        shutil.rmtree(root)
+
+
+def test_max_shards():
+    """測試每個實例最多持有的分片數"""
+    root = tempfile.mkdtemp()
+    try:
+        backend = SQLiteLeaseBackend(os.path.join(root, "leases.db"))
+        first = ShardLeaseManager(backend, num_shards=8, ttl=60, max_shards=4, owner="a")
+        second = ShardLeaseManager(backend, num_shards=8, ttl=60, max_shards=4, owner="b")
+        assert len(first.refresh()) == 4
+        assert len(second.refresh()) == 4
+        assert first.owned.isdisjoint(second.owned)
+
+        symbol = "0700.HK"
+        owners = [m for m in (first, second) if m.owns_symbol(symbol)]
+        assert len(owners) == 1 and shard_for(symbol, 8) in owners[0].owned
+    finally:
+        shutil.rmtree(root)
+
+
+def test_instances_default():
+    """測試按實例數平均分配分片，其他實例停止後超出上限的分片仍會被接手"""
+    root = tempfile.mkdtemp()
+    try:
+        backend = SQLiteLeaseBackend(os.path.join(root, "leases.db"))
+        first = ShardLeaseManager(backend, num_shards=8, ttl=60, instances=3, takeover_after=0.2, owner="a")
+        second = ShardLeaseManager(backend, num_shards=8, ttl=60, instances=3, takeover_after=0.2, owner="b")
+        assert first.max_shards == second.max_shards == 3
+        assert ShardLeaseManager(backend, num_shards=8, instances=1).max_shards is None
+
+        assert len(first.refresh()) == 3
+        assert len(second.refresh()) == 3
+        assert first.owned.isdisjoint(second.owned)
+
+        # 第三個實例沒有啟動，剩餘的分片持續空閒 takeover_after 秒後才被接手
+        assert len(first.refresh()) == 3
+        time.sleep(0.3)
+        assert len(second.refresh()) == 3 + 2 and len(first.refresh()) == 3
+        assert first.owned.isdisjoint(second.owned) and first.owned | second.owned == frozenset(range(8))
+    finally:
+        shutil.rmtree(root)
+
+
+def test_file_lock():
+    """測試鎖文件租約"""
+    root = tempfile.mkdtemp()
+    try:
+        first = ShardLeaseManager(FileLockLeaseBackend(root), num_shards=4, owner="a")
+        second = ShardLeaseManager(FileLockLeaseBackend(root), num_shards=4, owner="b")
+        assert first.refresh() == frozenset(range(4))
+        assert second.refresh() == frozenset()
+        first.release_all()
+        assert second.refresh() == frozenset(range(4))
+        second.release_all()
+    finally:
+        shutil.rmtree(root)
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始監控分片租約測試\n")
+
+    tests = [
+        ("SQLite 故障轉移", test_sqlite_failover),
+        ("分片數上限", test_max_shards),
+        ("按實例數分配", test_instances_default),
+        ("鎖文件租約", test_file_lock),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
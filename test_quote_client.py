@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+輕量報價客戶端測試腳本
+測試 quote_client.py 的最小請求參數和 meta 局部解碼
+"""
+
+import json
+
+from alert_rules import WatchColumns, evaluate_alerts
+from monitor_fixtures import temp_monitor
+from quote_client import CHART_PARAMS, QuoteClient, extract_chart, extract_meta
+
+# 與 v8 chart (range=1d&interval=1d) 回應相同的結構：meta 中沒有 regularMarketOpen，
+# 開盤價只在 indicators.quote[0].open
+CHART_BODY = json.dumps({'chart': {'result': [{
+    'meta': {'currency': 'USD', 'symbol': 'AAPL', 'exchangeName': 'NMS', 'instrumentType': 'EQUITY',
+             'regularMarketTime': 1718049600, 'gmtoffset': -14400, 'timezone': 'EDT',
+             'regularMarketPrice': 190.5, 'regularMarketDayHigh': 191.0, 'regularMarketDayLow': 189.0,
+             'regularMarketVolume': 1200, 'chartPreviousClose': 188.0, 'priceHint': 2,
+             'currentTradingPeriod': {'pre': {'start': 0, 'end': 1}, 'regular': {'start': 1, 'end': 2},
+                                      'post': {'start': 2, 'end': 3}},
+             'dataGranularity': '1d', 'range': '1d', 'validRanges': ['1d', '5d']},
+    'timestamp': [1718026200],
+    'indicators': {'quote': [{'volume': [1200], 'low': [189.0], 'high': [191.0], 'close': [190.5],
+                              'open': [None, 191.88]}],
+                   'adjclose': [{'adjclose': [190.5]}]},
+}], 'error': None}}, indent=1).encode()
+
+
+class FakeResponse:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {'Content-Length': str(len(content))}
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.headers = {}
+        self.responses = responses
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append((url, params))
+        return self.responses[url.rsplit('/', 1)[1]]
+
+
+def test_extract_meta():
+    """測試只取出 meta 物件"""
+    meta = extract_meta(CHART_BODY)
+    assert meta['regularMarketPrice'] == 190.5
+    assert meta['currentTradingPeriod']['regular']['end'] == 2
+    assert 'timestamp' not in meta and 'regularMarketOpen' not in meta
+    assert extract_chart(CHART_BODY)[1] == 191.88
+    assert extract_chart(CHART_BODY.split(b'"indicators"')[0]) == (meta, None)
+    assert extract_meta(b'{"chart":{"result":null,"error":{"code":"Not Found"}}}') is None
+    assert extract_meta(b'{"chart":{"result":[{"meta":') is None
+
+
+def test_client_requests():
+    """測試最小請求參數、壓縮標頭和 Session 重用"""
+    session = FakeSession({'AAPL': FakeResponse(200, CHART_BODY), 'NOPE': FakeResponse(404, b'{}')})
+    client = QuoteClient(session_factory=lambda: session)
+    status, quote = client.fetch_quote('AAPL')
+    assert status == 200 and quote['volume'] == 1200 and quote['open'] == 191.88
+    assert client.fetch_quote('NOPE') == (404, None)
+    assert session.calls[0][1] == CHART_PARAMS and CHART_PARAMS['range'] == '1d'
+    assert 'gzip' in session.headers['Accept-Encoding']
+    assert client.session() is session and client.requests == 2
+    assert client.bytes_received == len(CHART_BODY) + 2
+
+
+def test_monitor_quotes():
+    """測試監控通過客戶端獲取報價並記錄代碼狀態"""
+    with temp_monitor('quote_client.db') as monitor:
+        session = FakeSession({'AAPL': FakeResponse(200, CHART_BODY), 'NOPE': FakeResponse(404, b'{}')})
+        monitor.quote_client = QuoteClient(session_factory=lambda: session)
+        quote = monitor.get_stock_quote('AAPL')
+        assert quote['price'] == 190.5 and quote['previousClose'] == 188.0
+        assert monitor.get_stock_quote('NOPE') is None
+        assert monitor.symbols.is_valid('AAPL') and monitor.symbols.is_valid('NOPE') is False
+
+
+def test_sessions_reused_across_cycles():
+    """測試報價線程池跨輪保留，每個線程的 Session 不會每輪重建"""
+    with temp_monitor('quote_client.db') as monitor:
+        sessions = []
+
+        def session_factory():
+            sessions.append(FakeSession({symbol: FakeResponse(200, CHART_BODY) for symbol in ('AAPL', 'MSFT', 'GOOG')}))
+            return sessions[-1]
+        monitor.quote_client = QuoteClient(session_factory=session_factory)
+        assert len(monitor.get_stock_quotes(['AAPL', 'MSFT', 'GOOG'])) == 3
+        created = len(sessions)
+        pool = monitor._quote_pool()
+        for _ in range(5):
+            assert len(monitor.get_stock_quotes(['AAPL', 'MSFT', 'GOOG'])) == 3
+        assert monitor._quote_pool() is pool and len(sessions) == created
+        assert sum(len(session.calls) for session in sessions) == 18
+        pool.shutdown()
+
+
+def test_gap_alerts_from_chart():
+    """測試從真實結構的 chart 回應計算跳空，gap_up 可以觸發 (開盤 191.88 相對昨收 188 約 +2.06%)"""
+    with temp_monitor('quote_client.db') as monitor:
+        monitor.quote_client = QuoteClient(session_factory=lambda: FakeSession({'AAPL': FakeResponse(200, CHART_BODY)}))
+        quote = monitor.get_stock_quote('AAPL')
+        rows = [(1, 1, 1, 'AAPL', 2.0, 'gap_up', None, 0), (2, 1, 1, 'AAPL', 2.5, 'gap_up', None, 0),
+                (3, 1, 1, 'AAPL', 1.0, 'gap_down', None, 0)]
+        watches = WatchColumns(rows)
+        assert [watches.rows[i][0] for i in evaluate_alerts(watches, {'AAPL': quote})] == [1]
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始輕量報價客戶端測試\n")
+
+    tests = [
+        ("局部解碼", test_extract_meta),
+        ("請求參數", test_client_requests),
+        ("監控報價", test_monitor_quotes),
+        ("跨輪重用連接", test_sessions_reused_across_cycles),
+        ("跳空警報", test_gap_alerts_from_chart),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
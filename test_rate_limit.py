@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指令限流測試腳本
+測試 rate_limit.py 的令牌桶、用戶/聊天限額和重複請求合併
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from rate_limit import MAX_COMPARE_SYMBOLS, CommandLimiter, TokenBuckets
+
+
+class FakeMessage:
+    def __init__(self, text):
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text):
+        self.replies.append(text)
+
+
+def make_update(user_id, chat_id, text):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), effective_chat=SimpleNamespace(id=chat_id),
+                           effective_message=FakeMessage(text), callback_query=None)
+
+
+def test_token_buckets():
+    """測試令牌扣除、補充和等待時間"""
+    buckets = TokenBuckets(rate=1, capacity=3)
+    assert buckets.acquire('u', 2, now=0) == 0
+    assert buckets.acquire('u', 2, now=0) == 1.0  # 只剩 1 個，需等 1 秒
+    assert buckets.acquire('u', 2, now=1) == 0
+    assert buckets.acquire('u', 10, now=10) == 0  # 成本不超過容量
+    buckets.refund('u', 2)
+    assert buckets.acquire('u', 2, now=10) == 0
+
+
+def test_user_and_chat_limits():
+    """測試用戶和聊天限額，以及成本計算"""
+    limiter = CommandLimiter(user_rate=1, user_capacity=4, chat_rate=1, chat_capacity=5)
+    assert limiter.cost('stockinfo', []) == 2
+    assert limiter.cost('stockcompare', ['AAPL', 'MSFT', 'GOOG']) == 3
+    assert limiter.cost('stock', ['AAPL']) == 1
+    assert limiter.cost('stockcompare', ['S%d' % i for i in range(8)]) == MAX_COMPARE_SYMBOLS
+
+    assert limiter.check(1, 100, 4, now=0) == 0
+    assert limiter.check(1, 100, 1, now=0) > 0    # 用戶限額用完
+    assert limiter.check(2, 100, 2, now=0) > 0    # 同一聊天限額用完，用戶 2 的令牌被退回
+    assert limiter.check(2, 200, 4, now=0) == 0
+
+
+def test_guard():
+    """測試限流提示只發一次，以及同一聊天的重複請求合併"""
+    limiter = CommandLimiter(user_rate=0.1, user_capacity=2, message="slow down {wait}")
+    release = asyncio.Event()
+    calls = []
+
+    async def handler(update, context):
+        calls.append(update.effective_message.text)
+        await release.wait()
+
+    guarded = limiter.guard('stock', handler)
+    context = SimpleNamespace(args=['AAPL'])
+
+    async def scenario():
+        first = asyncio.create_task(guarded(make_update(1, 10, '/stock AAPL'), context))
+        await asyncio.sleep(0)
+        duplicate = make_update(1, 10, '/stock AAPL')
+        await guarded(duplicate, context)  # 處理中的相同請求被合併
+        other_chat = asyncio.create_task(guarded(make_update(1, 20, '/stock AAPL'), context))
+        await asyncio.sleep(0)
+        limited = [make_update(1, 10, '/stock MSFT') for _ in range(3)]
+        for update in limited:
+            await guarded(update, context)
+        release.set()
+        await asyncio.gather(first, other_chat)
+        return duplicate, limited
+
+    duplicate, limited = asyncio.run(scenario())
+    assert calls == ['/stock AAPL', '/stock AAPL']
+    assert duplicate.effective_message.replies == []
+    assert limited[0].effective_message.replies == ["slow down 10"]
+    assert all(not update.effective_message.replies for update in limited[1:])
+    assert limiter.coalesced == 1 and limiter.limited == 3
+
+
+def test_compare_charged_per_symbol():
+    """測試 /stockcompare 經 guard 按股票數量扣除令牌"""
+    limiter = CommandLimiter(user_rate=0.01, user_capacity=6, chat_rate=0.01, chat_capacity=100)
+    calls = []
+
+    async def handler(update, context):
+        calls.append(context.args)
+
+    guarded = limiter.guard('stockcompare', handler)
+
+    async def scenario():
+        await guarded(make_update(1, 10, '/stockcompare A B C D E'), SimpleNamespace(args=list('ABCDE')))
+        await guarded(make_update(1, 10, '/stockcompare F G'), SimpleNamespace(args=list('FG')))
+        await guarded(make_update(1, 10, '/stockcompare H'), SimpleNamespace(args=['H']))
+
+    asyncio.run(scenario())
+    assert calls == [list('ABCDE'), ['H']] and limiter.limited == 1
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始指令限流測試\n")
+
+    tests = [
+        ("令牌桶", test_token_buckets),
+        ("用戶和聊天限額", test_user_and_chat_limits),
+        ("限流與合併", test_guard),
+        ("比較按股票扣除", test_compare_charged_per_symbol),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指令路由測試腳本
+測試 router.py 的文字分類、按鈕回調分派、未知回調和路由統計
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from router import CallbackRouter, RouteStats, classify_text, timed
+
+
+class FakeQuery:
+    """記錄 edit_message_text 的假 CallbackQuery"""
+
+    def __init__(self, data):
+        self.data = data
+        self.edited = []
+
+    async def edit_message_text(self, text):
+        self.edited.append(text)
+
+
+def test_classify_text():
+    """測試數學算式和普通文字的分類"""
+    cases = [
+        ("1+2", 'math'),
+        ("2 * (3 + 4)", 'math'),
+        ("10/4=", 'math'),
+        ("3.5 - 1.25", 'math'),
+        ("-5", 'math'),
+        ("42", 'text'),           # 沒有運算符
+        ("(1)", 'text'),
+        ("", 'text'),
+        ("hello", 'text'),
+        ("1+2 apples", 'text'),
+        ("AAPL+MSFT", 'text'),
+        ("2^3", 'text'),          # 不支援的運算符
+    ]
+    for text, expected in cases:
+        assert classify_text(text) == expected, (text, classify_text(text))
+
+
+def test_dispatch():
+    """測試精確匹配優先於前綴匹配，前綴按添加順序匹配"""
+    calls = []
+
+    def handler(name):
+        async def handle(query):
+            calls.append((name, query.data))
+        return handle
+
+    router = CallbackRouter(stats=RouteStats())
+    router.add('time', handler('time'))
+    router.add('wl:top', handler('top'))
+    router.add_reply('help', "❓ 幫助")
+    router.add_prefix('wl:', handler('watchlist'))
+    router.add_prefix('w', handler('w'))
+
+    cases = [
+        ('time', [('time', 'time')]),
+        ('wl:top', [('top', 'wl:top')]),
+        ('wl:7:next:42', [('watchlist', 'wl:7:next:42')]),
+        ('weather', [('w', 'weather')]),
+        ('help', []),
+    ]
+    for data, expected in cases:
+        calls.clear()
+        query = FakeQuery(data)
+        assert asyncio.run(router.dispatch(query)) is True, data
+        assert calls == expected, (data, calls)
+        assert query.edited == (["❓ 幫助"] if data == 'help' else []), data
+
+
+def test_unknown_callback():
+    """測試找不到路由時返回 False，不調用任何處理函數也不記錄統計"""
+    calls = []
+
+    async def handle(query):
+        calls.append(query.data)
+
+    stats = RouteStats()
+    router = CallbackRouter(stats=stats)
+    router.add('time', handle)
+    router.add_prefix('wl:', handle)
+
+    for data in ('unknown', 'tim', 'times', 'wl', ''):
+        query = FakeQuery(data)
+        assert asyncio.run(router.dispatch(query)) is False, data
+        assert query.edited == []
+    assert calls == [] and stats.snapshot() == {}
+
+
+def test_route_stats():
+    """測試次數、錯誤、平均和最大延遲，以及 timed 包裝和排序輸出"""
+    stats = RouteStats()
+    assert stats.format() == "📊 尚未有路由統計"
+
+    for name, elapsed, error in [('/stock', 0.010, False), ('/stock', 0.030, True), ('/help', 0.002, False)]:
+        stats.record(name, elapsed, error)
+    snapshot = stats.snapshot()
+    count, errors, avg_ms, max_ms = snapshot['/stock']
+    assert (count, errors) == (2, 1)
+    assert abs(avg_ms - 20.0) < 1e-6 and abs(max_ms - 30.0) < 1e-6
+    assert snapshot['/help'][:2] == (1, 0)
+
+    lines = stats.format().splitlines()
+    assert lines[1].startswith("/stock: 2 / 1 /") and lines[2].startswith("/help: 1 / 0 /")
+    assert len(stats.format(limit=1).splitlines()) == 2
+
+    async def ok(update):
+        return update.value
+
+    async def fail(update):
+        raise ValueError(update.value)
+
+    assert asyncio.run(timed('ok', ok, stats)(SimpleNamespace(value=1))) == 1
+    try:
+        asyncio.run(timed('fail', fail, stats)(SimpleNamespace(value=2)))
+        assert False, "應拋出 ValueError"
+    except ValueError:
+        pass
+    snapshot = stats.snapshot()
+    assert snapshot['ok'][:2] == (1, 0) and snapshot['fail'][:2] == (1, 1)
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始指令路由測試\n")
+
+    tests = [
+        ("文字分類", test_classify_text),
+        ("回調分派", test_dispatch),
+        ("未知回調", test_unknown_callback),
+        ("路由統計", test_route_stats),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+結構化日誌測試腳本
+測試 structured_log.py 的 JSON 輸出、關聯 ID、抽樣和隊列滿時不阻塞
+"""
+
+import asyncio
+import io
+import json
+import logging
+from types import SimpleNamespace
+
+import structured_log
+from monitor_fixtures import temp_monitor
+from timer_wheel import TimerWheel
+
+
+def read_lines(stream):
+    structured_log.shutdown()  # 輸出隊列中剩餘的記錄
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_json_and_request_id():
+    """測試 JSON 欄位、extra 欄位、異常，以及每個更新的 request_id"""
+    stream = io.StringIO()
+    structured_log.setup_logging(level='INFO', fmt='json', stream=stream, sampling={})
+    logger = logging.getLogger('bot.test')
+
+    async def handler(update, context):
+        logger.info("查詢 %s", 'AAPL', extra={'symbol': 'AAPL'})
+        await asyncio.to_thread(logger.info, "線程中")
+
+    wrapped = structured_log.with_request_id(handler)
+
+    async def scenario():
+        await asyncio.gather(wrapped(SimpleNamespace(update_id=1), None), wrapped(SimpleNamespace(update_id=2), None))
+    asyncio.run(scenario())
+    logger.debug("不輸出")
+    try:
+        raise ValueError("壞了")
+    except ValueError:
+        logger.error("失敗", exc_info=True)
+
+    lines = read_lines(stream)
+    assert len(lines) == 5
+    first = lines[0]
+    assert first['level'] == 'INFO' and first['logger'] == 'bot.test' and first['msg'] == "查詢 AAPL"
+    assert first['symbol'] == 'AAPL' and first['request_id'] == 'u1'
+    assert sorted(line['request_id'] for line in lines[:4]) == ['u1', 'u1', 'u2', 'u2']
+    assert 'request_id' not in lines[4] and 'ValueError: 壞了' in lines[4]['exc']
+
+
+def test_sampling_and_drops():
+    """測試按 logger 抽樣 (WARNING 以上全部保留) 和隊列滿時丟棄"""
+    stream = io.StringIO()
+    structured_log.setup_logging(level='INFO', stream=stream, sampling=structured_log.parse_sampling('bot.api=5,x=bad'))
+    api = logging.getLogger('bot.api.stock')
+    for index in range(12):
+        api.info("Status: %s", index)
+    api.warning("Status: %s", 500)
+    lines = read_lines(stream)
+    assert [line['msg'] for line in lines] == ["Status: 0", "Status: 5", "Status: 10", "Status: 500"]
+    assert lines[0]['sampled'] == 5 and 'sampled' not in lines[3]
+
+    # 輸出線程停止時隊列很快填滿，調用方不被阻塞
+    structured_log.setup_logging(stream=io.StringIO(), sampling={}, max_queue=10)
+    listener, structured_log._listener = structured_log._listener, None
+    listener.stop()
+    for index in range(25):
+        logging.getLogger('bot').info("%s", index)
+    assert structured_log.dropped_records() == 15
+    structured_log.shutdown()
+
+
+def test_cycle_id():
+    """測試監控每輪的 cycle_id 傳到線程池中的報價請求"""
+    stream = io.StringIO()
+    structured_log.setup_logging(level='INFO', stream=stream, sampling={})
+    with temp_monitor('structured_log.db') as monitor:
+        monitor.scheduler = TimerWheel(tick=1, slots=64, now=0)
+        monitor.add_watch(1, 1, 'AAPL', 1000.0)
+        monitor.add_watch(1, 1, 'MSFT', 1000.0)
+
+        def fake_quote(symbol):
+            logging.getLogger('stock_monitor.test').info("請求 %s", symbol)
+            return None
+        monitor.get_stock_quote = fake_quote
+        monitor.run_scheduled(0)
+        monitor.run_scheduled(1)
+
+        lines = [line for line in read_lines(stream) if line['logger'] == 'stock_monitor.test']
+        assert len(lines) == 2 and lines[0]['cycle_id'] == lines[1]['cycle_id']
+        assert lines[0]['cycle_id'].startswith('c')
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始結構化日誌測試\n")
+
+    tests = [
+        ("JSON 與請求 ID", test_json_and_request_id),
+        ("抽樣與丟棄", test_sampling_and_drops),
+        ("監控輪次 ID", test_cycle_id),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
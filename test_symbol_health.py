@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+股票獲取失敗追蹤測試腳本
+測試 symbol_health.py 的指數退避，以及監控自動暫停和恢復
+"""
+
+from monitor_fixtures import temp_monitor
+from symbol_health import FAILURE_NO_DATA, FAILURE_NOT_FOUND, SymbolHealth
+
+
+def test_backoff():
+    """測試指數退避與成功後重置"""
+    health = SymbolHealth(base_delay=60, max_delay=300)
+    assert health.should_fetch('AAPL', now=0)
+    assert health.record_failure('AAPL', now=0) == 60
+    assert not health.should_fetch('AAPL', now=59)
+    assert health.should_fetch('AAPL', now=60)
+    assert health.record_failure('AAPL', now=60) == 120
+    assert health.record_failure('AAPL', now=180) == 240
+    assert health.record_failure('AAPL', now=420) == 300  # 不超過 max_delay
+    assert health.due(['AAPL', 'MSFT'], now=500) == ['MSFT']
+    assert health.skipped == 2
+
+    health.record_success('AAPL')
+    assert health.failures('AAPL') == 0 and health.should_fetch('AAPL', now=500)
+
+
+def test_suspend_threshold():
+    """測試暫停條件: 連續代碼失敗次數或連續確認不存在，上游錯誤不計入"""
+    health = SymbolHealth(suspend_after=4, suspend_not_found=2)
+    health.record_failure('DEAD', FAILURE_NOT_FOUND, now=0)
+    assert not health.should_suspend('DEAD')
+    health.record_failure('DEAD', FAILURE_NOT_FOUND, now=0)
+    assert health.should_suspend('DEAD')
+
+    # 不存在與沒有數據交替時按代碼失敗總數計算
+    for kind in (FAILURE_NOT_FOUND, FAILURE_NO_DATA, FAILURE_NOT_FOUND):
+        health.record_failure('FLAKY', kind, now=0)
+    assert not health.should_suspend('FLAKY')
+    health.record_failure('FLAKY', FAILURE_NO_DATA, now=0)
+    assert health.should_suspend('FLAKY')
+
+    # 上游長時間故障 (超時、429、5xx) 只退避，不暫停
+    for _ in range(50):
+        health.record_failure('AAPL', now=0)
+    assert not health.should_suspend('AAPL') and health.failures('AAPL') == 50
+    health.record_failure('AAPL', FAILURE_NOT_FOUND, now=0)
+    assert not health.should_suspend('AAPL')
+
+
+def test_monitor_suspends_and_resumes():
+    """測試監控暫停失敗股票、不再請求，並可恢復"""
+    with temp_monitor('health.db') as monitor:
+        monitor.symbol_health = SymbolHealth(base_delay=0, suspend_not_found=2)
+        requested = []
+
+        def fake_quotes(symbols, max_workers=8):
+            requested.append(list(symbols))
+            for symbol in symbols:
+                if symbol == 'DEAD':
+                    monitor.symbols.record_response(symbol, 404)
+            return {symbol: {'price': 1.0, 'volume': 1, 'previousClose': 1.0, 'open': 1.0}
+                    for symbol in symbols if symbol != 'DEAD'}
+        monitor.get_stock_quotes = fake_quotes
+
+        success, message = monitor.add_watch(1, 1, 'DEAD', 10.0)
+        assert success, message
+        watch_id = int(message.split('ID: ')[1].rstrip(')'))
+        assert monitor.add_watch(1, 1, 'AAPL', 1000.0)[0]
+
+        monitor.check_alerts()
+        monitor.check_alerts()
+        assert requested == [['DEAD', 'AAPL'], ['DEAD', 'AAPL']]
+        monitor.check_alerts()
+        assert requested[-1] == ['AAPL']  # 已暫停的監控不再請求
+
+        page = monitor.render_watch_page(1)[0]
+        assert f"/resumewatch {watch_id}" in page
+        assert monitor.resume_watch(1, watch_id)[0]
+        assert not monitor.resume_watch(1, watch_id)[0]
+        monitor.check_alerts()
+        assert sorted(requested[-1]) == ['AAPL', 'DEAD']
+
+
+class FakeClient:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def fetch_quote(self, symbol):
+        if self.status_code is None:
+            raise TimeoutError("read timeout")
+        return self.status_code, None
+
+
+def test_outage_does_not_suspend():
+    """測試 Yahoo 故障 (超時、429、5xx) 期間只退避不暫停，200 但沒有數據仍會暫停"""
+    with temp_monitor('health.db') as monitor:
+        monitor.symbol_health = SymbolHealth(base_delay=0, suspend_after=3)
+        assert monitor.add_watch(1, 1, 'AAPL', 1000.0)[0]
+        for status_code in (None, 429, 503, 502, None, 429):
+            monitor.quote_client = FakeClient(status_code)
+            monitor.check_alerts()
+        assert monitor.symbol_health.failures('AAPL') == 6
+        assert not monitor.symbol_health.should_suspend('AAPL')
+        assert "已暫停" not in monitor.render_watch_page(1)[0]
+
+        monitor.quote_client = FakeClient(200)
+        for _ in range(3):
+            monitor.check_alerts()
+        assert "已暫停" in monitor.render_watch_page(1)[0]
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始股票獲取失敗追蹤測試\n")
+
+    tests = [
+        ("指數退避", test_backoff),
+        ("暫停條件", test_suspend_threshold),
+        ("監控暫停與恢復", test_monitor_suspends_and_resumes),
+        ("上游故障不暫停", test_outage_does_not_suspend),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
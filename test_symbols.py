@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+股票代碼解析測試腳本
+測試 symbols.py 的代碼標準化、別名、代碼表和有效性緩存
+"""
+
+import os
+import tempfile
+import time
+
+from symbols import SymbolError, SymbolResolver, normalize_symbol
+
+
+def test_normalize():
+    """測試香港代碼標準化"""
+    assert normalize_symbol('5') == '0005.HK'
+    assert normalize_symbol('5.hk') == '0005.HK'
+    assert normalize_symbol(' 0005.HK ') == '0005.HK'
+    assert normalize_symbol('00700.HK') == '0700.HK'
+    assert normalize_symbol('09988') == '9988.HK'
+    assert normalize_symbol('aapl') == 'AAPL'
+
+
+def test_aliases_and_syntax():
+    """測試別名和格式檢查"""
+    resolver = SymbolResolver()
+    assert resolver.resolve('騰訊') == '0700.HK'
+    assert resolver.resolve('brk-b') == 'BRK-B'
+    assert resolver.resolve('^hsi') == '^HSI'
+    for text in ['', 'AAPL; DROP', 'A' * 30, '$$$']:
+        try:
+            resolver.resolve(text)
+        except SymbolError:
+            continue
+        raise AssertionError(f"應拒絕 {text!r}")
+    assert resolver.rejected == 4
+
+
+def test_symbol_table():
+    """測試代碼表: 表內交易所只接受表中代碼，其他交易所不受影響"""
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+        f.write("symbol,name\n5.HK,匯豐控股\n0700.HK,騰訊控股\n2800.HK,盈富基金\n")
+        path = f.name
+    try:
+        resolver = SymbolResolver(aliases={})
+        assert resolver.load_table(path) == 3
+        assert resolver.resolve('2800') == '2800.HK'
+        assert resolver.resolve('盈富基金') == '2800.HK'
+        assert resolver.name('0005.HK') == '匯豐控股'
+        assert resolver.is_valid('0700.HK') is True
+        try:
+            resolver.resolve('9999.HK')
+            raise AssertionError("不在代碼表中的港股應被拒絕")
+        except SymbolError:
+            pass
+        assert resolver.resolve('AAPL') == 'AAPL'
+    finally:
+        os.remove(path)
+
+
+def test_validity_cache():
+    """測試有效性緩存與負緩存過期"""
+    resolver = SymbolResolver(negative_ttl=0.05, max_entries=2)
+    assert resolver.is_valid('ZZZZ') is None
+    resolver.record_response('ZZZZ', 404)
+    try:
+        resolver.resolve('zzzz')
+        raise AssertionError("負緩存中的代碼應被拒絕")
+    except SymbolError:
+        pass
+    time.sleep(0.06)
+    assert resolver.resolve('zzzz') == 'ZZZZ'
+
+    resolver.record_response('AAPL', 200)
+    resolver.record_response('MSFT', 500)  # 上游錯誤不記錄
+    assert resolver.is_valid('AAPL') is True and resolver.is_valid('MSFT') is None
+    resolver.record('GOOG', True)
+    resolver.record('TSLA', True)
+    assert resolver.is_valid('AAPL') is None  # 超出 max_entries 被淘汰
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始股票代碼解析測試\n")
+
+    tests = [
+        ("代碼標準化", test_normalize),
+        ("別名與格式", test_aliases_and_syntax),
+        ("交易所代碼表", test_symbol_table),
+        ("有效性緩存", test_validity_cache),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+價格歷史存儲測試腳本
+測試 tick_store.py 的兩個後端
+"""
+
+import os
+import shutil
+import tempfile
+
+from stock_monitor_db import StockMonitorDB
+from tick_store import TickStore
+
+DAY = 1_700_006_400  # 2023-11-15 00:00 UTC
+
+
+def test_tick_store_range():
+    """測試列式存儲的範圍讀取"""
+    root = tempfile.mkdtemp()
+    try:
+        store = TickStore(root)
+        for i in range(10):
+            store.save('0700.HK', 300.0 + i, 1000 * i, DAY + 3600 * i)
+        store.save('0700.HK', 400.0, 5, DAY + 86400 + 60)
+
+        segments = store.segments('0700.HK', DAY + 3600 * 2, DAY + 86400 + 120)
+        assert len(segments) == 2
+        assert list(segments[0].prices) == [302.0 + i for i in range(8)]
+        assert segments[1].volumes.tolist() == [5]
+
+        series = store.load('0700.HK', DAY + 3600 * 8)
+        assert list(series.timestamps) == [DAY + 3600 * 8, DAY + 3600 * 9, DAY + 86400 + 60]
+        assert os.path.getsize(os.path.join(root, '0700.HK', '20231115.pxd')) == 10 * 8
+        del segments, series
+        store.close()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_tick_store_precision_and_order():
+    """測試價格保留 float64 精度、拒絕比當日最後一筆更早的記錄"""
+    root = tempfile.mkdtemp()
+    try:
+        store = TickStore(root)
+        assert store.save('BRK-A', 300.1, 1, DAY + 60)
+        assert store.save('BRK-A', 654321.07, 1, DAY + 120)
+        assert not store.save('BRK-A', 1.0, 1, DAY + 90)  # 時間倒退
+        assert store.save('BRK-A', 654321.08, 1, DAY + 120)  # 相同時間可以
+        series = store.load('BRK-A', DAY)
+        assert list(series.prices) == [300.1, 654321.07, 654321.08]
+        assert list(series.timestamps) == [DAY + 60, DAY + 120, DAY + 120]
+
+        # 重新打開後按檔案中的最後一筆判斷
+        del series
+        store.close()
+        store = TickStore(root)
+        assert not store.save('BRK-A', 1.0, 1, DAY + 100)
+        store.close()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_tick_store_repairs_torn_write():
+    """測試寫入中途中斷後，再次寫入前把較長的列截斷對齊"""
+    root = tempfile.mkdtemp()
+    try:
+        store = TickStore(root)
+        for i in range(3):
+            store.save('0700.HK', 300.0 + i, i, DAY + 60 * i)
+        store.close()
+        base = os.path.join(root, '0700.HK', '20231115')
+        # 模擬第 4 筆只寫入了時間偏移和半個價格
+        with open(base + '.ts', 'ab') as f:
+            f.write(b'\x00' * 4)
+        with open(base + '.pxd', 'ab') as f:
+            f.write(b'\x00' * 3)
+
+        store = TickStore(root)
+        assert store.save('0700.HK', 310.0, 9, DAY + 600)
+        assert [os.path.getsize(base + ext) for ext in ('.ts', '.pxd', '.vol')] == [16, 32, 32]
+        series = store.load('0700.HK', DAY)
+        assert list(series.prices) == [300.0, 301.0, 302.0, 310.0]
+        assert list(series.volumes) == [0, 1, 2, 9]
+        del series
+        store.close()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_sqlite_history():
+    """測試默認的 price_history 後端"""
+    root = tempfile.mkdtemp()
+    try:
+        monitor_db = StockMonitorDB(os.path.join(root, "history.db"))
+        monitor_db.history.save('0005.HK', 50.0, 100, DAY)
+        monitor_db.history.save('0005.HK', 51.0, 200, DAY + 60)
+        series = monitor_db.load_price_history('0005.HK', DAY + 30)
+        assert list(series.prices) == [51.0]
+        assert list(series.timestamps) == [DAY + 60]
+    finally:
+        shutil.rmtree(root)
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始價格歷史存儲測試\n")
+
+    tests = [
+        ("列式存儲範圍讀取", test_tick_store_range),
+        ("價格精度與順序", test_tick_store_precision_and_order),
+        ("中斷後對齊", test_tick_store_repairs_torn_write),
+        ("SQLite 後端", test_sqlite_history),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+時間輪調度測試腳本
+測試 timer_wheel.py 的調度與推進，以及監控按用戶檢查間隔分級請求報價
+"""
+
+from monitor_fixtures import temp_monitor
+from timer_wheel import TimerWheel
+
+
+def test_wheel():
+    """測試調度、跨圈到期、重新調度和取消"""
+    wheel = TimerWheel(tick=1, slots=8, now=0)
+    wheel.schedule('A', 3, now=0)
+    wheel.schedule('B', 3, now=0)
+    wheel.schedule('C', 20, now=0)  # 超過一圈
+    wheel.schedule('D', 0, now=0)   # 最早下一格
+    assert wheel.advance(0.5) == []
+    assert wheel.advance(1) == ['D']
+    assert sorted(wheel.advance(3)) == ['A', 'B']
+    assert wheel.advance(12) == [] and 'C' in wheel
+
+    wheel.schedule('C', 1, now=12)  # 重新調度
+    wheel.schedule('E', 2, now=12)
+    wheel.cancel('E')
+    assert wheel.advance(13) == ['C'] and len(wheel) == 0
+
+    # 落後超過一圈時一次過返回所有到期項目
+    for index in range(5):
+        wheel.schedule(index, index * 7, now=13)
+    assert sorted(wheel.advance(100)) == [0, 1, 2, 3, 4]
+
+
+def schedule_quotes(monitor):
+    """為監控設置時間輪和假報價，返回每次請求的股票列表"""
+    monitor.scheduler = TimerWheel(tick=1, slots=64, now=0)
+    monitor.check_interval = 60
+    requested = []
+
+    def fake_quotes(symbols, max_workers=8):
+        requested.append(sorted(symbols))
+        return {symbol: {'price': 1.0, 'volume': 1, 'previousClose': 1.0, 'open': 1.0} for symbol in symbols}
+    monitor.get_stock_quotes = fake_quotes
+    return requested
+
+
+def test_tiered_intervals():
+    """測試不同用戶的檢查間隔，同一格到期的股票一次過請求"""
+    with temp_monitor('timer_wheel.db') as monitor:
+        requested = schedule_quotes(monitor)
+        assert monitor.set_check_interval(1, 1, 'premium')[0]
+        assert not monitor.set_check_interval(2, 2, 'hourly')[0]
+        monitor.add_watch(1, 1, 'AAPL', 1000.0)
+        monitor.add_watch(2, 2, 'AAPL', 2000.0)  # 同一股票取最短間隔
+        monitor.add_watch(2, 2, 'MSFT', 1000.0)
+
+        assert monitor.run_scheduled(0) == []  # 新股票在下一格到期
+        assert sorted(monitor.run_scheduled(1)) == ['AAPL', 'MSFT']
+        assert requested == [['AAPL', 'MSFT']]
+        for second in range(2, 62):
+            monitor.run_scheduled(second)
+        # AAPL 每 5 秒一次，MSFT 按默認 60 秒
+        assert sum('AAPL' in batch for batch in requested) == 13
+        assert sum('MSFT' in batch for batch in requested) == 2
+        assert requested[-1] == ['AAPL', 'MSFT']
+
+        # 升級後在下一次推進時立即檢查
+        assert monitor.set_check_interval(2, 2, 'premium')[0]
+        assert monitor.run_scheduled(62) == ['MSFT']
+
+
+def test_removed_symbols_unscheduled():
+    """測試移除監控後不再調度該股票"""
+    with temp_monitor('timer_wheel.db') as monitor:
+        requested = schedule_quotes(monitor)
+        monitor.add_watch(1, 1, 'AAPL', 1000.0)
+        monitor.run_scheduled(0)
+        assert monitor.run_scheduled(1) == ['AAPL'] and 'AAPL' in monitor.scheduler
+        monitor.remove_watch(1, 1)
+        monitor.run_scheduled(2)
+        assert 'AAPL' not in monitor.scheduler
+        assert monitor.run_scheduled(120) == []
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始時間輪調度測試\n")
+
+    tests = [
+        ("時間輪", test_wheel),
+        ("分級檢查間隔", test_tiered_intervals),
+        ("取消調度", test_removed_symbols_unscheduled),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+監控集合增量維護測試腳本
+測試 watch_set.py 通過變更日誌增量套用監控變更
+"""
+
+import random
+import sqlite3
+
+from alert_rules import WatchColumns, evaluate_alerts
+from monitor_fixtures import FakeBot, temp_monitor
+from quote_cache import Quote
+from watch_set import WatchRecord, WatchSet
+
+
+def refresh(monitor, watch_set):
+    conn = sqlite3.connect(monitor.db_path)
+    try:
+        return watch_set.refresh(conn)
+    finally:
+        conn.close()
+
+
+def test_incremental_changes():
+    """測試只套用新變更"""
+    with temp_monitor('watch_set.db') as monitor:
+        monitor.add_watch(1, 1, 'AAPL', 100.0)
+        monitor.add_watch(1, 1, 'MSFT', 200.0)
+
+        watch_set = WatchSet()
+        assert refresh(monitor, watch_set) == 2
+        assert watch_set.full_loads == 1 and set(watch_set.by_symbol) == {'AAPL', 'MSFT'}
+        assert watch_set.take_changes() is None  # 首次完整載入
+        assert refresh(monitor, watch_set) == 0
+
+        # 只更新 last_checked 不產生變更
+        conn = sqlite3.connect(monitor.db_path)
+        conn.execute('UPDATE stock_watches SET last_checked = CURRENT_TIMESTAMP')
+        conn.commit()
+        conn.close()
+        assert refresh(monitor, watch_set) == 0
+
+        added, _ = monitor.add_watches(2, 2, [('0700.HK', 300.0, 'below'), ('AAPL', 90.0, 'below')])
+        assert refresh(monitor, watch_set) == 2
+        assert len(watch_set) == 4 and len(watch_set.by_symbol['AAPL']) == 2
+
+        monitor.remove_watch(2, added[1][0])
+        monitor.suspend_symbols(['MSFT'])
+        assert refresh(monitor, watch_set) == 2
+        assert set(watch_set.by_symbol) == {'AAPL', '0700.HK'} and len(watch_set) == 2
+
+        # 警報記錄不是成員變化，不寫入變更日誌 (由監控線程直接更新內存中的記錄)
+        conn = sqlite3.connect(monitor.db_path)
+        conn.execute("UPDATE stock_watches SET last_alert = CURRENT_TIMESTAMP, alert_count = alert_count + 1 "
+                     "WHERE symbol = '0700.HK'")
+        conn.commit()
+        conn.close()
+        assert refresh(monitor, watch_set) == 0
+        assert watch_set.full_loads == 1
+
+        # 增減按順序記錄，完整載入後返回 None
+        changes = watch_set.take_changes()
+        assert changes is not None and [added for _, added in changes] == [True, True, False, False]
+        assert watch_set.take_changes() == []
+        watch_set.reload()
+        refresh(monitor, watch_set)
+        assert watch_set.take_changes() is None and watch_set.full_loads == 2
+
+
+def test_truncated_log_reloads():
+    """測試變更日誌被清理後完整重新載入"""
+    with temp_monitor('watch_set.db') as monitor:
+        monitor.add_watch(1, 1, 'AAPL', 100.0)
+        watch_set = WatchSet()
+        refresh(monitor, watch_set)
+
+        monitor.add_watch(1, 1, 'MSFT', 200.0)
+        conn = sqlite3.connect(monitor.db_path)
+        conn.execute('DELETE FROM watch_changes')
+        conn.commit()
+        conn.close()
+        monitor.add_watch(1, 1, 'GOOG', 300.0)
+
+        refresh(monitor, watch_set)
+        assert watch_set.full_loads == 2
+        assert set(watch_set.by_symbol) == {'AAPL', 'MSFT', 'GOOG'}
+
+
+def test_columns_reused():
+    """測試沒有變更時重用上一輪的 WatchColumns"""
+    with temp_monitor('watch_set.db') as monitor:
+        monitor.add_watch(1, 1, 'AAPL', 100.0)
+        first = monitor.load_watch_columns()
+        assert monitor.load_watch_columns() is first
+        monitor.add_watch(1, 1, 'MSFT', 200.0)
+        second = monitor.load_watch_columns()
+        assert second is first and len(second) == 2  # 增量套用，不重建
+        assert monitor.watch_set.full_loads == 1
+
+
+def test_incremental_columns_match_rebuild():
+    """測試逐項套用增減後的訂閱者和陣列與完整重建的結果一致"""
+    with temp_monitor('watch_set.db') as monitor:
+        rng = random.Random(3)
+        symbols = ['AAPL', 'MSFT', '0700.HK', 'GOOG']
+        types = ['above', 'below', 'pct_up']
+        active = []
+        for step in range(120):
+            if active and rng.random() < 0.4:
+                user_id, watch_id = active.pop(rng.randrange(len(active)))
+                assert monitor.remove_watch(user_id, watch_id)[0]
+            else:
+                user_id = rng.randrange(5)
+                success, message = monitor.add_watch(user_id, user_id, rng.choice(symbols), float(rng.randrange(1, 4)),
+                                                     rng.choice(types))
+                if success:
+                    active.append((user_id, int(message.split('ID: ')[1].rstrip(')'))))
+            if step % 7 == 0:
+                monitor.load_watch_columns()
+
+        columns = monitor.load_watch_columns()
+        assert monitor.watch_set.full_loads == 1
+        rebuilt = WatchColumns(records[0] for records in monitor.watch_set.subscribers().values())
+        assert sorted(columns.symbols) == sorted(rebuilt.symbols)
+        assert sorted(row.trigger_id for row in columns.rows) == sorted(row.trigger_id for row in rebuilt.rows)
+        assert {trigger_id: sorted(records) for trigger_id, records in monitor._subscribers.items()} == {
+            trigger_id: sorted(record.id for record in records)
+            for trigger_id, records in monitor.watch_set.subscribers().items()}
+        for symbol, rows in zip(columns.symbols, columns.symbol_rows):
+            assert all(columns.rows[i].symbol == symbol and columns.symbols[columns.sym_idx[i]] == symbol for i in rows)
+        quotes = {symbol: {'price': 2.5, 'previousClose': 2.0} for symbol in symbols}
+        assert sorted(columns.rows[i].trigger_id for i in evaluate_alerts(columns, quotes)) == \
+            sorted(rebuilt.rows[i].trigger_id for i in evaluate_alerts(rebuilt, quotes))
+
+
+def test_alerts_do_not_rebuild():
+    """測試發送警報只更新內存中的記錄，不產生變更或重建"""
+    with temp_monitor('watch_set.db') as monitor:
+        monitor._bot = FakeBot()
+        monitor.get_stock_quotes = lambda symbols, max_workers=8: {symbol: {'price': 500.0} for symbol in symbols}
+        monitor.add_watch(1, 1, 'AAPL', 100.0)
+        monitor.add_watch(2, 2, 'AAPL', 100.0)
+        columns = monitor.load_watch_columns()
+        version = monitor.watch_set.version
+
+        monitor.check_alerts()
+        assert len(monitor._bot.sent) == 2
+        assert monitor.load_watch_columns() is columns and monitor.watch_set.version == version
+        record = monitor.watch_set.by_symbol['AAPL'][0]
+        assert record.last_alert is not None and record.alert_count == 1
+        monitor.check_alerts()
+        assert len(monitor._bot.sent) == 2  # 冷卻期仍然有效
+
+
+def test_compact_records():
+    """測試緊湊記錄: 共用股票代碼和用戶ID，報價只保留需要的欄位"""
+    shared = {}
+    first = WatchRecord((1, 123456789, 123456789, ''.join(['AA', 'PL']), 100.0, 'above', None, 0, 1), shared)
+    second = WatchRecord((2, 123456789, 123456789, ''.join(['A', 'APL']), 90.0, 'below', None, 0, 2), shared)
+    assert first.symbol is second.symbol and first.user_id is second.user_id
+    assert first[3] == 'AAPL' and tuple(first) == first.as_row()
+    assert not hasattr(first, '__dict__')
+
+    quote = Quote.from_meta({'regularMarketPrice': 10.0, 'regularMarketVolume': 500,
+                             'chartPreviousClose': 9.5, 'currency': 'USD'})
+    assert quote['price'] == 10.0 and quote.get('previousClose') == 9.5
+    quote['averageVolume'] = 300
+    assert quote.averageVolume == 300 and quote.get('currency') is None
+    assert Quote.from_meta({'regularMarketPrice': None}) is None
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始監控集合增量維護測試\n")
+
+    tests = [
+        ("增量套用變更", test_incremental_changes),
+        ("日誌清理後重載", test_truncated_log_reloads),
+        ("重用監控陣列", test_columns_reused),
+        ("增量與重建一致", test_incremental_columns_match_rebuild),
+        ("警報不重建", test_alerts_do_not_rebuild),
+        ("緊湊記錄", test_compact_records),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+天氣查詢客戶端測試腳本
+使用本地假的 OpenWeatherMap 服務器測試 weather_client.py
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from weather_client import WeatherClient
+
+
+class FakeWeatherServer:
+    """本地假天氣服務器，記錄請求次數，可模擬延遲和錯誤"""
+
+    def __init__(self):
+        self.hits = 0
+        self.delay = 0.0
+        self.status = 200
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.hits += 1
+                time.sleep(server.delay)
+                city = parse_qs(urlparse(self.path).query)['q'][0]
+                if city.casefold() == 'atlantis':
+                    status, body = 404, {'cod': '404', 'message': 'city not found'}
+                elif server.status != 200:
+                    status, body = server.status, {'message': 'error'}
+                else:
+                    status, body = 200, {'main': {'temp': 28.5, 'humidity': 80},
+                                         'weather': [{'description': '多雲'}], 'name': city}
+                payload = json.dumps(body).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # 客戶端已超時斷開
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/data/2.5/weather"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def run(coro_factory, **client_options):
+    server = FakeWeatherServer()
+    client = WeatherClient('test-key', base_url=server.url, **client_options)
+
+    async def runner():
+        try:
+            return await coro_factory(server, client)
+        finally:
+            await client.close()
+
+    try:
+        return asyncio.run(runner())
+    finally:
+        server.close()
+
+
+def test_cache_and_coalescing():
+    """測試並發請求合併與城市名稱標準化"""
+    async def scenario(server, client):
+        server.delay = 0.2
+        cities = ['Hong Kong', 'hong kong', '  HONG   kong '] * 4
+        results = await asyncio.gather(*(client.get_weather(city) for city in cities))
+        assert all(result.status_code == 200 for result in results)
+        assert server.hits == 1
+
+        await client.get_weather('Hong Kong')
+        assert server.hits == 1
+    run(scenario)
+
+
+def test_not_found_cached():
+    """測試找不到的城市也會被緩存"""
+    async def scenario(server, client):
+        first = await client.get_weather('Atlantis')
+        second = await client.get_weather('atlantis')
+        assert first.status_code == 404 and second.status_code == 404
+        assert server.hits == 1
+    run(scenario)
+
+
+def test_not_found_expires():
+    """測試找不到城市的緩存比正常結果更早過期"""
+    async def scenario(server, client):
+        await client.get_weather('Atlantis')
+        await client.get_weather('Tokyo')
+        await asyncio.sleep(0.1)  # 超過 not_found_ttl，未超過 ttl
+        await client.get_weather('Atlantis')
+        await client.get_weather('Tokyo')
+        assert server.hits == 3
+    run(scenario, ttl=5, not_found_ttl=0.05)
+
+
+def test_cache_bounded():
+    """測試緩存最多保留 max_entries 個城市，先移除最久未使用的城市"""
+    async def scenario(server, client):
+        for city in ('Tokyo', 'Osaka', 'Atlantis'):
+            await client.get_weather(city)
+        await client.get_weather('Tokyo')  # 命中緩存，Tokyo 變為最近使用
+        await client.get_weather('Paris')
+        assert list(client._cache) == ['atlantis', 'tokyo', 'paris']
+        assert server.hits == 4
+    run(scenario, max_entries=3)
+
+
+def test_stale_fallback():
+    """測試上游超時或出錯時返回舊數據"""
+    async def scenario(server, client):
+        fresh = await client.get_weather('Tokyo')
+        assert fresh.status_code == 200 and not fresh.stale
+
+        await asyncio.sleep(0.1)  # 超過 ttl
+        server.status = 500
+        stale = await client.get_weather('Tokyo')
+        assert stale.status_code == 200 and stale.stale
+
+        server.status = 200
+        server.delay = 0.5  # 超過 timeout
+        timed_out = await client.get_weather('Tokyo')
+        assert timed_out.stale
+
+        missing = await client.get_weather('Osaka')
+        assert missing.status_code is None
+    run(scenario, ttl=0.05, timeout=0.2)
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始天氣查詢客戶端測試\n")
+
+    tests = [
+        ("緩存與請求合併", test_cache_and_coalescing),
+        ("找不到城市緩存", test_not_found_cached),
+        ("找不到城市過期", test_not_found_expires),
+        ("緩存容量上限", test_cache_bounded),
+        ("舊數據回退", test_stale_fallback),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Webhook 服務器測試腳本
+以本地假的 Telegram 發送端測試 webhook_server.py
+"""
+
+import asyncio
+import json
+
+from webhook_server import SECRET_HEADER, WebhookServer
+
+SECRET = "test-secret"
+
+
+class FakeTelegramSender:
+    """模擬 Telegram 以 keep-alive 連線推送更新"""
+
+    def __init__(self, port, path='/webhook'):
+        self.port = port
+        self.path = path
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+
+    async def send(self, update, secret=SECRET, method='POST', path=None, length=None):
+        body = json.dumps(update).encode('utf-8')
+        headers = [
+            f"{method} {path or self.path} HTTP/1.1",
+            "Host: localhost",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body) if length is None else length}",
+        ]
+        if secret is not None:
+            headers.append(f"{SECRET_HEADER}: {secret}")
+        self.writer.write(("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + body)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        return int(head.split(b' ', 2)[1])
+
+    async def close(self):
+        self.writer.close()
+
+
+async def start_server(handler):
+    server = WebhookServer(handler, host='127.0.0.1', port=0, secret_token=SECRET)
+    await server.start()
+    sender = FakeTelegramSender(server.port)
+    await sender.connect()
+    return server, sender
+
+
+def test_secret_validation():
+    """測試 secret token、路徑和方法的驗證"""
+    async def scenario():
+        received = []
+
+        async def handler(update):
+            received.append(update['update_id'])
+
+        server, sender = await start_server(handler)
+        try:
+            assert await sender.send({'update_id': 1}) == 200
+            assert await sender.send({'update_id': 2}, secret='wrong') == 403
+            assert await sender.send({'update_id': 3}, secret=None) == 403
+            assert await sender.send({'update_id': 4}, path='/other') == 404
+            assert await sender.send({'update_id': 5}, method='PUT') == 405
+            await sender.close()
+        finally:
+            await server.stop()
+        assert received == [1]
+        assert server.rejected == 4
+    asyncio.run(scenario())
+
+
+def test_invalid_length():
+    """測試負數或過大的 Content-Length 直接拒絕，不讀取請求體"""
+    async def scenario():
+        received = []
+
+        async def handler(update):
+            received.append(update['update_id'])
+
+        server, sender = await start_server(handler)
+        try:
+            assert await sender.send({'update_id': 1}, length=-5) == 400
+            await sender.close()
+            await sender.connect()
+            assert await sender.send({'update_id': 2}, length=server.max_body + 1) == 413
+            await sender.close()
+        finally:
+            await server.stop()
+        assert received == []
+    asyncio.run(scenario())
+
+
+def test_concurrent_processing():
+    """測試更新在背景並發處理，不阻塞回覆"""
+    async def scenario():
+        active = 0
+        peak = 0
+        done = []
+
+        async def handler(update):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.1)
+            active -= 1
+            done.append(update['update_id'])
+
+        server, sender = await start_server(handler)
+        try:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            for update_id in range(20):
+                assert await sender.send({'update_id': update_id}) == 200
+            assert loop.time() - start < 0.5
+            await sender.close()
+        finally:
+            await server.stop()
+        assert sorted(done) == list(range(20))
+        assert peak > 1
+    asyncio.run(scenario())
+
+
+def main():
+    """主測試函數"""
+    print("🚀 開始 Webhook 服務器測試\n")
+
+    tests = [
+        ("Secret 驗證", test_secret_validation),
+        ("Content-Length 驗證", test_invalid_length),
+        ("並發處理", test_concurrent_processing),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"{name:15} : ✅ 通過")
+            passed += 1
+        except AssertionError as e:
+            print(f"{name:15} : ❌ 失敗 {e}")
+
+    print("=" * 50)
+    print(f"總計：{passed}/{len(tests)} 項測試通過")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+價格歷史存儲後端
+- SQLiteHistoryStore: 默認後端，使用 price_history 表
+- TickStore: 按股票、按日分檔的列式存儲，以記憶體映射讀取
+
+兩者都提供 save(symbol, price, volume)、load(symbol, start, end) 和批量回填用的 save_many(symbol, rows)，
+StockMonitorDB.save_price_history / load_price_history 直接委派給後端
+"""
+
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# 價格序列: timestamps 為 UNIX 秒 (array 'd')，prices 為 array 'd'，volumes 為 array 'q'
+PriceSeries = namedtuple('PriceSeries', ['timestamps', 'prices', 'volumes'])
+
+# 單日的零拷貝切片: day_start 為該日 00:00 UTC 的 UNIX 秒，
+# offsets 為當日毫秒偏移 (uint32)，prices 為 float64，volumes 為 int64，全部是 memoryview
+TickSegment = namedtuple('TickSegment', ['day_start', 'offsets', 'prices', 'volumes'])
+
+# 列名 -> (副檔名, array 類型碼)
+# 價格使用 float64：float32 會改變一般價格 (例如 300.1) 並在約 $131k 以上失去分位，
+# 與監控 (以 float64 比較) 的 above / below 結果不一致。副檔名 pxd 與舊的 float32 檔案 (px) 區分
+TICK_COLUMNS = (
+    ('offsets', 'ts', 'I'),
+    ('prices', 'pxd', 'd'),
+    ('volumes', 'vol', 'q'),
+)
+
+SECONDS_PER_DAY = 86400
+
+
+def _utc_text(timestamp):
+    """UNIX 秒 -> SQLite CURRENT_TIMESTAMP 格式"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class SQLiteHistoryStore:
+    """使用 price_history 表的價格歷史後端"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def save(self, symbol, price, volume, timestamp=None):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        if timestamp is None:
+            cursor.execute('''
+                INSERT INTO price_history (symbol, price, volume)
+                VALUES (?, ?, ?)
+            ''', (symbol, price, volume))
+        else:
+            cursor.execute('''
+                INSERT INTO price_history (symbol, price, volume, timestamp)
+                VALUES (?, ?, ?, ?)
+            ''', (symbol, price, volume, _utc_text(timestamp)))
+        conn.commit()
+        conn.close()
+
+    def save_many(self, symbol, rows):
+        """
+        批量寫入歷史數據 [(UNIX 秒, price, volume), ...] (單一事務)
+        只寫入比該股票現有最早記錄更早的數據，避免與監控記錄重複；返回寫入的筆數
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT CAST(strftime('%s', MIN(timestamp)) AS INTEGER)
+                    FROM price_history WHERE symbol = ?
+                ''', (symbol,))
+                earliest = cursor.fetchone()[0]
+                values = [(symbol, price, volume, _utc_text(timestamp)) for timestamp, price, volume in rows
+                          if earliest is None or timestamp < earliest]
+                cursor.executemany('''
+                    INSERT INTO price_history (symbol, price, volume, timestamp)
+                    VALUES (?, ?, ?, ?)
+                ''', values)
+        finally:
+            conn.close()
+        return len(values)
+
+    def load(self, symbol, start=None, end=None):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT CAST(strftime('%s', timestamp) AS INTEGER), price, COALESCE(volume, 0)
+            FROM price_history
+            WHERE symbol = ? AND timestamp >= ? AND timestamp <= ?
+            ORDER BY timestamp
+        ''', (symbol, _utc_text(start or 0), _utc_text(end or time.time())))
+
+        series = PriceSeries(array('d'), array('d'), array('q'))
+        for timestamp, price, volume in cursor:
+            series.timestamps.append(timestamp)
+            series.prices.append(price)
+            series.volumes.append(volume)
+        conn.close()
+        return series
+
+    def close(self):
+        pass
+
+
+class TickStore:
+    """
+    列式價格歷史存儲
+
+    目錄結構: <root>/<symbol>/<YYYYMMDD>.{ts,pxd,vol}
+    每個檔案是只追加的緊湊陣列，每筆記錄共 20 字節
+    (4 字節當日毫秒偏移 + 8 字節價格 + 8 字節成交量)
+    讀取時以 mmap 映射，segments() 返回的 memoryview 不會複製數據
+    每日的時間偏移必須遞增 (範圍查詢以二分查找)，比當日最後一筆更早的記錄會被拒絕
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._maps = {}   # 檔案路徑 -> (檔案大小, mmap)
+        self._tails = {}  # symbol -> (當日檔案路徑前綴, 最後一筆的毫秒偏移)
+        os.makedirs(root, exist_ok=True)
+
+    def _day_path(self, symbol, day_start):
+        day = datetime.fromtimestamp(day_start, timezone.utc).strftime('%Y%m%d')
+        return os.path.join(self.root, symbol.replace(os.sep, '_'), day)
+
+    def _open_day(self, base):
+        """
+        首次寫入某日時對齊各列：寫入中途中斷會令各列長度不一致 (或留下不完整的一筆)，
+        把較長的檔案截斷到最短一列的完整筆數，之後的追加才會對齊；返回最後一筆的毫秒偏移 (沒有時為 -1)
+        """
+        counts = []
+        for _, ext, typecode in TICK_COLUMNS:
+            try:
+                size = os.path.getsize(f"{base}.{ext}")
+            except OSError:
+                size = 0
+            counts.append((size, size // array(typecode).itemsize))
+        count = min(items for _, items in counts)
+        for (size, _), (_, ext, typecode) in zip(counts, TICK_COLUMNS):
+            if size > count * array(typecode).itemsize:
+                os.truncate(f"{base}.{ext}", count * array(typecode).itemsize)
+                self._maps.pop(f"{base}.{ext}", None)
+        if not count:
+            return -1
+        itemsize = array('I').itemsize
+        with open(f"{base}.ts", 'rb') as f:
+            f.seek((count - 1) * itemsize)
+            return array('I', f.read(itemsize))[0]
+
+    def save(self, symbol, price, volume, timestamp=None):
+        """追加一筆記錄，比當日最後一筆更早時不寫入並返回 False"""
+        if timestamp is None:
+            timestamp = time.time()
+        day_start = int(timestamp // SECONDS_PER_DAY) * SECONDS_PER_DAY
+        offset = int((timestamp - day_start) * 1000)
+        values = {'offsets': offset, 'prices': price, 'volumes': volume or 0}
+
+        base = self._day_path(symbol, day_start)
+        with self._lock:
+            tail = self._tails.get(symbol)
+            if tail is not None and tail[0] == base:
+                last = tail[1]
+            else:
+                last = self._open_day(base)
+            if offset < last:
+                return False
+            os.makedirs(os.path.dirname(base), exist_ok=True)
+            for name, ext, typecode in TICK_COLUMNS:
+                with open(f"{base}.{ext}", 'ab') as f:
+                    f.write(array(typecode, [values[name]]).tobytes())
+            self._tails[symbol] = (base, offset)
+        return True
+
+    def save_many(self, symbol, rows):
+        """
+        批量寫入歷史數據 [(UNIX 秒, price, volume), ...]，每個日期每列只寫一次
+        已有數據的日期略過 (監控已在記錄，追加較早的數據會破壞時間順序)；返回寫入的筆數
+        """
+        days = {}
+        for timestamp, price, volume in sorted(rows):
+            day_start = int(timestamp // SECONDS_PER_DAY) * SECONDS_PER_DAY
+            days.setdefault(day_start, []).append((int((timestamp - day_start) * 1000), price, volume or 0))
+
+        written = 0
+        with self._lock:
+            for day_start, ticks in days.items():
+                base = self._day_path(symbol, day_start)
+                if os.path.exists(f"{base}.ts"):
+                    continue
+                os.makedirs(os.path.dirname(base), exist_ok=True)
+                for index, (_, ext, typecode) in enumerate(TICK_COLUMNS):
+                    with open(f"{base}.{ext}", 'ab') as f:
+                        f.write(array(typecode, [tick[index] for tick in ticks]).tobytes())
+                written += len(ticks)
+        return written
+
+    def _map(self, path):
+        """映射檔案；檔案增長後重新映射，舊的映射由仍在使用的 memoryview 保持"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        cached = self._maps.get(path)
+        if cached and cached[0] == size:
+            return cached[1]
+        if size == 0:
+            return None
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[path] = (size, mapped)
+        return mapped
+
+    def _days(self, symbol, start, end):
+        directory = os.path.join(self.root, symbol.replace(os.sep, '_'))
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        days = []
+        for name in names:
+            if not name.endswith('.ts'):
+                continue
+            day_start = int(datetime.strptime(name[:-3], '%Y%m%d').replace(tzinfo=timezone.utc).timestamp())
+            if day_start + SECONDS_PER_DAY > start and day_start <= end:
+                days.append(day_start)
+        return sorted(days)
+
+    def segments(self, symbol, start=None, end=None):
+        """返回 [start, end] 範圍內每日的零拷貝切片"""
+        start = start or 0
+        end = end if end is not None else time.time()
+        result = []
+        with self._lock:
+            for day_start in self._days(symbol, start, end):
+                base = self._day_path(symbol, day_start)
+                views = {}
+                for name, ext, typecode in TICK_COLUMNS:
+                    mapped = self._map(f"{base}.{ext}")
+                    if mapped is None:
+                        break
+                    itemsize = array(typecode).itemsize
+                    usable = len(mapped) // itemsize * itemsize
+                    views[name] = memoryview(mapped)[:usable].cast(typecode)
+                if len(views) != len(TICK_COLUMNS):
+                    continue
+
+                # 寫入中途中斷時各列長度可能不一致，以最短的為準
+                count = min(len(view) for view in views.values())
+                offsets = views['offsets'][:count]
+                lo = _bisect(offsets, (start - day_start) * 1000)
+                hi = _bisect(offsets, (end - day_start) * 1000, right=True)
+                if lo < hi:
+                    result.append(TickSegment(day_start, offsets[lo:hi],
+                                              views['prices'][lo:hi], views['volumes'][lo:hi]))
+        return result
+
+    def load(self, symbol, start=None, end=None):
+        """返回 PriceSeries (會複製數據，需要零拷貝時使用 segments)"""
+        series = PriceSeries(array('d'), array('d'), array('q'))
+        for segment in self.segments(symbol, start, end):
+            series.timestamps.extend(segment.day_start + offset / 1000 for offset in segment.offsets)
+            series.prices.extend(segment.prices)
+            series.volumes.extend(segment.volumes)
+        return series
+
+    def close(self):
+        with self._lock:
+            for _, mapped in self._maps.values():
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass  # 仍有 memoryview 在使用，交由垃圾回收
+            self._maps.clear()
+
+
+def _bisect(values, target, right=False):
+    """在已排序的 memoryview 上二分查找"""
+    lo, hi = 0, len(values)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if values[mid] < target or (right and values[mid] == target):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
@@ -0,0 +1,58 @@
+"""
+哈希時間輪調度器
+時間按 tick 秒切成格，項目按到期的 tick 編號放入 (編號 % 槽數) 號槽；
+超過一圈的項目留在槽內等下一圈。新增、重新調度和取消都是 O(1)，
+推進時只檢查經過的槽，同一格到期的項目一次過返回 (監控線程據此批量請求報價)
+"""
+
+import math
+import time
+
+
+class TimerWheel:
+    def __init__(self, tick=1.0, slots=512, now=None):
+        self.tick = tick
+        self._slots = [{} for _ in range(slots)]  # 每槽: key -> 到期 tick 編號
+        self._slot_of = {}                        # key -> 所在槽
+        self._current = self._tick_of(time.monotonic() if now is None else now)
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, key):
+        return key in self._slot_of
+
+    def _tick_of(self, when):
+        return int(when // self.tick)
+
+    def schedule(self, key, delay, now=None):
+        """delay 秒後到期 (已調度的 key 會被重新調度)，最早在下一格到期"""
+        now = time.monotonic() if now is None else now
+        self.cancel(key)
+        expires = max(math.ceil((now + delay) / self.tick), self._current + 1)
+        slot = expires % len(self._slots)
+        self._slots[slot][key] = expires
+        self._slot_of[key] = slot
+
+    def cancel(self, key):
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def advance(self, now=None):
+        """推進到 now，返回期間到期的所有 key (已從時間輪移除)"""
+        target = self._tick_of(time.monotonic() if now is None else now)
+        if target <= self._current:
+            return []
+        # 落後超過一圈時每個槽只需檢查一次
+        steps = min(target - self._current, len(self._slots))
+        due = []
+        for number in range(target - steps + 1, target + 1):
+            slot = self._slots[number % len(self._slots)]
+            expired = [key for key, expires in slot.items() if expires <= target]
+            for key in expired:
+                del slot[key]
+                del self._slot_of[key]
+            due.extend(expired)
+        self._current = target
+        return due
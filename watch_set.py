@@ -0,0 +1,205 @@
+"""
+監控集合的增量維護
+監控線程在內存中保存活躍監控 (按股票分組的 __slots__ 記錄)，每輪只讀取 watch_changes 變更日誌中
+上次之後的變更並套用，不再每輪載入整個 stock_watches 表。
+變更日誌由 stock_watches 上的觸發器寫入 (見 stock_monitor_db.init_database)；
+警報記錄 (last_alert / alert_count) 不寫入日誌，由監控線程發送警報時直接更新內存中的記錄。
+套用的增減另外按順序記錄，監控可用 take_changes() 增量更新自己的索引，不必每次重建
+
+股票代碼和警報類型字符串經 sys.intern 共用，同一股票的大量監控只保存一份代碼；
+同一用戶的多個監控共用 user_id / chat_id 整數對象
+"""
+
+import sys
+from operator import attrgetter
+
+WATCH_FIELDS = ('id', 'user_id', 'chat_id', 'symbol', 'target_price', 'alert_type', 'last_alert', 'alert_count',
+                'trigger_id')
+WATCH_COLUMNS = ', '.join(WATCH_FIELDS)
+
+_FIELD_GETTERS = tuple(attrgetter(field) for field in WATCH_FIELDS)
+
+# SQLite 單條語句的參數上限以內
+ID_CHUNK = 500
+
+# 未取出的增減超過監控數量時不再記錄，由 take_changes() 通知調用方完整重建
+MIN_PENDING_CHANGES = 1000
+
+
+class WatchRecord:
+    """
+    一個監控的緊湊記錄
+    可按下標讀取和拆包，與查詢結果的元組順序 (WATCH_FIELDS) 一致，可直接傳給 alert_rules.WatchColumns
+    _pos 為記錄在 by_symbol 列表中的位置，移除時不需要線性查找
+    """
+    __slots__ = WATCH_FIELDS + ('_pos',)
+
+    def __init__(self, row, shared=None):
+        (self.id, user_id, chat_id, symbol, self.target_price,
+         alert_type, self.last_alert, self.alert_count, self.trigger_id) = row
+        if shared is not None:
+            user_id = shared.setdefault(user_id, user_id)
+            chat_id = shared.setdefault(chat_id, chat_id)
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.symbol = sys.intern(symbol)
+        self.alert_type = sys.intern(alert_type) if alert_type is not None else None
+
+    def __getitem__(self, index):
+        return _FIELD_GETTERS[index](self)
+
+    def __iter__(self):
+        return iter(self.as_row())
+
+    def __len__(self):
+        return len(WATCH_FIELDS)
+
+    def as_row(self):
+        return (self.id, self.user_id, self.chat_id, self.symbol, self.target_price,
+                self.alert_type, self.last_alert, self.alert_count, self.trigger_id)
+
+
+class WatchSet:
+    def __init__(self):
+        self.by_symbol = {}    # symbol -> [WatchRecord]
+        self._records = {}     # watch_id -> WatchRecord
+        self._shared = {}      # 共用的 user_id / chat_id 整數
+        self.watermark = None  # 已套用的最後一個變更序號，None 表示尚未載入
+        self.version = 0       # 內容每次變化遞增
+        self.full_loads = 0
+        self.applied_changes = 0
+        self._changes = []     # 上次 take_changes() 之後的 [(WatchRecord, 是否新增), ...]
+        self._reloaded = True  # 其間曾完整載入 (或未取出的變更過多)，調用方需要完整重建
+
+    def __len__(self):
+        return len(self._records)
+
+    def refresh(self, conn):
+        """套用上次之後的變更 (首次或變更日誌已被清理時完整載入)，返回處理的監控數量"""
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')  # 同一快照中讀取變更和監控
+        try:
+            if self.watermark is None or self._log_truncated(cursor):
+                return self._load_all(cursor)
+
+            cursor.execute('''
+                SELECT watch_id, MAX(seq) FROM watch_changes WHERE seq > ? GROUP BY watch_id
+            ''', (self.watermark,))
+            changes = cursor.fetchall()
+            if not changes:
+                return 0
+
+            changed_ids = [watch_id for watch_id, _ in changes]
+            for watch_id in changed_ids:
+                self._discard(watch_id)
+            for start in range(0, len(changed_ids), ID_CHUNK):
+                chunk = changed_ids[start:start + ID_CHUNK]
+                cursor.execute(f'''
+                    SELECT {WATCH_COLUMNS} FROM stock_watches
+                    WHERE id IN ({','.join('?' * len(chunk))}) AND is_active = 1 AND suspended_at IS NULL
+                ''', chunk)
+                for row in cursor.fetchall():
+                    self._add(WatchRecord(row, self._shared))
+
+            self.watermark = max(seq for _, seq in changes)
+            self.version += 1
+            self.applied_changes += len(changes)
+            return len(changes)
+        finally:
+            conn.commit()
+
+    def take_changes(self):
+        """
+        取出上次調用之後按順序套用的增減 [(WatchRecord, 是否新增), ...]
+        其間曾完整載入時返回 None，調用方應從 by_symbol 完整重建
+        """
+        changes = None if self._reloaded else self._changes
+        self._changes = []
+        self._reloaded = False
+        return changes
+
+    def reload(self):
+        """下次 refresh() 時完整重新載入 (例如接手其他實例的分片，需要讀取其寫入的警報記錄)"""
+        self.watermark = None
+
+    def rows(self, owns_symbol=None):
+        """返回所有監控記錄 (不複製)，owns_symbol(symbol) 可過濾股票"""
+        return [
+            record
+            for symbol, records in self.by_symbol.items()
+            if owns_symbol is None or owns_symbol(symbol)
+            for record in records
+        ]
+
+    def subscribers(self, owns_symbol=None):
+        """
+        按共享觸發器 (symbol, alert_type, 門檻) 分組的監控
+        返回 {trigger_id: [WatchRecord, ...]}，相同條件的監控只需評估一次
+        """
+        grouped = {}
+        for symbol, records in self.by_symbol.items():
+            if owns_symbol is not None and not owns_symbol(symbol):
+                continue
+            for record in records:
+                grouped.setdefault(record.trigger_id, []).append(record)
+        return grouped
+
+    def _load_all(self, cursor):
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'watch_changes'")
+        row = cursor.fetchone()
+        cursor.execute(f'''
+            SELECT {WATCH_COLUMNS} FROM stock_watches WHERE is_active = 1 AND suspended_at IS NULL
+        ''')
+        self.by_symbol = {}
+        self._records = {}
+        self._shared = {}
+        self._changes = []
+        self._reloaded = True
+        for watch in cursor:  # 逐行建立記錄，不保留整個 fetchall() 列表
+            self._add(WatchRecord(watch, self._shared))
+        self.watermark = row[0] if row else 0
+        self.version += 1
+        self.full_loads += 1
+        return len(self)
+
+    def _log_truncated(self, cursor):
+        """上次之後的變更是否已被清理 (需要完整重新載入)"""
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'watch_changes'")
+        row = cursor.fetchone()
+        last_seq = row[0] if row else 0
+        if last_seq <= self.watermark:
+            return False
+        cursor.execute('SELECT MIN(seq) FROM watch_changes WHERE seq > ?', (self.watermark,))
+        first = cursor.fetchone()[0]
+        return first is None or first > self.watermark + 1
+
+    def _record_change(self, record, added):
+        if self._reloaded:
+            return
+        if len(self._changes) >= max(len(self._records), MIN_PENDING_CHANGES):
+            # 調用方長時間沒有取出，完整重建比逐項套用便宜
+            self._changes = []
+            self._reloaded = True
+            return
+        self._changes.append((record, added))
+
+    def _add(self, record):
+        records = self.by_symbol.setdefault(record.symbol, [])
+        record._pos = len(records)
+        records.append(record)
+        self._records[record.id] = record
+        self._record_change(record, True)
+
+    def _discard(self, watch_id):
+        # 按股票分組用列表比字典省內存，移除時與最後一個記錄交換位置，不需要線性查找
+        record = self._records.pop(watch_id, None)
+        if record is None:
+            return
+        records = self.by_symbol[record.symbol]
+        last = records.pop()
+        if last is not record:
+            records[record._pos] = last
+            last._pos = record._pos
+        if not records:
+            del self.by_symbol[record.symbol]
+        self._record_change(record, False)
@@ -0,0 +1,96 @@
+"""
+異步天氣查詢客戶端 (OpenWeatherMap)
+- 按城市緩存結果 (城市名稱標準化後作為 key)，最多保留 max_entries 個城市 (LRU)
+- 找不到的城市 (404) 只短暫緩存，避免拼寫錯誤的城市長期佔用緩存
+- 同一城市的並發請求只向上游發出一次
+- 上游超時或出錯時，返回仍在容忍期內的舊數據
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, namedtuple
+
+OPENWEATHER_URL = "http://api.openweathermap.org/data/2.5/weather"
+
+# status_code: 上游狀態碼 (超時/連線錯誤時為 None)
+# data: 成功時的 JSON
+# stale: 是否為過期的緩存數據
+# age: 數據距今秒數
+WeatherResult = namedtuple('WeatherResult', ['status_code', 'data', 'stale', 'age'])
+
+
+def normalize_city(city):
+    """標準化城市名稱: 合併空白並忽略大小寫 ("  hong   KONG" -> "hong kong")"""
+    return ' '.join(city.split()).casefold()
+
+
+class WeatherClient:
+    def __init__(self, api_key, base_url=OPENWEATHER_URL, ttl=600, stale_ttl=3600,
+                 not_found_ttl=60, timeout=5.0, max_entries=1000):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.ttl = ttl                      # 緩存有效期
+        self.stale_ttl = stale_ttl          # 上游失敗時可接受的舊數據年齡
+        self.not_found_ttl = not_found_ttl  # 找不到城市 (404) 的緩存時間
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._client = None
+        self._cache = OrderedDict()  # city key -> (取得時間, status_code, data)
+        self._inflight = {}  # city key -> asyncio.Task
+        self.upstream_calls = 0
+
+    def _client_instance(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def _fetch(self, key, city):
+        self.upstream_calls += 1
+        params = {'q': city, 'appid': self.api_key, 'units': 'metric', 'lang': 'zh_tw'}
+        response = await self._client_instance().get(self.base_url, params=params)
+        data = response.json() if response.status_code == 200 else None
+        if response.status_code in (200, 404):
+            self._cache[key] = (time.monotonic(), response.status_code, data)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return response.status_code, data
+
+    async def get_weather(self, city):
+        import httpx
+        key = normalize_city(city)
+        now = time.monotonic()
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            fetched_at, status_code, data = cached
+            ttl = self.ttl if status_code == 200 else self.not_found_ttl
+            if now - fetched_at < ttl:
+                return WeatherResult(status_code, data, False, now - fetched_at)
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, city))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        try:
+            # shield: 單個請求被取消不影響其他等待同一結果的請求
+            status_code, data = await asyncio.shield(task)
+        except (httpx.HTTPError, ValueError):
+            status_code, data = None, None
+
+        if status_code == 200 or status_code == 404:
+            return WeatherResult(status_code, data, False, 0.0)
+
+        # 上游失敗: 返回容忍期內的舊數據
+        if cached is not None and cached[1] == 200 and now - cached[0] < self.stale_ttl:
+            return WeatherResult(200, cached[2], True, now - cached[0])
+        return WeatherResult(status_code, None, False, 0.0)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,151 @@
+"""
+Telegram webhook 服務器
+以 asyncio 實現的輕量 HTTP 服務器，驗證 secret token 後立即回覆 200，
+並在背景並發處理更新。與 Telegram 庫無關，handler 接收解析後的 JSON
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+
+logger = logging.getLogger('bot.webhook')
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+STATUS_TEXT = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+}
+
+
+class WebhookServer:
+    def __init__(self, handler, host='0.0.0.0', port=8443, path='/webhook', secret_token=None,
+                 max_body=1024 * 1024, max_concurrency=64):
+        # handler(update_dict) 為異步函數
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.max_body = max_body
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._server = None
+        self._tasks = set()
+        self._connections = set()
+        self._stopped = asyncio.Event()
+        self.received = 0
+        self.rejected = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # port 為 0 時取得實際端口
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self._stopped.wait()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # 關閉閒置的 keep-alive 連線
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._stopped.set()
+
+    async def _handle_connection(self, reader, writer):
+        self._connections.add(writer)
+        try:
+            while True:
+                keep_alive = await self._handle_request(reader, writer)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _handle_request(self, reader, writer):
+        """處理一個 HTTP 請求，返回是否保持連線"""
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            await self._respond(writer, 400, False)
+            return False
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        keep_alive = headers.get('connection', '').lower() != 'close'
+
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            await self._respond(writer, 400, False)
+            return False
+        if length < 0:
+            await self._respond(writer, 400, False)
+            return False
+        if length > self.max_body:
+            await self._respond(writer, 413, False)
+            return False
+        body = await reader.readexactly(length) if length else b''
+
+        status = self._validate(method, target, headers)
+        update = None
+        if status == 200:
+            try:
+                update = json.loads(body)
+            except ValueError:
+                status = 400
+
+        await self._respond(writer, status, keep_alive)
+        if status != 200:
+            self.rejected += 1
+            return keep_alive
+
+        # 先回覆 Telegram，再在背景處理更新
+        self.received += 1
+        task = asyncio.ensure_future(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return keep_alive
+
+    def _validate(self, method, target, headers):
+        if target.split('?', 1)[0] != self.path:
+            return 404
+        if method != 'POST':
+            return 405
+        if self.secret_token is not None:
+            token = headers.get(SECRET_HEADER, '')
+            if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+                return 403
+        return 200
+
+    async def _process(self, update):
+        async with self._semaphore:
+            try:
+                await self.handler(update)
+            except Exception as e:
+                logger.error("Webhook 更新處理失敗: %s", e, exc_info=True)
+
+    async def _respond(self, writer, status, keep_alive):
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            f"Content-Length: 0\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+        )
+        await writer.drain()